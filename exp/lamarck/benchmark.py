@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Micro-benchmarks of the evolutionary operators.
+
+See program help for what inputs to provide, e.g. `python benchmark.py lag`.
+"""
+
+# Standard libraries
+import asyncio
+import pickle
+import tempfile
+import time
+import timeit
+from random import Random
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Third-party libraries
+import fire
+import numpy as np
+import numpy.typing as npt
+
+# Multineat
+import multineat
+
+# SQLAlchemy
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+# Genotypes
+from body.cppnwin.modular_robot.body_genotype import develop as body_develop
+from body.cppnwin.modular_robot.body_genotype import random as body_random
+from brain.lag import Genotype as BrainGenotype
+from brain.lag import crossover, crossover_population, mutate, mutate_population
+from brain.lag.genotype import decode_genomes, encode_genome
+
+# Local libraries
+from utils import selection
+from utils.database import TUNED_PROFILE, SqliteProfile, open_async_database
+from utils.helpers import make_multineat_params, multineat_rng_from_random
+from utils.morphology import body_hash
+from utils.optimizer_schema import DbFitness
+
+
+def _mutate_loop(
+    genotype: BrainGenotype, rng: Random, bound: float, mutate_prob: float
+) -> BrainGenotype:
+    """The mutation of LAG genotypes before it was vectorized, for reference."""
+    individual = np.ones(genotype.genotype.shape) * 0.5
+    for i in range(individual.shape[0]):
+        if rng.uniform(0, 1) < mutate_prob:
+            individual[i] = genotype.genotype[i] + rng.uniform(-bound, bound)
+    return BrainGenotype(individual, genotype.grid_size)
+
+
+def _crossover_loop(
+    parent1: BrainGenotype, parent2: BrainGenotype, rng: Random, crossover_prob: float
+) -> BrainGenotype:
+    """The crossover of LAG genotypes before it was vectorized, for reference."""
+    genotype = np.ones(parent1.genotype.shape[0]) * 0.5
+    for i in range(genotype.shape[0]):
+        if rng.uniform(0, 1) < crossover_prob:
+            genotype[i] = parent1.genotype[i]
+        else:
+            genotype[i] = parent2.genotype[i]
+    return BrainGenotype(genotype, parent1.grid_size)
+
+
+def _select_survivors_loop(
+    rng: Random,
+    old_fitnesses: List[float],
+    new_fitnesses: List[float],
+    num_survivors: int,
+    tournament_size: int,
+) -> Tuple[List[int], List[int]]:
+    """The tournament survivor selection before it used NumPy, for reference."""
+    fitnesses = old_fitnesses + new_fitnesses
+    fit_sorted = sorted(enumerate(fitnesses), key=lambda x: x[1], reverse=True)
+    fit_generator = [i for i in range(len(fit_sorted))]
+    survivors = []
+    for __ in range(num_survivors):
+        idx = min(rng.choices(fit_generator, k=tournament_size))
+        survivors.extend([fit_sorted[idx][0]])
+        fit_generator.remove(idx)
+    len_old = len(old_fitnesses)
+    return (
+        [i for i in survivors if i < len_old],
+        [i - len_old for i in survivors if i >= len_old],
+    )
+
+
+async def _write_rate(
+    directory: str,
+    profile: Optional[SqliteProfile],
+    num_rows: int,
+    batch_size: int,
+) -> float:
+    """Write fitness records in transactions of `batch_size`, in rows per second."""
+    database = open_async_database(directory, create=True, profile=profile)
+    async with database.begin() as connection:
+        await connection.run_sync(DbFitness.metadata.create_all)
+
+    start = time.perf_counter()
+    for first in range(0, num_rows, batch_size):
+        async with AsyncSession(database) as session:
+            async with session.begin():
+                session.add_all(
+                    [
+                        DbFitness(
+                            db_id="benchmark",
+                            generation_index=i // batch_size,
+                            learner_index=i % batch_size,
+                            fitness_before=0.0,
+                            fitness_after=1.0,
+                            learning_delta=1.0,
+                        )
+                        for i in range(first, min(first + batch_size, num_rows))
+                    ]
+                )
+    elapsed = time.perf_counter() - start
+
+    await database.dispose()
+    return num_rows / elapsed
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    """Best time of a call, in microseconds."""
+    number = max(1, repeat // 5)
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+class Benchmark(object):
+    def lag(
+        self,
+        grid_sizes: Sequence[int] = (22, 64, 128),
+        offspring_size: int = 25,
+        repeat: int = 50,
+    ) -> None:
+        """
+        Time the LAG mutation and crossover, per offspring.
+
+        :param grid_sizes: The grid sizes of the genotypes.
+        :param offspring_size: The number of offspring of the population variants.
+        :param repeat: The number of calls to time.
+        """
+        rng = Random(0)
+        nprng = np.random.Generator(np.random.PCG64(0))
+
+        print(
+            f"{'grid':>6} {'operator':>10} {'loop [us]':>12} "
+            f"{'vector [us]':>12} {'population [us]':>16} {'speedup':>8}"
+        )
+        for grid_size in grid_sizes:
+            parents: npt.NDArray[np.float_] = nprng.standard_normal(
+                (2 * offspring_size, grid_size**2)
+            )
+            parent1 = BrainGenotype(parents[0], grid_size)
+            parent2 = BrainGenotype(parents[1], grid_size)
+
+            timings = {
+                "mutate": (
+                    _time(lambda: _mutate_loop(parent1, rng, 1.0, 0.8), repeat),
+                    _time(lambda: mutate(parent1, nprng, 1.0, 0.8), repeat),
+                    _time(
+                        lambda: mutate_population(
+                            parents[:offspring_size], nprng, 1.0, 0.8
+                        ),
+                        repeat,
+                    )
+                    / offspring_size,
+                ),
+                "crossover": (
+                    _time(lambda: _crossover_loop(parent1, parent2, rng, 0.5), repeat),
+                    _time(lambda: crossover(parent1, parent2, nprng, 0.5), repeat),
+                    _time(
+                        lambda: crossover_population(
+                            parents[:offspring_size],
+                            parents[offspring_size:],
+                            nprng,
+                            0.5,
+                        ),
+                        repeat,
+                    )
+                    / offspring_size,
+                ),
+            }
+            for operator, (loop, vector, population) in timings.items():
+                print(
+                    f"{grid_size:>6} {operator:>10} {loop:>12.1f} {vector:>12.1f} "
+                    f"{population:>16.2f} {loop / population:>7.0f}x"
+                )
+
+    def genome(
+        self, grid_size: int = 22, num_genomes: int = 1000, repeat: int = 10
+    ) -> None:
+        """
+        Compare the binary LAG genome format with pickle, size and decoding time.
+
+        :param grid_size: The grid size of the genotypes.
+        :param num_genomes: The number of genomes to decode at once.
+        :param repeat: The number of calls to time.
+        """
+        nprng = np.random.Generator(np.random.PCG64(0))
+        genotypes = [
+            BrainGenotype(nprng.standard_normal(grid_size**2), grid_size)
+            for _ in range(num_genomes)
+        ]
+        grid_sizes = [grid_size] * num_genomes
+
+        # as stored by the PickleType column of older databases
+        pickled = [pickle.dumps(pickle.dumps(g.genotype)) for g in genotypes]
+
+        print(f"{'format':>8} {'bytes/genome':>13} {'decode [us/genome]':>19}")
+        for name, dtype in [("pickle", None), ("<f8", "<f8"), ("<f4", "<f4")]:
+            blobs = (
+                pickled
+                if dtype is None
+                else [encode_genome(g, dtype) for g in genotypes]
+            )
+            size = sum(len(blob) for blob in blobs) / num_genomes
+            decode = (
+                _time(lambda: decode_genomes(blobs, grid_sizes), repeat) / num_genomes
+            )
+            print(f"{name:>8} {size:>13.0f} {decode:>19.2f}")
+
+    def cppn(
+        self,
+        num_genotypes: int = 200,
+        num_mutations: int = 10,
+        max_parts: int = 10,
+        repeat: int = 5,
+    ) -> None:
+        """
+        Time the body development with the compiled and the multineat CPPN.
+
+        Also checks that both give the same bodies.
+
+        :param num_genotypes: The number of random body genotypes.
+        :param num_mutations: The number of mutations of the random genotypes.
+        :param max_parts: The maximum number of modules of a body.
+        :param repeat: The number of calls to time.
+        """
+        innov_db = multineat.InnovationDatabase()  # type: ignore # STUB
+        rng = multineat_rng_from_random(Random(0))
+        genotypes = [
+            body_random(
+                innov_db,
+                rng,
+                make_multineat_params(),
+                multineat.ActivationFunction.TANH,  # type: ignore # STUB
+                num_mutations,
+            )
+            for _ in range(num_genotypes)
+        ]
+
+        different = sum(
+            body_hash(body_develop(genotype, compiled=False, max_parts=max_parts))
+            != body_hash(body_develop(genotype, compiled=True, max_parts=max_parts))
+            for genotype in genotypes
+        )
+        print(f"Different bodies: {different} of {num_genotypes}")
+
+        for compiled in [False, True]:
+            develop_time = _time(
+                lambda: [
+                    body_develop(g, compiled=compiled, max_parts=max_parts)
+                    for g in genotypes
+                ],
+                repeat,
+            )
+            print(
+                f"{'compiled' if compiled else 'multineat':>9}: "
+                f"{develop_time / num_genotypes:.1f} us/body"
+            )
+
+    def selection(
+        self,
+        population_sizes: Sequence[int] = (50, 1000, 10_000, 100_000),
+        tournament_size: int = 10,
+        max_loop_size: int = 10_000,
+        repeat: int = 5,
+    ) -> None:
+        """
+        Time the selection operators, per generation of (mu + mu) survivors.
+
+        :param population_sizes: The numbers of survivors, mu.
+        :param tournament_size: The number of contestants of a tournament.
+        :param max_loop_size: The largest population to time the reference loop on.
+        :param repeat: The number of calls to time.
+        """
+        rng = Random(0)
+        nprng = np.random.Generator(np.random.PCG64(0))
+
+        print(
+            f"{'mu':>7} {'loop [ms]':>10} {'tournament':>11} {'groups':>8} "
+            f"{'rank':>8} {'truncation':>11} {'mu+lambda':>10}"
+        )
+        for size in population_sizes:
+            old = nprng.standard_normal(size).tolist()
+            new = nprng.standard_normal(size).tolist()
+            merged = old + new
+
+            loop = f"{'-':>10}"
+            if size <= max_loop_size:
+                loop_time = _time(
+                    lambda: _select_survivors_loop(
+                        rng, old, new, size, tournament_size
+                    ),
+                    repeat,
+                )
+                loop = f"{loop_time / 1e3:>10.2f}"
+            timings = [
+                _time(
+                    lambda: selection.tournament(
+                        merged, size, tournament_size, nprng
+                    ),
+                    repeat,
+                ),
+                _time(
+                    lambda: selection.tournament_groups(
+                        old, size, 2, tournament_size, nprng
+                    ),
+                    repeat,
+                ),
+                _time(lambda: selection.rank(merged, size, nprng), repeat),
+                _time(lambda: selection.truncation(merged, size), repeat),
+                _time(lambda: selection.mu_plus_lambda(old, new, size), repeat),
+            ]
+            print(
+                f"{size:>7} {loop} "
+                + " ".join(
+                    f"{t / 1e3:>{w}.2f}" for t, w in zip(timings, [11, 8, 8, 11, 10])
+                )
+            )
+
+    def database(self, num_rows: int = 2000, batch_size: int = 50) -> None:
+        """
+        Compare the write rate of the SQLite settings, in rows per second.
+
+        Every configuration writes to a new database in a temporary directory.
+
+        :param num_rows: The number of fitness records to write.
+        :param batch_size: The number of records per transaction, e.g. a generation.
+        """
+        profiles = [("default", None), ("tuned", TUNED_PROFILE)]
+
+        print(f"{'profile':>8} {'rows/commit':>12} {'rows/s':>10}")
+        for name, profile in profiles:
+            for rows_per_commit in [1, batch_size]:
+                with tempfile.TemporaryDirectory() as directory:
+                    rate = asyncio.run(
+                        _write_rate(directory, profile, num_rows, rows_per_commit)
+                    )
+                print(f"{name:>8} {rows_per_commit:>12} {rate:>10.0f}")
+
+
+def main() -> None:
+    """Run this file as a command line tool."""
+
+    # Fire the command line tool
+    fire.Fire(Benchmark)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,8 @@ This code is provided "As Is"
 from __future__ import annotations
 
 # Standard libraries
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import List, Optional
 
 # Multineat
 import multineat
@@ -23,6 +23,7 @@ import multineat
 from revolve2.core.database import IncompatibleError, Serializer
 
 # SQLAlchemy
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.future import select
 
@@ -35,6 +36,23 @@ class Genotype:
     """A generic CPPNWIN genotype."""
 
     genotype: multineat.Genome  # type: ignore # STUB
+    _serialized: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def serialize(self) -> str:
+        """
+        Serialize the genome, only once.
+
+        Genomes are not changed after they are created, mutation and crossover
+        create new ones, so the text can be kept. It is e.g. prepared on a thread
+        while the genotype is simulated.
+
+        :returns: The serialized multineat genome.
+        """
+        if self._serialized is None:
+            self._serialized = self.genotype.Serialize()
+        return self._serialized
 
 
 class GenotypeSerializer(Serializer[Genotype]):
@@ -70,16 +88,22 @@ class GenotypeSerializer(Serializer[Genotype]):
         :param objects: The objects to serialize.
         :returns: A list of ids to identify each serialized object.
         """
-        dbfitnesses = [
-            DbGenotype(serialized_multineat_genome=o.genotype.Serialize())
-            for o in objects
-        ]
-        session.add_all(dbfitnesses)
-        await session.flush()
-        ids = [
-            dbfitness.id for dbfitness in dbfitnesses if dbfitness.id is not None
-        ]  # cannot be none because not nullable. used to silence mypy
-        assert len(ids) == len(objects)  # but check just to be sure
+        if not objects:
+            return []
+
+        rows = [{"serialized_multineat_genome": o.serialize()} for o in objects]
+
+        # SQLite gives the first row the id after the last one, and the session
+        # holds the write lock from then on, so no other writer can take the ids
+        # after it before the commit. The other rows get those with one executemany
+        result = await session.execute(insert(DbGenotype).values(rows[0]))
+        first_id = result.inserted_primary_key[0]
+        ids = list(range(first_id, first_id + len(rows)))
+        if len(rows) > 1:
+            await session.execute(
+                insert(DbGenotype),
+                [dict(row, id=id) for id, row in zip(ids[1:], rows[1:])],
+            )
         return ids
 
     @classmethod
@@ -14,8 +14,10 @@ Functions for CPPNWIN genotypes for a modular robot body.
 # Standard libraries
 import math
 from dataclasses import dataclass
-from queue import Queue
-from typing import Any, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+# Third-party libraries
+import numpy as np
 
 # Multineat
 import multineat
@@ -25,6 +27,7 @@ from revolve2.core.modular_robot import ActiveHinge, Body, Brick, Core, Module
 
 # Local libraries
 from ..genotype import Genotype
+from ..network import compile_genome
 from ..random import random as base_random
 
 
@@ -70,24 +73,34 @@ def random(
 @dataclass
 class __Module:
     position: Tuple[int, int, int]
-    forward: Tuple[int, int, int]
-    up: Tuple[int, int, int]
+    key: int  # packed position, see `__pack`
+    frame: int  # forward and up, see `__FRAMES`
     chain_length: int
     module_reference: Module
 
 
 def develop(
     genotype: Genotype,
+    compiled: bool = True,
+    max_parts: int = 10,
 ) -> Body:
     """
     Develop a CPPNWIN genotype into a modular robot body.
 
     It is important that the genotype was created using a compatible function.
 
+    The body grows breadth first, one tree depth at a time. The CPPN is queried
+    for all the free positions around the modules of a depth at once.
+
     Parameters
     ----------
     genotype : Genotype
         The genotype to create the body from.
+    compiled : bool
+        Whether to evaluate the CPPN with NumPy, see `network.CompiledNetwork`,
+        instead of with multineat.
+    max_parts : int
+        Maximum number of modules of the body, including the core.
 
     Returns
     -------
@@ -99,50 +112,140 @@ def develop(
     RuntimeError
         In case a module is encountered that is not supported.
     """
-    max_parts = 10
-
-    body_net = multineat.NeuralNetwork()  # type: ignore # STUB
-    genotype.genotype.BuildPhenotype(body_net)
+    assert 1 <= max_parts < 2 ** (__PACK_BITS - 1)
 
-    to_explore: Queue[__Module] = Queue()
-    grid: Set[Tuple[int, int, int]] = set()
+    evaluate_cppn: Callable[
+        [List[Tuple[int, int, int]], int], List[Tuple[Any, int]]
+    ]
+    if compiled:
+        evaluate_cppn = __make_compiled_evaluator(genotype)
+    else:
+        evaluate_cppn = __make_multineat_evaluator(genotype)
 
     body = Body()
 
-    to_explore.put(__Module((0, 0, 0), (0, -1, 0), (0, 0, 1), 0, body.core))
-    grid.add((0, 0, 0))
+    core_key = __pack((0, 0, 0))
+    level = [__Module((0, 0, 0), core_key, __CORE_FRAME, 0, body.core)]
+    grid: Set[int] = {core_key}
     part_count = 1
 
-    while not to_explore.empty():
-        module = to_explore.get()
-
-        children: List[Tuple[int, int]] = []  # child index, rotation
-
-        if isinstance(module.module_reference, Core):
-            children.append((Core.FRONT, 0))
-            children.append((Core.LEFT, 1))
-            children.append((Core.BACK, 2))
-            children.append((Core.RIGHT, 3))
-        elif isinstance(module.module_reference, Brick):
-            children.append((Brick.FRONT, 0))
-            children.append((Brick.LEFT, 1))
-            children.append((Brick.RIGHT, 3))
-        elif isinstance(module.module_reference, ActiveHinge):
-            children.append((ActiveHinge.ATTACHMENT, 0))
-        else:  # Should actually never arrive here but just checking module type to be sure
-            raise RuntimeError()
-
-        for (index, rotation) in children:
-            if part_count < max_parts:
-                child = ___add_child(body_net, module, index, rotation, grid)
-                if child is not None:
-                    to_explore.put(child)
-                    part_count += 1
+    while level and part_count < max_parts:
+        # every child slot of the modules of this depth, in breadth first order
+        slots: List[Tuple[__Module, int, int, Tuple[int, int, int], int]] = []
+        for module in level:
+            children = __CHILD_SLOTS.get(type(module.module_reference))
+            if children is None:  # Should actually never arrive here
+                raise RuntimeError()
+
+            for (index, rotation) in children:
+                forward = __SLOT_FORWARD[module.frame][rotation]
+                slots.append(
+                    (
+                        module,
+                        index,
+                        rotation,
+                        __add(module.position, forward),
+                        module.key + __SLOT_KEY_OFFSET[module.frame][rotation],
+                    )
+                )
+
+        # query the CPPN once for all free positions of the next depth
+        chain_length = level[0].chain_length + 1
+        free = {key: position for *_, position, key in slots if key not in grid}
+        outputs = dict(zip(free, evaluate_cppn(list(free.values()), chain_length)))
+
+        next_level: List[__Module] = []
+        for (module, index, rotation, position, key) in slots:
+            if part_count >= max_parts:
+                break
+
+            # if grid cell is occupied, don't make a child
+            # else, set cell as occupied
+            if key in grid:
+                continue
+            grid.add(key)
+
+            child_type, orientation = outputs[key]
+            if child_type is None:
+                continue
+
+            child = child_type(orientation * (math.pi / 2.0))
+            module.module_reference.children[index] = child
+            next_level.append(
+                __Module(
+                    position,
+                    key,
+                    __CHILD_FRAME[module.frame][rotation][orientation],
+                    chain_length,
+                    child,
+                )
+            )
+            part_count += 1
+        level = next_level
 
     body.finalize()
     return body
 
 
+def __make_compiled_evaluator(
+    genotype: Genotype,
+) -> Callable[[List[Tuple[int, int, int]], int], List[Tuple[Any, int]]]:
+    """
+    Make a function that queries the CPPN, with NumPy, for many positions at once.
+
+    :param genotype: The genotype.
+    :returns: The function, of the positions and the chain length.
+    """
+    network = compile_genome(genotype.genotype)
+
+    def evaluate(
+        positions: List[Tuple[int, int, int]], chain_length: int
+    ) -> List[Tuple[Any, int]]:
+        if not positions:
+            return []
+        inputs = np.empty((len(positions), 5))
+        inputs[:, 0] = 1.0  # bias input
+        inputs[:, 1:4] = positions
+        inputs[:, 4] = chain_length
+        outputs = network(inputs)
+
+        # the lowest output wins, the first one on a tie, as in `__evaluate_cppn`
+        module_types = np.argmin(outputs[:, 0:3], axis=1)
+        rotations = np.argmin(outputs[:, 3:5], axis=1)
+        return [
+            (__MODULE_TYPES[module_type], int(rotation))
+            for module_type, rotation in zip(module_types, rotations)
+        ]
+
+    return evaluate
+
+
+def __make_multineat_evaluator(
+    genotype: Genotype,
+) -> Callable[[List[Tuple[int, int, int]], int], List[Tuple[Any, int]]]:
+    """
+    Make a function that queries the CPPN, with multineat, one position at a time.
+
+    :param genotype: The genotype.
+    :returns: The function, of the positions and the chain length.
+    """
+    body_net = multineat.NeuralNetwork()  # type: ignore # STUB
+    genotype.genotype.BuildPhenotype(body_net)
+
+    def evaluate(
+        positions: List[Tuple[int, int, int]], chain_length: int
+    ) -> List[Tuple[Any, int]]:
+        return [
+            __evaluate_cppn(body_net, position, chain_length) for position in positions
+        ]
+
+    return evaluate
+
+
+# Module type of every CPPN output, None for an empty slot
+__MODULE_TYPES = [None, Brick, ActiveHinge]
+
+
 def __evaluate_cppn(
     body_net: multineat.NeuralNetwork,  # type: ignore # STUB
     position: Tuple[int, int, int],
@@ -164,8 +267,7 @@ def __evaluate_cppn(
 
     # get module type from output probabilities
     type_probs = [outputs[0], outputs[1], outputs[2]]
-    types = [None, Brick, ActiveHinge]
-    module_type = types[type_probs.index(min(type_probs))]
+    module_type = __MODULE_TYPES[type_probs.index(min(type_probs))]
 
     # get rotation from output probabilities
     rotation_probs = [outputs[3], outputs[4]]
@@ -174,41 +276,6 @@ def __evaluate_cppn(
     return (module_type, rotation)
 
 
-def ___add_child(
-    body_net: multineat.NeuralNetwork,  # type: ignore # STUB
-    module: __Module,
-    child_index: int,
-    rotation: int,
-    grid: Set[Tuple[int, int, int]],
-) -> Optional[__Module]:
-    forward = __rotate(module.forward, module.up, rotation)
-    position = __add(module.position, forward)
-    chain_length = module.chain_length + 1
-
-    # if grid cell is occupied, don't make a child
-    # else, set cell as occupied
-    if position in grid:
-        return None
-    else:
-        grid.add(position)
-
-    child_type, orientation = __evaluate_cppn(body_net, position, chain_length)
-    if child_type is None:
-        return None
-    up = __rotate(module.up, forward, orientation)
-
-    child = child_type(orientation * (math.pi / 2.0))
-    module.module_reference.children[child_index] = child
-
-    return __Module(
-        position,
-        forward,
-        up,
-        chain_length,
-        child,
-    )
-
-
 def __add(a: Tuple[int, int, int], b: Tuple[int, int, int]) -> Tuple[int, int, int]:
     return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
 
@@ -265,3 +332,55 @@ def __rotate(
         ),
         __timesscalar(b, __dot(b, a) * (1 - cosangle)),
     )
+
+
+# Child index and rotation of every attachment slot, per module type
+__CHILD_SLOTS: Dict[type, List[Tuple[int, int]]] = {
+    Core: [(Core.FRONT, 0), (Core.LEFT, 1), (Core.BACK, 2), (Core.RIGHT, 3)],
+    Brick: [(Brick.FRONT, 0), (Brick.LEFT, 1), (Brick.RIGHT, 3)],
+    ActiveHinge: [(ActiveHinge.ATTACHMENT, 0)],
+}
+
+# Positions are packed into a single int for the occupancy grid, with this many
+# bits per coordinate; adding packed offsets is the same as adding positions
+__PACK_BITS = 16
+
+
+def __pack(position: Tuple[int, int, int]) -> int:
+    offset = 1 << (__PACK_BITS - 1)
+    return (
+        ((position[0] + offset) << (2 * __PACK_BITS))
+        | ((position[1] + offset) << __PACK_BITS)
+        | (position[2] + offset)
+    )
+
+
+# The 24 orientation frames of a module: forward and up, two orthogonal axes
+__AXES = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+__FRAMES = [
+    (forward, up) for forward in __AXES for up in __AXES if __dot(forward, up) == 0
+]
+__FRAME_INDEX = {frame: i for i, frame in enumerate(__FRAMES)}
+__CORE_FRAME = __FRAME_INDEX[((0, -1, 0), (0, 0, 1))]
+
+# Direction of the child slot at every rotation, per frame
+__SLOT_FORWARD = [
+    [__rotate(forward, up, rotation) for rotation in range(4)]
+    for forward, up in __FRAMES
+]
+__SLOT_KEY_OFFSET = [
+    [__pack(direction) - __pack((0, 0, 0)) for direction in directions]
+    for directions in __SLOT_FORWARD
+]
+
+# Frame of the child in the slot at every rotation, for every child orientation
+__CHILD_FRAME = [
+    [
+        [
+            __FRAME_INDEX[(slot, __rotate(up, slot, orientation))]
+            for orientation in range(4)
+        ]
+        for slot in __SLOT_FORWARD[frame]
+    ]
+    for frame, (_, up) in enumerate(__FRAMES)
+]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+NumPy evaluation of CPPNWIN networks.
+
+Multineat evaluates its networks one input at a time. A compiled network takes
+a matrix of inputs, one row per query, and evaluates its neurons layer by layer:
+a layer holds the neurons whose inputs all come from earlier layers, so it is a
+single matrix product followed by the activation functions. The networks have
+no recurrent connections (see `make_multineat_params`), so this gives the same
+outputs as `NeuralNetwork.ActivateAllLayers`, up to floating point rounding.
+"""
+
+# Future libraries
+from __future__ import annotations
+
+# Standard libraries
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+# Multineat
+import multineat
+
+# Activation function, of the weighted input sums and the `a` and `b` of the neurons
+_ActivationFunction = Callable[
+    [npt.NDArray[np.float_], npt.NDArray[np.float_], npt.NDArray[np.float_]],
+    npt.NDArray[np.float_],
+]
+
+
+def _tanh(
+    x: npt.NDArray[np.float_], a: npt.NDArray[np.float_], b: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    return np.tanh(x * a)
+
+
+def _signed_sine(
+    x: npt.NDArray[np.float_], a: npt.NDArray[np.float_], b: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    return np.sin(x * a + b)
+
+
+def _signed_gauss(
+    x: npt.NDArray[np.float_], a: npt.NDArray[np.float_], b: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    return (np.exp(-a * x * x + b) - 0.5) * 2.0
+
+
+def _signed_step(
+    x: npt.NDArray[np.float_], a: npt.NDArray[np.float_], b: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    return np.where(x > b, 1.0, -1.0)
+
+
+def _linear(
+    x: npt.NDArray[np.float_], a: npt.NDArray[np.float_], b: npt.NDArray[np.float_]
+) -> npt.NDArray[np.float_]:
+    return x + b
+
+
+# The activation functions enabled in `make_multineat_params`, as in multineat
+_ACTIVATION_FUNCTIONS: Dict[object, _ActivationFunction] = {
+    multineat.ActivationFunction.TANH: _tanh,  # type: ignore # STUB
+    multineat.ActivationFunction.SIGNED_SINE: _signed_sine,  # type: ignore # STUB
+    multineat.ActivationFunction.SIGNED_GAUSS: _signed_gauss,  # type: ignore # STUB
+    multineat.ActivationFunction.SIGNED_STEP: _signed_step,  # type: ignore # STUB
+    multineat.ActivationFunction.LINEAR: _linear,  # type: ignore # STUB
+}
+
+
+@dataclass
+class _Layer:
+    """Neurons that are evaluated together."""
+
+    neurons: npt.NDArray[np.int64]
+    weights: npt.NDArray[np.float_]  # from every neuron to the neurons of the layer
+    activations: List[Tuple[_ActivationFunction, npt.NDArray[np.int64]]]  # columns
+
+
+class CompiledNetwork:
+    """A multineat network, evaluated with NumPy on many inputs at once."""
+
+    _num_inputs: int
+    _num_outputs: int
+    _num_neurons: int
+    _a: npt.NDArray[np.float_]
+    _b: npt.NDArray[np.float_]
+    _layers: List[_Layer]
+
+    def __init__(self, network: multineat.NeuralNetwork) -> None:  # type: ignore # STUB
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        network : multineat.NeuralNetwork
+            The network to compile, without recurrent connections.
+
+        Raises
+        ------
+        ValueError
+            If the network has recurrent connections, or an activation function
+            that is not supported.
+        """
+        neurons = list(network.neurons)
+        connections = list(network.connections)
+        self._num_inputs = network.NumInputs()
+        self._num_outputs = network.NumOutputs()
+        self._num_neurons = len(neurons)
+        self._a = np.array([neuron.a for neuron in neurons], dtype=np.float64)
+        self._b = np.array([neuron.b for neuron in neurons], dtype=np.float64)
+
+        weights = np.zeros((self._num_neurons, self._num_neurons))
+        for connection in connections:
+            weights[
+                connection.source_neuron_idx, connection.target_neuron_idx
+            ] += connection.weight
+
+        # layer of every neuron, one deeper than the deepest of its sources
+        targets: List[List[int]] = [[] for _ in neurons]
+        num_sources = [0 for _ in neurons]
+        for connection in connections:
+            targets[connection.source_neuron_idx].append(connection.target_neuron_idx)
+            num_sources[connection.target_neuron_idx] += 1
+        depth = [0 if i < self._num_inputs else 1 for i in range(self._num_neurons)]
+        ready = [i for i in range(self._num_neurons) if num_sources[i] == 0]
+        num_sorted = 0
+        while ready:
+            source = ready.pop()
+            num_sorted += 1
+            for target in targets[source]:
+                depth[target] = max(depth[target], depth[source] + 1)
+                num_sources[target] -= 1
+                if num_sources[target] == 0:
+                    ready.append(target)
+        if num_sorted < self._num_neurons:
+            raise ValueError("The network has recurrent connections.")
+
+        self._layers = []
+        for layer_depth in range(1, max(depth, default=0) + 1):
+            layer = np.array(
+                [i for i, d in enumerate(depth) if d == layer_depth], dtype=np.int64
+            )
+            by_function: Dict[object, List[int]] = {}
+            for column, i in enumerate(layer):
+                function_type = neurons[i].activation_function_type
+                if function_type not in _ACTIVATION_FUNCTIONS:
+                    raise ValueError(
+                        f"Activation function {function_type} is not supported."
+                    )
+                by_function.setdefault(function_type, []).append(column)
+            self._layers.append(
+                _Layer(
+                    neurons=layer,
+                    weights=weights[:, layer],
+                    activations=[
+                        (_ACTIVATION_FUNCTIONS[function_type], np.array(columns))
+                        for function_type, columns in by_function.items()
+                    ],
+                )
+            )
+
+    def __call__(self, inputs: npt.NDArray[np.float_]) -> npt.NDArray[np.float_]:
+        """
+        Evaluate the network.
+
+        Parameters
+        ----------
+        inputs : npt.NDArray[np.float_]
+            The inputs, one row per query, including the bias input.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            The outputs, one row per query.
+        """
+        assert inputs.shape[1] == self._num_inputs
+        activations = np.zeros((inputs.shape[0], self._num_neurons))
+        activations[:, : self._num_inputs] = inputs
+
+        for layer in self._layers:
+            sums = activations @ layer.weights
+            values = np.empty_like(sums)
+            for function, columns in layer.activations:
+                neurons = layer.neurons[columns]
+                values[:, columns] = function(
+                    sums[:, columns], self._a[neurons], self._b[neurons]
+                )
+            activations[:, layer.neurons] = values
+
+        return activations[:, self._num_inputs : self._num_inputs + self._num_outputs]
+
+
+def compile_genome(genome: multineat.Genome) -> CompiledNetwork:  # type: ignore # STUB
+    """
+    Compile the network of a multineat genome.
+
+    Parameters
+    ----------
+    genome : multineat.Genome
+        The genome.
+
+    Returns
+    -------
+    CompiledNetwork
+        The compiled network.
+    """
+    network = multineat.NeuralNetwork()  # type: ignore # STUB
+    genome.BuildPhenotype(network)
+    return CompiledNetwork(network)
@@ -10,7 +10,10 @@ This code is provided "As Is"
 """
 
 # Standard libraries
-from typing import List, Tuple, cast
+from typing import List, Tuple
+
+# Third-party libraries
+import numpy as np
 
 # Multineat
 import multineat
@@ -21,6 +24,9 @@ from revolve2.core.modular_robot.brains import (
     BrainCpgNetworkNeighbour as ModularRobotBrainCpgNetworkNeighbour,
 )
 
+# Genotypes
+from body.cppnwin.network import compile_genome
+
 
 class BrainCpgNetworkNeighbour(ModularRobotBrainCpgNetworkNeighbour):
     """
@@ -29,6 +35,7 @@ class BrainCpgNetworkNeighbour(ModularRobotBrainCpgNetworkNeighbour):
     Weights are determined by querying the CPPN network with inputs:
     (hinge1_posx, hinge1_posy, hinge1_posz, hinge2_posx, hinge2_posy, hinge3_posz)
     If the weight in internal, hinge1 and hinge2 position will be the same.
+    All weights are queried at once, with the network compiled to NumPy.
     """
 
     _genotype: multineat.Genome  # type: ignore # STUB
@@ -47,52 +54,26 @@ class BrainCpgNetworkNeighbour(ModularRobotBrainCpgNetworkNeighbour):
         connections: List[Tuple[ActiveHinge, ActiveHinge]],
         body: Body,
     ) -> Tuple[List[float], List[float]]:
-        brain_net = multineat.NeuralNetwork()  # type: ignore # STUB
-        self._genotype.BuildPhenotype(brain_net)
-
-        internal_weights = [
-            self._evaluate_network(
-                brain_net,
-                [
-                    1.0,
-                    float(pos.x),
-                    float(pos.y),
-                    float(pos.z),
-                    float(pos.x),
-                    float(pos.y),
-                    float(pos.z),
-                ],
-            )
-            for pos in [
-                body.grid_position(active_hinge) for active_hinge in active_hinges
-            ]
-        ]
-
-        external_weights = [
-            self._evaluate_network(
-                brain_net,
-                [
-                    1.0,
-                    float(pos1.x),
-                    float(pos1.y),
-                    float(pos1.z),
-                    float(pos2.x),
-                    float(pos2.y),
-                    float(pos2.z),
-                ],
-            )
-            for (pos1, pos2) in [
-                (body.grid_position(active_hinge1), body.grid_position(active_hinge2))
-                for (active_hinge1, active_hinge2) in connections
-            ]
-        ]
+        brain_net = compile_genome(self._genotype)
+
+        # grid position of every active hinge, once
+        positions = {
+            id(active_hinge): body.grid_position(active_hinge)
+            for active_hinge in active_hinges
+        }
+        hinge_pairs = [(hinge, hinge) for hinge in active_hinges] + connections
+
+        # one row per weight: bias, position of hinge1, position of hinge2
+        inputs = np.empty((len(hinge_pairs), 7))
+        inputs[:, 0] = 1.0
+        for row, (active_hinge1, active_hinge2) in enumerate(hinge_pairs):
+            pos1 = positions[id(active_hinge1)]
+            pos2 = positions[id(active_hinge2)]
+            inputs[row, 1:4] = (pos1.x, pos1.y, pos1.z)
+            inputs[row, 4:7] = (pos2.x, pos2.y, pos2.z)
+
+        weights = brain_net(inputs)[:, 0].tolist() if hinge_pairs else []
+        internal_weights = weights[: len(active_hinges)]
+        external_weights = weights[len(active_hinges) :]
 
         return (internal_weights, external_weights)
-
-    @staticmethod
-    def _evaluate_network(
-        network: multineat.NeuralNetwork, inputs: List[float]  # type: ignore # STUB
-    ) -> float:
-        network.Input(inputs)
-        network.ActivateAllLayers()
-        return cast(float, network.Output()[0])
@@ -1,14 +1,18 @@
 """LAG (Lamarckian Array Genotype)"""
 
-from .crossover import crossover
-from .genotype import Genotype, GenotypeSerializer
-from .mutate import mutate
+from .crossover import crossover, crossover_population
+from .genotype import AnyGenotype, Genotype, GenotypeSerializer, SparseGenotype
+from .mutate import mutate, mutate_population
 from .random import random
 
 __all__ = [
+    "AnyGenotype",
     "Genotype",
     "GenotypeSerializer",
+    "SparseGenotype",
     "crossover",
+    "crossover_population",
     "mutate",
+    "mutate_population",
     "random",
 ]
@@ -9,46 +9,86 @@ Hardware:   M1 chip
 This code is provided "As Is"
 """
 
-# Standard libraries
-from random import Random
-
 # Third-party libraries
 import numpy as np
+import numpy.typing as npt
 
 # Local libraries
-from .genotype import Genotype
+from .genotype import AnyGenotype, Genotype, SparseGenotype
 
 
 def crossover(
-    parent1: Genotype,
-    parent2: Genotype,
-    rng: Random,
+    parent1: AnyGenotype,
+    parent2: AnyGenotype,
+    rng: np.random.Generator,
     crossover_prob: float,
-) -> Genotype:
+) -> AnyGenotype:
     """Perform uniform crossover between two LAG genotypes.
 
     Parameters
     ----------
-    parent1 : Genotype
+    parent1 : AnyGenotype
         The first parent. (remains unchanged)
-    parent2 : Genotype
-        The second parent. (remains unchanged)
-    rng : multineat.RNG
+    parent2 : AnyGenotype
+        The second parent, dense if and only if the first one is. (remains unchanged)
+    rng : np.random.Generator
         Random number generator.
     crossover_prob : float
-        The probability of crossover.
+        The probability of taking a gene from the first parent.
 
     Returns
     -------
-    Genotype
-        The result of crossover.
+    AnyGenotype
+        The result of crossover. A sparse child stores the cells stored by either
+        parent, the others come from the first parent.
     """
+    if isinstance(parent1, SparseGenotype):
+        assert isinstance(parent2, SparseGenotype)
+        cells = np.union1d(parent1.cells, parent2.cells)
+        values = crossover_population(
+            parent1.get_cells(cells)[np.newaxis, :],
+            parent2.get_cells(cells)[np.newaxis, :],
+            rng,
+            crossover_prob,
+        )[0]
+        return SparseGenotype(
+            parent1.seed, parent1.grid_size, cells, values, parent1.default
+        )
 
-    genotype = np.ones(parent1.genotype.shape[0]) * 0.5
-    for i in range(genotype.shape[0]):
-        if rng.uniform(0, 1) < crossover_prob:
-            genotype[i] = parent1.genotype[i]
-        else:
-            genotype[i] = parent2.genotype[i]
-
+    assert isinstance(parent2, Genotype)
+    genotype = crossover_population(
+        parent1.genotype[np.newaxis, :],
+        parent2.genotype[np.newaxis, :],
+        rng,
+        crossover_prob,
+    )[0]
     return Genotype(genotype, parent1.grid_size)
+
+
+def crossover_population(
+    parents1: npt.NDArray[np.float_],
+    parents2: npt.NDArray[np.float_],
+    rng: np.random.Generator,
+    crossover_prob: float,
+) -> npt.NDArray[np.float_]:
+    """Perform uniform crossover between pairs of LAG genomes at once.
+
+    Parameters
+    ----------
+    parents1 : npt.NDArray[np.float_]
+        The first parent of every child, one genome per row. (remains unchanged)
+    parents2 : npt.NDArray[np.float_]
+        The second parent of every child, one genome per row. (remains unchanged)
+    rng : np.random.Generator
+        Random number generator.
+    crossover_prob : float
+        The probability of taking a gene from the first parent.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The children, one genome per row.
+    """
+    assert parents1.shape == parents2.shape
+    mask = rng.random(parents1.shape) < crossover_prob
+    return np.where(mask, parents1, parents2)
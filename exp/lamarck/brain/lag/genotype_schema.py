@@ -31,6 +31,7 @@ class DbGenotype(DbBase):
         primary_key=True,
     )
 
-    genome = sqlalchemy.Column(sqlalchemy.PickleType, nullable=False)
+    # binary genome, see `genotype.encode_genome`; pickled in older databases
+    genome = sqlalchemy.Column(sqlalchemy.LargeBinary, nullable=False)
 
     grid_size = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+CPG brain that integrates its network exactly.
+
+The CPG network is a linear system ds/dt = W s with a fixed weight matrix W, so
+the state after a time step dt is exp(W dt) s. The transition matrix exp(W dt)
+is computed once per time step, after which every control step is a single
+matrix-vector product, without the integration error of Runge-Kutta.
+"""
+
+# Standard libraries
+from typing import List, Optional
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+# Revolve
+from revolve2.actor_controller import ActorController
+from revolve2.actor_controllers.cpg import CpgActorController
+from revolve2.core.modular_robot import Body
+from revolve2.core.modular_robot.brains import BrainCpgNetworkStatic
+
+# Number of Taylor terms of the matrix exponential, after scaling the norm below 0.5
+_TAYLOR_TERMS = 12
+
+
+def transition_matrix(
+    weight_matrix: npt.NDArray[np.float_], dt: float
+) -> npt.NDArray[np.float_]:
+    """Compute exp(W dt) by scaling and squaring a truncated Taylor series.
+
+    Parameters
+    ----------
+    weight_matrix : npt.NDArray[np.float_]
+        The weight matrix W, or a stack of weight matrices (..., n, n).
+    dt : float
+        The time step.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The transition matrix (or matrices) for the time step.
+    """
+    a = np.asarray(weight_matrix, dtype=np.float64) * dt
+
+    # scale so that the 1-norm is at most 0.5, the series then converges fast
+    norm = float(np.abs(a).sum(axis=-2).max()) if a.size > 0 else 0.0
+    squarings = max(0, int(np.ceil(np.log2(norm / 0.5)))) if norm > 0.5 else 0
+    a = a / 2.0**squarings
+
+    result = np.broadcast_to(np.eye(a.shape[-1]), a.shape).copy()
+    term = result.copy()
+    for k in range(1, _TAYLOR_TERMS + 1):
+        term = term @ a / k
+        result += term
+
+    for _ in range(squarings):
+        result = result @ result
+    return result
+
+
+class ExactCpgActorController(CpgActorController):
+    """CPG controller that steps its network with the exact transition matrix."""
+
+    _dt: Optional[float]
+    _transition_matrix: Optional[npt.NDArray[np.float_]]
+
+    def __init__(
+        self,
+        state: npt.NDArray[np.float_],
+        num_output_neurons: int,
+        weight_matrix: npt.NDArray[np.float_],
+        dof_ranges: npt.NDArray[np.float_],
+    ) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        state : npt.NDArray[np.float_]
+            The initial state of the network.
+        num_output_neurons : int
+            Number of neurons that are used as dof targets.
+        weight_matrix : npt.NDArray[np.float_]
+            The weight matrix of the network.
+        dof_ranges : npt.NDArray[np.float_]
+            Maximum absolute dof target of every output neuron.
+        """
+        super().__init__(state, num_output_neurons, weight_matrix, dof_ranges)
+        self._dt = None
+        self._transition_matrix = None
+
+    def step(self, dt: float) -> None:
+        """Step the network.
+
+        Parameters
+        ----------
+        dt : float
+            The time step.
+        """
+        self._state = self.transition_matrix(dt) @ self._state
+
+    def transition_matrix(self, dt: float) -> npt.NDArray[np.float_]:
+        """Get the transition matrix for a time step, computed once per time step."""
+        if self._transition_matrix is None or self._dt != dt:
+            self._transition_matrix = transition_matrix(self._weight_matrix, dt)
+            self._dt = dt
+        return self._transition_matrix
+
+
+class BrainCpgNetworkExact(BrainCpgNetworkStatic):
+    """Static CPG brain with an exactly integrated network."""
+
+    def make_controller(self, body: Body, dof_ids: List[int]) -> ActorController:
+        """
+        Create a controller for the provided body.
+
+        Parameters
+        ----------
+        body : Body
+            The body to make the controller for.
+        dof_ids : List[int]
+            Map from actor joint index to module id.
+
+        Returns
+        -------
+        ActorController
+            The created controller.
+        """
+        return ExactCpgActorController(
+            self._initial_state,
+            self._num_output_neurons,
+            self._weight_matrix,
+            self._dof_ranges,
+        )
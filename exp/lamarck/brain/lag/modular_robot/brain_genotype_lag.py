@@ -14,18 +14,23 @@ Functions for LAG genotypes for a modular robot CPG brain.
 # Standard libraries
 import math
 from random import Random
+from typing import List, Optional, Sequence
+
+# Third-party libraries
+from pyrr import Vector3
 
 # Revolve
 from revolve2.actor_controllers.cpg import Cpg, CpgNetworkStructure
-from revolve2.core.modular_robot import Body, Brain
+from revolve2.core.modular_robot import ActiveHinge, Body, Brain
 from revolve2.core.modular_robot.brains import BrainCpgNetworkStatic
 
 # Local libraries
-from ..genotype import Genotype
+from ..genotype import AnyGenotype
+from .brain_cpg_network_exact import BrainCpgNetworkExact
 from ..random import random as random_brain_genotype
 
 
-def random(grid_size: int, rng: Random) -> Genotype:
+def random(grid_size: int, rng: Random, sparse: bool = False) -> AnyGenotype:
     """
     Create a random LAG genotype.
 
@@ -35,21 +40,90 @@ def random(grid_size: int, rng: Random) -> Genotype:
         The length of (one side of) the genotype (grid).
     rng : Random
         Random number generator.
+    sparse : bool
+        Whether to create a sparse genotype.
     """
 
-    return random_brain_genotype(grid_size=grid_size, rng=rng)
+    return random_brain_genotype(grid_size=grid_size, rng=rng, sparse=sparse)
+
+
+def grid_size_for(max_parts: int) -> int:
+    """
+    Get a grid size that holds the hinges of any body of up to `max_parts` modules.
+
+    A module is at most `max_parts - 1` grid steps from the core, see
+    `grid_cells`. The grid has a margin of one cell, so 10 parts give 22.
+
+    Parameters
+    ----------
+    max_parts : int
+        Maximum number of modules of a body, including the core.
+
+    Returns
+    -------
+    int
+        The grid size.
+    """
+    assert max_parts >= 1
+    return 2 * (max_parts + 1)
 
 
-def develop(genotype: Genotype, body: Body) -> Brain:
+def grid_cells(grid_positions: Sequence[Vector3], grid_size: int) -> List[int]:
+    """
+    Get the cell of the genotype grid of every active hinge.
+
+    The grid is centered on the core. The vertical position is ignored.
+
+    Parameters
+    ----------
+    grid_positions : Sequence[Vector3]
+        The grid position of every active hinge.
+    grid_size : int
+        The length of (one side of) the genotype grid.
+
+    Returns
+    -------
+    List[int]
+        The cells, one per active hinge.
+
+    Raises
+    ------
+    IndexError
+        If a hinge is out of the grid, see `grid_size_for`.
+    """
+    half = grid_size // 2
+    cells = []
+    for pos in grid_positions:
+        if abs(pos[0]) >= half or abs(pos[1]) >= half:
+            raise IndexError(
+                f"Hinge at {list(pos)} out of the brain grid of size {grid_size}"
+            )
+        cells.append(int(pos[0] + pos[1] * grid_size + grid_size**2 / 2))
+    return cells
+
+
+def develop(
+    genotype: AnyGenotype,
+    body: Body,
+    active_hinges: Optional[List[ActiveHinge]] = None,
+    grid_positions: Optional[List[Vector3]] = None,
+    exact: bool = False,
+) -> Brain:
     """
     Develop a LAG genotype into a brain.
 
     Parameters
     ----------
-    genotype : Genotype
+    genotype : AnyGenotype
         The genotype to develop.
     body : Body
         The body to develop the brain for.
+    active_hinges : Optional[List[ActiveHinge]]
+        The active hinges of the body, if already known.
+    grid_positions : Optional[List[Vector3]]
+        The grid position of every active hinge, if already known.
+    exact : bool
+        Whether to integrate the CPG network exactly instead of with Runge-Kutta.
 
     Returns
     -------
@@ -57,24 +131,14 @@ def develop(genotype: Genotype, body: Body) -> Brain:
         The developed robot controller.
     """
     # Find the active hinges
-    hinges = body.find_active_hinges()
+    hinges = body.find_active_hinges() if active_hinges is None else active_hinges
+    if grid_positions is None:
+        grid_positions = [body.grid_position(hinge) for hinge in hinges]
     cpgs = [Cpg(i) for i, _ in enumerate(hinges)]
     cpg_structure = CpgNetworkStructure(cpgs, set())
 
     # Extract the parameters from the genotype
-    weights = genotype.genotype
-    grid_size = genotype.grid_size
-    params = []
-    for hinge in hinges:
-        try:
-            pos = body.grid_position(hinge)
-            params.append(
-                weights[int(pos[0] + pos[1] * grid_size + grid_size**2 / 2)]
-            )
-        except IndexError as e:
-            print(body.grid_position(hinge))
-            print(weights)
-            raise e
+    params = list(genotype.get_cells(grid_cells(grid_positions, genotype.grid_size)))
     # Initialize the CPGs
     initial_state = cpg_structure.make_uniform_state(
         value=0.5 * math.pi / 2.0,
@@ -84,7 +148,8 @@ def develop(genotype: Genotype, body: Body) -> Brain:
     )
     dof_ranges = cpg_structure.make_uniform_dof_ranges(1.0)
 
-    return BrainCpgNetworkStatic(
+    brain_type = BrainCpgNetworkExact if exact else BrainCpgNetworkStatic
+    return brain_type(
         initial_state=initial_state,
         num_output_neurons=cpg_structure.num_cpgs,
         weight_matrix=weight_matrix,
@@ -10,29 +10,32 @@ This code is provided "As Is"
 """
 
 # Standard libraries
-from random import Random
+from typing import Tuple
 
 # Third-party libraries
 import numpy as np
+import numpy.typing as npt
 
 # Local libraries
-from .genotype import Genotype
+from .genotype import AnyGenotype, Genotype, SparseGenotype
 
 
 def mutate(
-    genotype: Genotype,
-    rng: Random,
+    genotype: AnyGenotype,
+    rng: np.random.Generator,
     bound: float,
     mutate_prob: float,
-) -> Genotype:
+) -> AnyGenotype:
     """
     Mutate a LAG genotype. (random uniform mutation)
 
     Parameters
     ----------
-    genotype : Genotype
-        The genotype to mutate. (remains unchanged)
-    rng : multineat.RNG
+    genotype : AnyGenotype
+        The genotype to mutate. (remains unchanged) A sparse genotype gets the
+        same values as a dense one with the same grid, but only stores the
+        mutated cells.
+    rng : np.random.Generator
         Random number generator.
     bound : float
         The mutation bound.
@@ -41,13 +44,64 @@ def mutate(
 
     Returns
     -------
-    Genotype
+    AnyGenotype
         The result of mutation. (mutated copy)
     """
+    if isinstance(genotype, SparseGenotype):
+        # the draws of the whole grid, so the rng advances as for a dense genotype
+        mask, noise = _draw_mutations(
+            (1, genotype.grid_size**2), rng, bound, mutate_prob
+        )
+        cells = np.flatnonzero(mask[0])
+        values = genotype.get_cells(cells) + noise[0, cells]
+        return SparseGenotype(
+            genotype.seed, genotype.grid_size, cells, values, default=0.5
+        )
 
-    individual = np.ones(genotype.genotype.shape) * 0.5
-    for i in range(individual.shape[0]):
-        if rng.uniform(0, 1) < mutate_prob:
-            individual[i] = genotype.genotype[i] + rng.uniform(-bound, bound)
-
+    individual = mutate_population(
+        genotype.genotype[np.newaxis, :], rng, bound, mutate_prob
+    )[0]
     return Genotype(individual, genotype.grid_size)
+
+
+def mutate_population(
+    genotypes: npt.NDArray[np.float_],
+    rng: np.random.Generator,
+    bound: float,
+    mutate_prob: float,
+) -> npt.NDArray[np.float_]:
+    """
+    Mutate a matrix of LAG genomes at once, see `mutate`.
+
+    Parameters
+    ----------
+    genotypes : npt.NDArray[np.float_]
+        The genomes to mutate, one per row. (remains unchanged)
+    rng : np.random.Generator
+        Random number generator.
+    bound : float
+        The mutation bound.
+    mutate_prob : float
+        The mutation probability.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The mutated genomes, one per row.
+    """
+    mask, noise = _draw_mutations(genotypes.shape, rng, bound, mutate_prob)
+
+    # genes that are not mutated are reset to 0.5
+    return np.where(mask, genotypes + noise, 0.5)
+
+
+def _draw_mutations(
+    shape: Tuple[int, ...],
+    rng: np.random.Generator,
+    bound: float,
+    mutate_prob: float,
+) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.float_]]:
+    """Draw which genes are mutated, and the noise added to every gene."""
+    mask = rng.random(shape) < mutate_prob
+    noise = rng.uniform(-bound, bound, shape)
+    return mask, noise
@@ -16,13 +16,14 @@ from random import Random
 import numpy as np
 
 # Local libraries
-from .genotype import Genotype
+from .genotype import AnyGenotype, Genotype, SparseGenotype
 
 
 def random(
     grid_size: int,
     rng: Random,
-) -> Genotype:
+    sparse: bool = False,
+) -> AnyGenotype:
     """
     Create a random LAG genotype.
 
@@ -32,7 +33,17 @@ def random(
         The length of (one side of) the genotype (grid).
     rng : Random
         Random number generator. TODO rng is currently not numpy, but this would be very convenient
+    sparse : bool
+        Whether to create a sparse genotype, see `SparseGenotype`.
     """
+    if sparse:
+        return SparseGenotype(
+            seed=rng.randint(0, 2**63 - 1),
+            grid_size=grid_size,
+            cells=np.empty(0, dtype=np.int64),
+            values=np.empty(0, dtype=np.float64),
+        )
+
     # HACK this ensures (at least) that the np_rng is bounded to the rng
     np.random.seed(rng.randint(0, 2**32))
 
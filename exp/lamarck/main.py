@@ -28,20 +28,27 @@ optimize_robot:
 
 # Standard libraries
 import logging
+import os
 import time
 from random import Random
+from typing import List, Optional
 
 # Multineat
 import multineat
 
 # Revolve2
-from revolve2.core.database import open_async_database_sqlite
 from revolve2.core.optimization import DbId
 
+# Genotypes
+from brain.lag.modular_robot.brain_genotype_lag import grid_size_for
+
 # Local libraries
 from extra import Clr, setup
 from utils import Optimizer
 from utils import random as random_genotype
+from utils.database import TUNED_PROFILE, SqliteProfile, open_async_database
+from utils.learning.openai_es.racing import SuccessiveHalving
+from utils.simulation import EarlyStopping, JobPool, RemoteWorkers, SimulationPool
 
 
 async def main() -> None:
@@ -60,6 +67,54 @@ async def main() -> None:
     # Number of mutations to apply to the initial population
     NUM_INITIAL_MUTATIONS = 10
 
+    # Maximum number of modules of a body, the brain grid is sized to fit
+    MAX_PARTS = 10
+
+    # Number of simulator processes, shared by evaluation and learning
+    NUM_SIMULATORS = os.cpu_count() or 1
+
+    # Simulation workers on other nodes, instead of the simulator processes (None:
+    # off), e.g. ["node1:6000", "node2:6000"], see `utils/simulation/remote.py`
+    # The key shared with the workers comes from the environment, never a default
+    SIMULATION_WORKERS: Optional[List[str]] = None
+    SIMULATION_AUTHKEY = os.environ.get("LAMARCK_SIMULATION_AUTHKEY", "")
+
+    # Asynchronous steady-state evolution instead of generations, with the same
+    # number of evaluated offspring
+    STEADY_STATE = False
+    NUM_STEADY_STATE_WORKERS = os.cpu_count() or 1
+
+    # Number of learning periods to run at the same time, in this process, all
+    # simulating on the simulator processes above
+    NUM_LEARNING_WORKERS = os.cpu_count() or 1
+
+    # Step all learners through ES together, one simulation batch per ES generation
+    LEARNING_LOCKSTEP = False
+
+    # Cache of simulated fitnesses (0 to disable), kept across runs
+    FITNESS_CACHE_SIZE = 100_000
+    FITNESS_CACHE_PATH = "./extra/fitness_cache.pickle"
+
+    # Simulate and learn robots with equivalent bodies and brains only once
+    DEDUPLICATE_ROBOTS = True
+
+    # Stop simulations of robots that stand still or fall over (None to disable),
+    # e.g. EarlyStopping(grace_period=1.0, patience=5.0, min_progress=0.05)
+    EARLY_STOPPING: Optional[EarlyStopping] = None
+
+    # Race the ES samples of the learning periods over growing horizons (None: off),
+    # e.g. SuccessiveHalving(rungs=(0.2, 0.5, 1.0), keep_fraction=0.5)
+    LEARNING_SUCCESSIVE_HALVING: Optional[SuccessiveHalving] = None
+
+    # Integrate the CPG networks exactly instead of with Runge-Kutta
+    EXACT_CPG = False
+
+    # Only store the brain weights of the grid cells used by the bodies
+    SPARSE_BRAIN = False
+
+    # SQLite settings of the database (None: SQLite defaults), see `utils/database.py`
+    DATABASE_PROFILE: Optional[SqliteProfile] = TUNED_PROFILE
+
     # Log experiment parameters
     logging.info(f"Population size: {Clr.green}{POPULATION_SIZE}{Clr.end}")
     logging.info(f"Offspring size: {Clr.green}{OFFSPRING_SIZE}{Clr.end}")
@@ -67,16 +122,44 @@ async def main() -> None:
     logging.info(
         f"Number of initial mutations: {Clr.green}{NUM_INITIAL_MUTATIONS}{Clr.end}"
     )
+    logging.info(f"Maximum parts: {Clr.green}{MAX_PARTS}{Clr.end}")
     logging.info(f"Simulation time: {Clr.green}{SIMULATION_TIME}{Clr.end}")
     logging.info(f"Sampling frequency: {Clr.green}{SAMPLING_FREQUENCY}{Clr.end}")
     logging.info(f"Control frequency: {Clr.green}{CONTROL_FREQUENCY}{Clr.end}")
+    logging.info(f"Simulators: {Clr.green}{NUM_SIMULATORS}{Clr.end}")
+    logging.info(f"Simulation workers: {Clr.green}{SIMULATION_WORKERS}{Clr.end}")
+    logging.info(f"Steady state: {Clr.green}{STEADY_STATE}{Clr.end}")
+    logging.info(f"Learning workers: {Clr.green}{NUM_LEARNING_WORKERS}{Clr.end}")
+    logging.info(f"Learning lockstep: {Clr.green}{LEARNING_LOCKSTEP}{Clr.end}")
+    logging.info(f"Fitness cache size: {Clr.green}{FITNESS_CACHE_SIZE}{Clr.end}")
+    logging.info(f"Deduplicate robots: {Clr.green}{DEDUPLICATE_ROBOTS}{Clr.end}")
+    logging.info(f"Early stopping: {Clr.green}{EARLY_STOPPING}{Clr.end}")
+    logging.info(
+        f"Successive halving: {Clr.green}{LEARNING_SUCCESSIVE_HALVING}{Clr.end}"
+    )
+    logging.info(f"Exact CPG: {Clr.green}{EXACT_CPG}{Clr.end}")
+    logging.info(f"Sparse brain: {Clr.green}{SPARSE_BRAIN}{Clr.end}")
+    logging.info(f"Database profile: {Clr.green}{DATABASE_PROFILE}{Clr.end}")
 
     # Random number generator
     rng = Random()
     rng.seed(28)
 
+    # Simulator processes, started once for the whole optimization
+    simulation_pool: JobPool
+    if SIMULATION_WORKERS is not None:
+        if not SIMULATION_AUTHKEY:
+            raise ValueError(
+                "Set LAMARCK_SIMULATION_AUTHKEY to the key of the simulation workers"
+            )
+        simulation_pool = RemoteWorkers(SIMULATION_WORKERS, SIMULATION_AUTHKEY)
+    else:
+        simulation_pool = SimulationPool(num_workers=NUM_SIMULATORS)
+
     # database
-    database = open_async_database_sqlite("./extra/database", create=True)
+    database = open_async_database(
+        "./extra/database", create=True, profile=DATABASE_PROFILE
+    )
 
     # unique database identifier for optimizer
     db_id = DbId.root("opt")  # learning delta optimization
@@ -90,7 +173,8 @@ async def main() -> None:
             innov_db_body=innov_db_body,
             rng=rng,
             num_initial_mutations=NUM_INITIAL_MUTATIONS,
-            brain_grid_size=22,
+            brain_grid_size=grid_size_for(MAX_PARTS),
+            sparse_brain=SPARSE_BRAIN,
         )
         for _ in range(POPULATION_SIZE)
     ]
@@ -100,6 +184,16 @@ async def main() -> None:
         db_id=db_id,
         innov_db_body=innov_db_body,
         rng=rng,
+        num_learning_workers=NUM_LEARNING_WORKERS,
+        learning_lockstep=LEARNING_LOCKSTEP,
+        fitness_cache_size=FITNESS_CACHE_SIZE,
+        fitness_cache_path=FITNESS_CACHE_PATH,
+        deduplicate_robots=DEDUPLICATE_ROBOTS,
+        early_stopping=EARLY_STOPPING,
+        successive_halving=LEARNING_SUCCESSIVE_HALVING,
+        exact_cpg=EXACT_CPG,
+        simulation_pool=simulation_pool,
+        max_parts=MAX_PARTS,
     )
     if maybe_optimizer is not None:
         optimizer = maybe_optimizer
@@ -115,6 +209,16 @@ async def main() -> None:
             simulation_time=SIMULATION_TIME,
             sampling_frequency=SAMPLING_FREQUENCY,
             control_frequency=CONTROL_FREQUENCY,
+            num_learning_workers=NUM_LEARNING_WORKERS,
+            learning_lockstep=LEARNING_LOCKSTEP,
+            fitness_cache_size=FITNESS_CACHE_SIZE,
+            fitness_cache_path=FITNESS_CACHE_PATH,
+            deduplicate_robots=DEDUPLICATE_ROBOTS,
+            early_stopping=EARLY_STOPPING,
+            successive_halving=LEARNING_SUCCESSIVE_HALVING,
+            exact_cpg=EXACT_CPG,
+            simulation_pool=simulation_pool,
+            max_parts=MAX_PARTS,
         )
 
     # Log start optimization
@@ -122,7 +226,17 @@ async def main() -> None:
 
     # Run the optimizer
     start = time.time()
-    await optimizer.run()
+    try:
+        if STEADY_STATE:
+            await optimizer.run_steady_state(
+                initial_population=initial_population,
+                num_evaluations=NUM_OF_GENERATIONS * OFFSPRING_SIZE,
+                num_workers=NUM_STEADY_STATE_WORKERS,
+            )
+        else:
+            await optimizer.run()
+    finally:
+        simulation_pool.shutdown()
     end = time.time()
 
     # Log end optimization
@@ -21,7 +21,6 @@ import matplotlib.pyplot as plt
 import pandas
 
 # Revolve2
-from revolve2.core.database import open_database_sqlite
 from revolve2.core.database.serializers import DbFloat
 from revolve2.core.optimization import DbId
 from revolve2.core.optimization.ea.generic_ea import (
@@ -36,6 +35,7 @@ from sqlalchemy.future import select
 
 # Local libraries
 from extra import Palette
+from utils.database import open_database_readonly
 from utils.optimizer_schema import DbFitness
 
 # Plotting parameters
@@ -57,7 +57,7 @@ class Plot(object):
         db_id = DbId(_db_id)
 
         # open the database
-        db = open_database_sqlite(database)
+        db = open_database_readonly(database)
         # read the optimizer data into a pandas dataframe
         df = pandas.read_sql(
             select(DbOpenaiESOptimizerIndividual).filter(
@@ -116,7 +116,7 @@ class Plot(object):
         db_id = DbId(_db_id)
 
         # Open the database
-        db = open_database_sqlite(database)
+        db = open_database_readonly(database)
 
         # Read the optimizer data into a pandas dataframe
         df = pandas.read_sql(
@@ -209,7 +209,7 @@ class Plot(object):
         db_id = DbId(_db_id)
 
         # open the database
-        db = open_database_sqlite(database)
+        db = open_database_readonly(database)
         # read the optimizer data into a pandas dataframe
         df = pandas.read_sql(
             select(DbFitness).filter((DbEAOptimizer.db_id == db_id.fullname)),
@@ -10,7 +10,6 @@ This code is provided "As Is"
 """
 
 # Revolve2
-from revolve2.core.database import open_async_database_sqlite
 from revolve2.core.database.serializers import DbFloat
 from revolve2.core.optimization.ea.generic_ea import DbEAOptimizerIndividual
 from revolve2.runners.mujoco import ModularRobotRerunner
@@ -21,11 +20,12 @@ from sqlalchemy.future import select
 
 # Local libraries
 from utils import GenotypeSerializer, develop
+from utils.database import open_async_database
 
 
 async def main() -> None:
 
-    db = open_async_database_sqlite("./extra/database", create=True)
+    db = open_async_database("./extra/database", create=True)
     async with AsyncSession(db) as session:
         best_individual = (
             await session.execute(
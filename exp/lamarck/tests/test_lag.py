@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Tests of the dense and the sparse LAG genotypes.
+
+Install `requirements-dev.txt`, then run from the experiment directory:
+`python -m pytest tests`.
+"""
+
+# Standard libraries
+import pickle
+from typing import List
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+# Genotypes
+from brain.lag import AnyGenotype, Genotype, SparseGenotype, mutate
+from brain.lag.genotype import decode_genomes, encode_genome
+
+GRID_SIZE = 6
+
+
+def grid(genotype: AnyGenotype) -> npt.NDArray[np.float_]:
+    """The values of all cells of the grid."""
+    return genotype.get_cells(np.arange(GRID_SIZE**2))
+
+
+def test_dense_and_sparse_mutate_alike() -> None:
+    sparse: AnyGenotype = SparseGenotype(
+        seed=3,
+        grid_size=GRID_SIZE,
+        cells=np.array([2, 7, 20], dtype=np.int64),
+        values=np.array([0.1, -1.5, 2.0]),
+    )
+    dense: AnyGenotype = Genotype(grid(sparse), GRID_SIZE)
+
+    sparse_rng = np.random.default_rng(11)
+    dense_rng = np.random.default_rng(11)
+    for _ in range(3):
+        sparse = mutate(sparse, sparse_rng, bound=0.2, mutate_prob=0.3)
+        dense = mutate(dense, dense_rng, bound=0.2, mutate_prob=0.3)
+        np.testing.assert_array_equal(grid(sparse), grid(dense))
+
+    # the mutated sparse genotype still decodes to the same grid
+    (decoded,) = decode_genomes([encode_genome(sparse)], [GRID_SIZE])
+    np.testing.assert_array_equal(grid(decoded), grid(dense))
+
+
+def test_decode_genomes_in_bulk() -> None:
+    genotypes: List[AnyGenotype] = [
+        Genotype(np.arange(GRID_SIZE**2, dtype=np.float64), GRID_SIZE),
+        SparseGenotype(5, GRID_SIZE, np.array([1, 4]), np.array([0.25, -0.5])),
+        Genotype(np.ones(GRID_SIZE**2), GRID_SIZE),
+        SparseGenotype(6, GRID_SIZE, np.array([3]), np.array([1.5]), default=0.5),
+        SparseGenotype(7, GRID_SIZE, np.empty(0, dtype=np.int64), np.empty(0)),
+    ]
+    genomes = [encode_genome(genotype) for genotype in genotypes]
+    genomes.append(encode_genome(genotypes[0], "<f4"))
+    genotypes.append(genotypes[0])
+
+    # written with pickle, and pickled again by the column, by older versions
+    genomes.append(pickle.dumps(pickle.dumps(np.full(GRID_SIZE**2, 2.0))))
+    genotypes.append(Genotype(np.full(GRID_SIZE**2, 2.0), GRID_SIZE))
+
+    decoded = decode_genomes(genomes, [GRID_SIZE for _ in genomes])
+    assert [type(genotype) for genotype in decoded] == [
+        type(genotype) for genotype in genotypes
+    ]
+    for genotype, expected in zip(decoded, genotypes):
+        np.testing.assert_array_equal(grid(genotype), grid(expected))
+
+    # every genotype owns writable values
+    for genotype in decoded:
+        if isinstance(genotype, Genotype):
+            assert genotype.genotype.flags.writeable
+        else:
+            assert genotype.cells.flags.writeable
+            assert genotype.values.flags.writeable
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Tests of the learning scheduler, with a runner that counts the simulations.
+
+Install `requirements-dev.txt`, then run from the experiment directory:
+`python -m pytest tests`.
+"""
+
+# Standard libraries
+import asyncio
+from pathlib import Path
+from typing import Any, List
+
+# Third-party libraries
+import pytest
+from pyrr import Quaternion, Vector3
+
+# Revolve2
+from revolve2.actor_controllers.cpg import Cpg, CpgNetworkStructure
+from revolve2.core.modular_robot import ActiveHinge, Body, Brick
+from revolve2.core.physics.running import (
+    ActorState,
+    Batch,
+    BatchResults,
+    EnvironmentResults,
+    EnvironmentState,
+    Runner,
+)
+
+# Local libraries
+from utils.cache import FitnessCache
+from utils.database import create_async_database
+from utils.learning.openai_es import optimizer as openai_es_optimizer
+from utils.learning.scheduler import (
+    LearningParameters,
+    LearningScheduler,
+    LearningTask,
+)
+
+
+class CountingRunner(Runner):
+    """Moves every robot by one meter, and counts the simulated environments."""
+
+    num_simulated = 0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    async def run_batch(self, batch: Batch) -> BatchResults:
+        CountingRunner.num_simulated += len(batch.environments)
+        return BatchResults(
+            [
+                EnvironmentResults(
+                    [
+                        EnvironmentState(0.0, [ActorState(Vector3(), Quaternion())]),
+                        EnvironmentState(
+                            batch.simulation_time,
+                            [ActorState(Vector3([1.0, 0.0, 0.0]), Quaternion())],
+                        ),
+                    ]
+                )
+                for _ in batch.environments
+            ]
+        )
+
+
+def make_task(db_id: str) -> LearningTask:
+    """A learner for a body with two hinges, always with the same seed."""
+    body = Body()
+    body.core.front = ActiveHinge(0.0)
+    body.core.front.attachment = Brick(0.0)
+    body.core.back = ActiveHinge(0.0)
+    body.finalize()
+    return LearningTask(
+        db_id=db_id,
+        seed=42,
+        body=body,
+        cpg_structure=CpgNetworkStructure([Cpg(0), Cpg(1)], set()),
+        initial_mean=[0.5, 0.5],
+    )
+
+
+def test_repeated_controller_is_not_simulated_with_one_worker(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(openai_es_optimizer, "MujocoRunner", CountingRunner)
+
+    database = create_async_database(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    scheduler = LearningScheduler(num_workers=1)
+    fitness_cache = FitnessCache(10_000)
+    parameters = LearningParameters(
+        population_size=4,
+        sigma=0.1,
+        learning_rate=0.05,
+        num_generations=2,
+        simulation_time=1,
+        sampling_frequency=5,
+        control_frequency=60,
+    )
+
+    async def run() -> List[int]:
+        num_simulated = []
+        try:
+            for db_id in ["first", "second"]:
+                CountingRunner.num_simulated = 0
+                await scheduler.run(
+                    database,
+                    [make_task(db_id)],
+                    parameters,
+                    fitness_cache=fitness_cache,
+                )
+                num_simulated.append(CountingRunner.num_simulated)
+        finally:
+            await database.dispose()
+            scheduler.shutdown()
+        return num_simulated
+
+    # the same seed and mean sample the same controllers, cached by the first run
+    first, second = asyncio.run(run())
+    assert first > 0
+    assert second == 0
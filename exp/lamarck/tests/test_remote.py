@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Tests of the remote simulation workers, on workers spawned on localhost.
+
+Install `requirements-dev.txt`, then run from the experiment directory:
+`python -m pytest tests`.
+"""
+
+# Standard libraries
+import asyncio
+import math
+import multiprocessing
+import operator
+from multiprocessing.process import BaseProcess
+from typing import Any, Iterator, List, Tuple
+
+# Third-party libraries
+import pytest
+
+# Local libraries
+from utils.simulation.remote import (
+    RemoteWorkers,
+    generate_authkey,
+    serve,
+    spawn_local_workers,
+)
+
+
+@pytest.fixture
+def workers() -> Iterator[Tuple[List[BaseProcess], List[str], str]]:
+    """Two workers on localhost, with a new key."""
+    authkey = generate_authkey()
+    processes, addresses = spawn_local_workers(2, authkey)
+    try:
+        yield processes, addresses, authkey
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def test_round_trip(workers: Tuple[List[BaseProcess], List[str], str]) -> None:
+    _, addresses, authkey = workers
+    pool = RemoteWorkers(addresses, authkey)
+
+    async def run() -> List[int]:
+        return list(
+            await asyncio.gather(*[pool.run(operator.mul, i, i) for i in range(20)])
+        )
+
+    try:
+        assert asyncio.run(run()) == [i * i for i in range(20)]
+        metrics = pool.metrics()
+        assert metrics.jobs_completed == 20
+        assert metrics.in_flight == 0
+    finally:
+        pool.shutdown()
+
+
+def test_job_error(workers: Tuple[List[BaseProcess], List[str], str]) -> None:
+    _, addresses, authkey = workers
+    pool = RemoteWorkers(addresses, authkey)
+    try:
+        with pytest.raises(RuntimeError, match="math domain error"):
+            asyncio.run(pool.run(math.sqrt, -1.0))
+        # the worker survives a failed job
+        assert asyncio.run(pool.run(math.sqrt, 4.0)) == 2.0
+    finally:
+        pool.shutdown()
+
+
+def test_worker_loss(workers: Tuple[List[BaseProcess], List[str], str]) -> None:
+    processes, addresses, authkey = workers
+    pool = RemoteWorkers(addresses, authkey, max_retries=10, retry_delay=0.05)
+
+    async def run(count: int) -> List[int]:
+        return list(
+            await asyncio.gather(*[pool.run(operator.add, i, 1) for i in range(count)])
+        )
+
+    async def run_lose_run() -> Tuple[List[int], List[int]]:
+        # connect to both workers, then lose one of them
+        before = await run(2 * len(addresses))
+        processes[0].terminate()
+        processes[0].join()
+        return before, await run(10)
+
+    try:
+        before, after = asyncio.run(run_lose_run())
+        assert before == [i + 1 for i in range(2 * len(addresses))]
+        assert after == [i + 1 for i in range(10)]
+    finally:
+        pool.shutdown()
+
+
+def test_all_workers_lost(workers: Tuple[List[BaseProcess], List[str], str]) -> None:
+    processes, addresses, authkey = workers
+    for process in processes:
+        process.terminate()
+        process.join()
+
+    pool = RemoteWorkers(addresses, authkey, max_retries=3, retry_delay=0.01)
+    try:
+        with pytest.raises(RuntimeError, match="in 4 attempts"):
+            asyncio.run(pool.run(operator.add, 1, 1))
+    finally:
+        pool.shutdown()
+
+
+def test_wrong_authkey(workers: Tuple[List[BaseProcess], List[str], str]) -> None:
+    _, addresses, _ = workers
+    pool = RemoteWorkers(addresses, generate_authkey())
+
+    async def run() -> List[Any]:
+        # more jobs than workers, a rejected worker must be free for the next job
+        return list(
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *[
+                        pool.run(operator.add, 1, 1)
+                        for _ in range(2 * len(addresses) + 1)
+                    ],
+                    return_exceptions=True,
+                ),
+                timeout=60,
+            )
+        )
+
+    try:
+        results = asyncio.run(run())
+        assert all(
+            isinstance(result, multiprocessing.AuthenticationError)
+            for result in results
+        )
+    finally:
+        pool.shutdown()
+
+
+def test_authkey_required() -> None:
+    with pytest.raises(ValueError):
+        RemoteWorkers(["127.0.0.1:6000"], "")
+    with pytest.raises(ValueError):
+        spawn_local_workers(1, "")
+    with pytest.raises(ValueError):
+        serve("", host="127.0.0.1", port=0)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Content-addressed cache of simulated fitnesses.
+
+The simulations are deterministic, so a robot with the same body, the same CPG
+parameters and the same simulation settings always gets the same fitness.
+"""
+
+# Standard libraries
+import hashlib
+import logging
+import os
+import pickle
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Third-party libraries
+import numpy as np
+
+# Local libraries
+from .simulation import EarlyStopping
+
+# Bump when a change to the simulation or the CPG setup invalidates old entries
+_CACHE_VERSION = 1
+
+
+class FitnessCache:
+    """Fitness cache with LRU eviction and optional on-disk persistence."""
+
+    _max_size: int
+    _path: Optional[str]
+    _entries: "OrderedDict[str, float]"
+    _recorded: Optional[List[Tuple[str, float]]]  # new entries, if recording
+
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int, path: Optional[str] = None) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        max_size : int
+            Maximum number of fitnesses to keep. The least recently used are evicted first.
+        path : Optional[str]
+            File to load the cache from and save it to. Not persisted if not given.
+        """
+        assert max_size > 0
+        self._max_size = max_size
+        self._path = path
+        self._entries = OrderedDict()
+        self._recorded = None
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                self._entries.update(pickle.load(f))
+            self._evict()
+            logging.info(f"Loaded {len(self._entries)} cached fitnesses from {path}")
+
+    @staticmethod
+    def make_key(
+        body_hash: str,
+        params: Sequence[float],
+        simulation_time: float,
+        sampling_frequency: float,
+        control_frequency: float,
+        early_stopping: Optional[EarlyStopping] = None,
+        exact_cpg: bool = False,
+    ) -> str:
+        """Make the key of a simulation.
+
+        Parameters
+        ----------
+        body_hash : str
+            Hash of the developed body. See `utils.morphology.body_hash`.
+        params : Sequence[float]
+            CPG parameters, one per active hinge.
+        simulation_time : float
+            Simulation time.
+        sampling_frequency : float
+            Sampling frequency.
+        control_frequency : float
+            Control frequency.
+        early_stopping : Optional[EarlyStopping]
+            Early stopping policy of the simulation, if any.
+        exact_cpg : bool
+            Whether the CPG network is integrated exactly.
+
+        Returns
+        -------
+        str
+            The key.
+        """
+        h = hashlib.sha1()
+        h.update(
+            f"{_CACHE_VERSION}|{body_hash}|{float(simulation_time)!r}|"
+            f"{float(sampling_frequency)!r}|{float(control_frequency)!r}|"
+            f"{early_stopping!r}|{'exact' if exact_cpg else 'rk4'}|".encode()
+        )
+        h.update(np.asarray(params, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        """Get a cached fitness, or None if the simulation was not cached."""
+        fitness = self._entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key: str, fitness: float) -> None:
+        """Cache the fitness of a simulation."""
+        self._entries[key] = fitness
+        self._entries.move_to_end(key)
+        self._evict()
+        if self._recorded is not None:
+            self._recorded.append((key, fitness))
+
+    def update(self, entries: Iterable[Tuple[str, float]]) -> None:
+        """Cache many fitnesses, e.g. from the cache of another process."""
+        for key, fitness in entries:
+            self.put(key, fitness)
+
+    def record(self) -> None:
+        """Start recording the new entries, forgetting those recorded before."""
+        self._recorded = []
+
+    def take_recorded(self) -> List[Tuple[str, float]]:
+        """Stop recording and get the entries that were put since `record`."""
+        recorded = self._recorded or []
+        self._recorded = None
+        return recorded
+
+    @property
+    def max_size(self) -> int:
+        """Get the maximum number of fitnesses to keep."""
+        return self._max_size
+
+    def snapshot(self) -> List[Tuple[str, float]]:
+        """Copy the entries, e.g. to save them while the cache is in use."""
+        return list(self._entries.items())
+
+    def save(self, snapshot: Optional[List[Tuple[str, float]]] = None) -> None:
+        """Save the cache (or a snapshot of it) to disk, if a path was given."""
+        if self._path is None:
+            return
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.snapshot() if snapshot is None else snapshot, f)
+        os.replace(tmp_path, self._path)
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries above the maximum size."""
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Incremental checkpoints of the multineat innovation database.
+
+The innovation database only grows, so its serialization at a checkpoint is
+mostly the serialization at the previous checkpoint. A delta stores the new text
+as a list of line ranges to copy from the previous one and lines to insert. A
+checkpoint is either a full snapshot, as before, or a delta on the checkpoint it
+names as its base, marked with `DELTA_MARKER`. The text of a checkpoint is found
+by replaying the deltas from the last full snapshot, see `replay`.
+"""
+
+# Standard libraries
+from typing import Dict, List, Optional
+
+# Marks a delta, it can not start the serialization of an innovation database
+DELTA_MARKER = "#delta "
+
+
+def make_delta(base_index: int, base: str, text: str) -> Optional[str]:
+    """
+    Make the delta from a checkpoint to the current text.
+
+    Parameters
+    ----------
+    base_index : int
+        The index of the checkpoint of the base.
+    base : str
+        The text of the base.
+    text : str
+        The current text.
+
+    Returns
+    -------
+    Optional[str]
+        The delta, or None if it is not smaller than half of the text, or does
+        not give back the text.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    first_index: Dict[str, int] = {}
+    for i, line in enumerate(base_lines):
+        first_index.setdefault(line, i)
+
+    parts = [f"{DELTA_MARKER}{base_index}\n"]
+    inserted: List[str] = []
+    i = 0
+    next_copied = -1  # continue the last copied range if possible
+    while i < len(lines):
+        if 0 <= next_copied < len(base_lines) and base_lines[next_copied] == lines[i]:
+            start = next_copied
+        else:
+            start = first_index.get(lines[i], -1)
+        if start < 0:
+            inserted.append(lines[i])
+            i += 1
+            continue
+
+        if inserted:
+            parts += [f"+{len(inserted)}\n"] + inserted
+            inserted = []
+        count = 1
+        while (
+            i + count < len(lines)
+            and start + count < len(base_lines)
+            and base_lines[start + count] == lines[i + count]
+        ):
+            count += 1
+        parts.append(f"={start} {count}\n")
+        i += count
+        next_copied = start + count
+    if inserted:
+        parts += [f"+{len(inserted)}\n"] + inserted
+    delta = "".join(parts)
+
+    if 2 * len(delta) >= len(text) or apply_delta(base, delta) != text:
+        return None
+    return delta
+
+
+def is_delta(value: str) -> bool:
+    """Check if a checkpoint is a delta."""
+    return value.startswith(DELTA_MARKER)
+
+
+def delta_base(delta: str) -> int:
+    """Get the index of the base checkpoint of a delta."""
+    return int(delta[len(DELTA_MARKER) : delta.index("\n")])
+
+
+def apply_delta(base: str, delta: str) -> str:
+    """
+    Apply a delta to the text of its base.
+
+    Parameters
+    ----------
+    base : str
+        The text of the base checkpoint.
+    delta : str
+        The delta.
+
+    Returns
+    -------
+    str
+        The text of the checkpoint of the delta.
+    """
+    base_lines = base.splitlines(keepends=True)
+    delta_lines = delta.splitlines(keepends=True)
+    parts = []
+    i = 1  # after the marker
+    while i < len(delta_lines):
+        operation = delta_lines[i]
+        if operation.startswith("="):
+            start, count = (int(field) for field in operation[1:].split(" "))
+            parts += base_lines[start : start + count]
+            i += 1
+        else:
+            count = int(operation[1:])
+            parts += delta_lines[i + 1 : i + 1 + count]
+            i += 1 + count
+    return "".join(parts)
+
+
+def replay(snapshot: str, deltas: List[str]) -> str:
+    """
+    Get the text of a checkpoint from the last full snapshot before it.
+
+    Parameters
+    ----------
+    snapshot : str
+        The full snapshot.
+    deltas : List[str]
+        The deltas from the snapshot to the checkpoint, oldest first.
+
+    Returns
+    -------
+    str
+        The text of the checkpoint.
+    """
+    text = snapshot
+    for delta in deltas:
+        text = apply_delta(text, delta)
+    return text
@@ -11,20 +11,37 @@ This code is provided "As Is"
 
 # Standard libraries
 from random import Random
+from typing import List, Optional, Tuple
+
+# Third-party libraries
+import numpy as np
 
 # Genotypes
 from body.cppnwin import crossover as body_crossover
+from brain.lag import AnyGenotype as AnyBrainGenotype
+from brain.lag import Genotype as BrainGenotype
 from brain.lag import crossover as brain_crossover
+from brain.lag import crossover_population as brain_crossover_population
 
 # Local libraries
 from .genotype import Genotype
-from .helpers import make_multineat_params, multineat_rng_from_random
+from .helpers import (
+    make_multineat_params,
+    multineat_rng_from_random,
+    numpy_rng_from_random,
+)
 
 # Global constants
 _MULTINEAT_PARAMS = make_multineat_params()
+_BRAIN_CROSSOVER_PROB = 0.5
 
 
-def crossover(parent1: Genotype, parent2: Genotype, rng: Random) -> Genotype:
+def crossover(
+    parent1: Genotype,
+    parent2: Genotype,
+    rng: Random,
+    brain: Optional[AnyBrainGenotype] = None,
+) -> Genotype:
     """Crossover two genotypes.
 
     Parameters
@@ -35,6 +52,8 @@ def crossover(parent1: Genotype, parent2: Genotype, rng: Random) -> Genotype:
         Second parent.
     rng : Random
         Random number generator.
+    brain : Optional[AnyBrainGenotype]
+        Brain of the child, if already made with `crossover_brains`.
 
     Returns
     -------
@@ -52,8 +71,63 @@ def crossover(parent1: Genotype, parent2: Genotype, rng: Random) -> Genotype:
         interspecies_crossover=False,
     )
 
-    brain = brain_crossover(
-        parent1=parent1.brain, parent2=parent2.brain, rng=rng, crossover_prob=0.5
-    )
+    if brain is None:
+        brain = brain_crossover(
+            parent1=parent1.brain,
+            parent2=parent2.brain,
+            rng=numpy_rng_from_random(rng),
+            crossover_prob=_BRAIN_CROSSOVER_PROB,
+        )
 
     return Genotype(body=body, brain=brain)
+
+
+def crossover_brains(
+    parents: List[Tuple[AnyBrainGenotype, AnyBrainGenotype]], rng: Random
+) -> List[AnyBrainGenotype]:
+    """Crossover the brains of a whole offspring at once.
+
+    Parameters
+    ----------
+    parents : List[Tuple[AnyBrainGenotype, AnyBrainGenotype]]
+        The two parent brains of every child, all with the same grid size.
+    rng : Random
+        Random number generator.
+
+    Returns
+    -------
+    List[AnyBrainGenotype]
+        The brains of the children.
+    """
+    if not parents:
+        return []
+    grid_size = parents[0][0].grid_size
+    assert all(
+        brain.grid_size == grid_size for couple in parents for brain in couple
+    )
+    nprng = numpy_rng_from_random(rng)
+
+    dense = [
+        (parent1, parent2)
+        for parent1, parent2 in parents
+        if isinstance(parent1, BrainGenotype) and isinstance(parent2, BrainGenotype)
+    ]
+    if len(dense) < len(parents):
+        # sparse brains store different cells, cross them one by one
+        return [
+            brain_crossover(
+                parent1=parent1,
+                parent2=parent2,
+                rng=nprng,
+                crossover_prob=_BRAIN_CROSSOVER_PROB,
+            )
+            for parent1, parent2 in parents
+        ]
+
+    genomes = brain_crossover_population(
+        np.stack([parent1.genotype for parent1, _ in dense]),
+        np.stack([parent2.genotype for _, parent2 in dense]),
+        rng=nprng,
+        crossover_prob=_BRAIN_CROSSOVER_PROB,
+    )
+    return [BrainGenotype(genome, grid_size) for genome in genomes]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+SQLite settings for the experiment database.
+
+The optimizer, the learners and the fitness records all write to one SQLite
+file, in many small transactions. With the default rollback journal every commit
+syncs the file twice and blocks all readers. The tuned profile uses a write-ahead
+log instead: a commit appends to the log and only syncs at checkpoints, and the
+readers (plots, monitoring) see the last committed state while the optimizer
+writes. A crash can lose the last transactions, but never corrupts the database,
+and the optimizer resumes from its last checkpoint anyway.
+
+The journal mode is stored in the database file, so a database written with the
+tuned profile stays in WAL mode when opened by other tools.
+"""
+
+# Standard libraries
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
+
+# SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Name of the database file in the database directory, as in Revolve2
+_DATABASE_FILE = "db.sqlite"
+
+
+@dataclass(frozen=True)
+class SqliteProfile:
+    """Settings applied to every new connection, see the SQLite PRAGMA docs."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size_kib: int = 64 * 1024
+    mmap_size: int = 256 * 1024 * 1024
+    busy_timeout_ms: int = 10_000
+    temp_store: str = "MEMORY"
+
+    def pragmas(self, read_only: bool = False) -> List[str]:
+        """
+        Get the statements that apply this profile to a connection.
+
+        Parameters
+        ----------
+        read_only : bool
+            Whether the connection only reads. The journal mode is left alone,
+            changing it needs write access.
+
+        Returns
+        -------
+        List[str]
+            The PRAGMA statements.
+        """
+        pragmas = [
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA cache_size=-{self.cache_size_kib}",  # negative, in KiB
+            f"PRAGMA mmap_size={self.mmap_size}",
+            f"PRAGMA busy_timeout={self.busy_timeout_ms}",
+            f"PRAGMA temp_store={self.temp_store}",
+        ]
+        if read_only:
+            return pragmas + ["PRAGMA query_only=ON"]
+        return [f"PRAGMA journal_mode={self.journal_mode}"] + pragmas
+
+
+# The profile of the experiments
+TUNED_PROFILE = SqliteProfile()
+
+
+def open_async_database(
+    db_root_directory: str,
+    create: bool = False,
+    profile: Optional[SqliteProfile] = TUNED_PROFILE,
+) -> AsyncEngine:
+    """
+    Open the SQLite database in a directory, for the optimizer.
+
+    Parameters
+    ----------
+    db_root_directory : str
+        The directory of the database.
+    create : bool
+        Whether to create the directory if it does not exist.
+    profile : Optional[SqliteProfile]
+        Settings of the connections. The SQLite defaults if None.
+
+    Returns
+    -------
+    AsyncEngine
+        The database engine.
+    """
+    path = _database_path(db_root_directory, create)
+    return create_async_database(f"sqlite+aiosqlite:///{path}", profile)
+
+
+def create_async_database(
+    url: str, profile: Optional[SqliteProfile] = TUNED_PROFILE
+) -> AsyncEngine:
+    """
+    Create an engine for a SQLite database URL, e.g. in a learner process.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the database.
+    profile : Optional[SqliteProfile]
+        Settings of the connections. The SQLite defaults if None.
+
+    Returns
+    -------
+    AsyncEngine
+        The database engine.
+    """
+    if profile is None:
+        return create_async_engine(url)
+
+    # keep the connections open, the settings and the page cache are per connection
+    engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool)
+    apply_profile(engine, profile)
+    return engine
+
+
+def open_database_readonly(
+    db_root_directory: str, profile: SqliteProfile = TUNED_PROFILE
+) -> Engine:
+    """
+    Open the SQLite database in a directory for reading, e.g. to plot the results.
+
+    The database can be read while an optimizer writes to it.
+
+    Parameters
+    ----------
+    db_root_directory : str
+        The directory of the database.
+    profile : SqliteProfile
+        Settings of the connections.
+
+    Returns
+    -------
+    Engine
+        The database engine.
+    """
+    path = _database_path(db_root_directory, create=False)
+    engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+    apply_profile(engine, profile, read_only=True)
+    return engine
+
+
+def apply_profile(
+    engine: Union[Engine, AsyncEngine],
+    profile: SqliteProfile,
+    read_only: bool = False,
+) -> None:
+    """
+    Apply a profile to every connection that an engine opens.
+
+    Parameters
+    ----------
+    engine : Union[Engine, AsyncEngine]
+        The engine of a SQLite database.
+    profile : SqliteProfile
+        Settings of the connections.
+    read_only : bool
+        Whether the connections only read.
+    """
+    pragmas = profile.pragmas(read_only)
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def _database_path(db_root_directory: str, create: bool) -> str:
+    """Get the path of the database file in a directory."""
+    if create:
+        os.makedirs(db_root_directory, exist_ok=True)
+    elif not os.path.isdir(db_root_directory):
+        raise FileNotFoundError(f"No database directory at {db_root_directory}")
+    return os.path.join(db_root_directory, _DATABASE_FILE)
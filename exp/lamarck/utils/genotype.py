@@ -17,13 +17,14 @@ from typing import List
 from revolve2.core.database import IncompatibleError, Serializer
 
 # SQLAlchemy
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.future import select
 
 # Genotypes
 from body.cppnwin import Genotype as BodyGenotype
 from body.cppnwin import GenotypeSerializer as BodyGenotypeSerializer
-from brain.lag import Genotype as BrainGenotype
+from brain.lag import AnyGenotype as AnyBrainGenotype
 from brain.lag import GenotypeSerializer as BrainGenotypeSerializer
 
 # Local libraries
@@ -35,7 +36,7 @@ class Genotype:
     """Genotype for the knapsack problem."""
 
     body: BodyGenotype
-    brain: BrainGenotype
+    brain: AnyBrainGenotype
 
 
 class GenotypeSerializer(Serializer[Genotype]):
@@ -56,7 +57,13 @@ class GenotypeSerializer(Serializer[Genotype]):
     async def to_database(
         cls, session: AsyncSession, objects: List[Genotype]
     ) -> List[int]:
-        """Save the objects to the database."""
+        """Save the objects to the database.
+
+        The first row of every table gets its id from SQLite, the other rows the
+        ids after it, inserted with one executemany. The session holds the write
+        lock of the database after the first insert, so the ids stay unique when
+        other connections write to the same database.
+        """
 
         # Save the bodies to the database
         body_ids = await BodyGenotypeSerializer.to_database(
@@ -68,26 +75,57 @@ class GenotypeSerializer(Serializer[Genotype]):
             session, [genotype.brain for genotype in objects]
         )
 
-        # Create the database objects
-        db_objects = [
-            DbGenotype(
-                body_id=body_id,
-                brain_id=brain_id,
+        return await cls._insert(session, body_ids, brain_ids)
+
+    @classmethod
+    async def to_database_with_brains(
+        cls, session: AsyncSession, ids: List[int], brains: List[AnyBrainGenotype]
+    ) -> List[int]:
+        """Save stored genotypes again, with new brains.
+
+        For genotypes whose brains changed after they were saved, e.g. by
+        learning. The new rows point to the stored bodies instead of saving them
+        again, only the brains are saved.
+        """
+
+        # Get the bodies of the stored genotypes
+        rows = (
+            await session.execute(
+                select(DbGenotype.id, DbGenotype.body_id).filter(DbGenotype.id.in_(ids))
             )
-            for body_id, brain_id in zip(body_ids, brain_ids)
-        ]
+        ).all()
+        if len(rows) != len(set(ids)):
+            print(f"Requested {len(set(ids))} objects, but only found {len(rows)}")
+            raise IncompatibleError
+        body_of = {row.id: row.body_id for row in rows}
+
+        # Save the brains to the database
+        brain_ids = await BrainGenotypeSerializer.to_database(session, brains)
 
-        # Save the objects to the database
-        session.add_all(db_objects)
+        return await cls._insert(session, [body_of[id] for id in ids], brain_ids)
 
-        # Flush the session to ensure that the IDs are assigned
-        await session.flush()
+    @classmethod
+    async def _insert(
+        cls, session: AsyncSession, body_ids: List[int], brain_ids: List[int]
+    ) -> List[int]:
+        """Save the rows that join stored bodies and brains, see `to_database`."""
+        if not body_ids:
+            return []
 
-        # Get the IDs of the objects
-        ids = [db_object.id for db_object in db_objects if db_object.id is not None]
+        rows = [
+            {"body_id": body_id, "brain_id": brain_id}
+            for body_id, brain_id in zip(body_ids, brain_ids)
+        ]
 
-        # Check that the IDs were assigned
-        assert len(ids) == len(objects)
+        # Save the first object to get its ID, then the others after it
+        result = await session.execute(insert(DbGenotype).values(rows[0]))
+        first_id = result.inserted_primary_key[0]
+        ids = list(range(first_id, first_id + len(rows)))
+        if len(rows) > 1:
+            await session.execute(
+                insert(DbGenotype),
+                [dict(row, id=id) for id, row in zip(ids[1:], rows[1:])],
+            )
 
         # Return the IDs of the objects
         return ids
@@ -13,6 +13,9 @@ This code is provided "As Is"
 from random import Random
 from typing import List, Tuple
 
+# Third-party libraries
+import numpy as np
+
 # MultiNEAT
 import multineat
 from revolve2.actor_controller import ActorController
@@ -22,14 +25,16 @@ from revolve2.core.modular_robot import ModularRobot
 from revolve2.core.physics.running import ActorControl, EnvironmentController
 
 # Genotypes
-from body.cppnwin.modular_robot.body_genotype import develop as body_dev
 from brain.lag.modular_robot.brain_genotype_lag import develop as brain_dev
 
 # Local libraries
+from . import selection
 from .genotype import Genotype
+from .phenotype import Phenotype, PhenotypeCache
 
 # Global variables
 FITNESS_TYPE = float
+_PHENOTYPE_CACHE = PhenotypeCache(max_size=1000)
 
 
 class EnvironmentActorController(EnvironmentController):
@@ -70,6 +75,10 @@ def multineat_rng_from_random(rng: Random) -> multineat.RNG:  # type: ignore # S
     return multineat_rng
 
 
+def numpy_rng_from_random(rng: Random) -> np.random.Generator:
+    return np.random.Generator(np.random.PCG64(rng.randint(a=0, b=2**63)))
+
+
 def make_multineat_params() -> multineat.Parameters:  # type: ignore # STUB
     # Create an instance of the multineat parameters object
     multineat_params = multineat.Parameters()  # type: ignore # STUB
@@ -138,22 +147,54 @@ def make_multineat_params() -> multineat.Parameters:  # type: ignore # STUB
     return multineat_params
 
 
-def develop(genotype: Genotype) -> ModularRobot:
+def develop(
+    genotype: Genotype, exact_cpg: bool = False, max_parts: int = 10
+) -> ModularRobot:
     """Develop a genotype into a phenotype.
 
     Parameters
     ----------
     genotype : Genotype
         The genotype to develop.
+    exact_cpg : bool
+        Whether to integrate the CPG network exactly instead of with Runge-Kutta.
+    max_parts : int
+        Maximum number of modules of the body, including the core.
 
     Returns
     -------
     ModularRobot
         The phenotype.
     """
-    body = body_dev(genotype=genotype.body)
-    brain = brain_dev(genotype=genotype.brain, body=body)
-    return ModularRobot(body=body, brain=brain)
+    phenotype = develop_phenotype(genotype, max_parts)
+    brain = brain_dev(
+        genotype=genotype.brain,
+        body=phenotype.body,
+        active_hinges=phenotype.active_hinges,
+        grid_positions=phenotype.grid_positions,
+        exact=exact_cpg,
+    )
+    return ModularRobot(body=phenotype.body, brain=brain)
+
+
+def develop_phenotype(genotype: Genotype, max_parts: int = 10) -> Phenotype:
+    """Get the body part of the phenotype of a genotype.
+
+    The result is cached per body genotype, see `PhenotypeCache`.
+
+    Parameters
+    ----------
+    genotype : Genotype
+        The genotype to develop.
+    max_parts : int
+        Maximum number of modules of the body, including the core.
+
+    Returns
+    -------
+    Phenotype
+        The developed body, its active hinges and its actor.
+    """
+    return _PHENOTYPE_CACHE.get(genotype.body, max_parts)
 
 
 def select_survivors_tournament(
@@ -184,27 +225,13 @@ def select_survivors_tournament(
         The indices of the old and new individuals that are selected as survivors.
     """
 
-    # Merge fitnesses
-    fitnesses = old_fitnesses + new_fitnesses
-
-    # Sort the fitnesses
-    fit_sorted = sorted(enumerate(fitnesses), key=lambda x: x[1], reverse=True)
-    fit_generator = [i for i in range(len(fit_sorted))]
-
-    # Select survivors
-    survivors = []
-    for __ in range(num_survivors):
-        idx = min(rng.choices(fit_generator, k=tournament_size))
-        survivors.extend([fit_sorted[idx][0]])
-        fit_generator.remove(idx)
-
-    # Retrive matching indices
-    len_old = len(old_fitnesses)
-    old_indices = [i for i in survivors if i < len_old]
-    new_indices = [i - len_old for i in survivors if i >= len_old]
-
-    # Return the parents
-    return (old_indices, new_indices)
+    survivors = selection.tournament(
+        old_fitnesses + new_fitnesses,
+        num_survivors,
+        tournament_size,
+        numpy_rng_from_random(rng),
+    )
+    return selection.split(survivors, len(old_fitnesses))
 
 
 def select_parents_tournament(
@@ -235,16 +262,10 @@ def select_parents_tournament(
         The indices of the selected parents.
     """
 
-    # Sort the fitnesses
-    fit_sorted = sorted(enumerate(fitnesses), key=lambda x: x[1], reverse=True)
-    fit_generator = range(len(fit_sorted))
-
-    # Select parents
-    parents = []
-    for __ in range(num_parent_groups):
-        idx = sorted(rng.sample(fit_generator, tournament_size))
-        _parents = [fit_sorted[i][0] for i in idx[:num_of_parents]]
-        parents.append(_parents)
-
-    # Return the parents
-    return parents
+    return selection.tournament_groups(
+        fitnesses,
+        num_parent_groups,
+        num_of_parents,
+        tournament_size,
+        numpy_rng_from_random(rng),
+    ).tolist()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Runner that lets learners step through their ES generations together.
+
+Every learner hands its population batch to the same `LockstepRunner`. Once all
+participating learners have done so, the batches are merged into a single large
+batch, simulated with one call to the wrapped runner, and the results are split
+back per learner. Batches with different simulation settings, e.g. from learners
+at different rungs of a successive halving race, are merged per setting. A learner
+whose samples were all cached submits an empty batch, so it still counts.
+"""
+
+# Standard libraries
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+# Revolve2
+from revolve2.core.physics.running import Batch, BatchResults, Runner
+
+
+class LockstepRunner(Runner):
+    """Merges the batches of all participating learners into one batch."""
+
+    _runner: Runner
+    _num_participants: int
+    _pending: List[Tuple[Batch, "asyncio.Future[BatchResults]"]]
+    _flushes: Set["asyncio.Future[None]"]  # started by `leave`, kept until done
+
+    def __init__(self, runner: Runner, num_participants: int) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        runner : Runner
+            The runner used to simulate the merged batches.
+        num_participants : int
+            Number of learners that will submit a batch for every ES generation.
+        """
+        self._runner = runner
+        self._num_participants = num_participants
+        self._pending = []
+        self._flushes = set()
+
+    async def run_batch(self, batch: Batch) -> BatchResults:
+        """
+        Wait for the other participants and simulate all their batches at once.
+
+        Parameters
+        ----------
+        batch : Batch
+            The batch of a single learner.
+
+        Returns
+        -------
+        BatchResults
+            The results of the environments of `batch`, in order.
+        """
+        future: asyncio.Future[BatchResults] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._pending.append((batch, future))
+        await self._flush_if_complete()
+        return await future
+
+    def leave(self) -> None:
+        """Stop participating, e.g. because a learner has finished."""
+        self._num_participants -= 1
+        if self._pending:
+            # the event loop only keeps a weak reference to the task
+            flush = asyncio.ensure_future(self._flush_if_complete())
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush_if_complete(self) -> None:
+        """Simulate the merged batch once every participant has submitted.
+
+        Errors are passed on to the participants that are waiting for the batch.
+        """
+        if len(self._pending) < self._num_participants or not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        try:
+            await self._run_groups(pending)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _run_groups(
+        self, pending: List[Tuple[Batch, "asyncio.Future[BatchResults]"]]
+    ) -> None:
+        """Simulate the batches of the participants, merged per setting."""
+        # learners can be at different rungs of a race, merge per simulation setting
+        groups: Dict[
+            Tuple[float, float, float],
+            List[Tuple[Batch, "asyncio.Future[BatchResults]"]],
+        ] = {}
+        for batch, future in pending:
+            settings = (
+                batch.simulation_time,
+                batch.sampling_frequency,
+                batch.control_frequency,
+            )
+            groups.setdefault(settings, []).append((batch, future))
+
+        await asyncio.gather(*[self._run_merged(group) for group in groups.values()])
+
+    async def _run_merged(
+        self, pending: List[Tuple[Batch, "asyncio.Future[BatchResults]"]]
+    ) -> None:
+        """Simulate batches with the same settings as one batch."""
+        first = pending[0][0]
+        merged = Batch(
+            simulation_time=first.simulation_time,
+            sampling_frequency=first.sampling_frequency,
+            control_frequency=first.control_frequency,
+        )
+        for batch, _ in pending:
+            merged.environments.extend(batch.environments)
+
+        try:
+            results = await self._runner.run_batch(merged)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for batch, future in pending:
+            num_environments = len(batch.environments)
+            future.set_result(
+                BatchResults(
+                    results.environment_results[offset : offset + num_environments]
+                )
+            )
+            offset += num_environments
@@ -14,9 +14,10 @@ OpenAI ES algoriothm, and simulation using mujoco.
 """
 
 # Standard libraries
+import logging
 import math
 from random import Random
-from typing import List
+from typing import List, Optional
 
 # Third-party libraries
 import numpy as np
@@ -36,16 +37,29 @@ from revolve2.core.physics.environment_actor_controller import (
 from revolve2.core.physics.running import (
     ActorState,
     Batch,
-    Environment,
     PosedActor,
     Runner,
 )
-from revolve2.runners.mujoco import LocalRunner
 
 # SQLAlchemy
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio.session import AsyncSession
 
+# Genotypes
+from brain.lag.modular_robot.brain_cpg_network_exact import BrainCpgNetworkExact
+
+# Local libraries
+from ...cache import FitnessCache
+from ...morphology import body_hash
+from ...simulation import (
+    EarlyStopping,
+    KeyedEnvironment,
+    MujocoRunner,
+    PoseReducer,
+    model_key,
+)
+from .racing import SuccessiveHalving, race_fitnesses
+
 
 class Optimizer(OpenaiESOptimizer):
     """
@@ -57,9 +71,16 @@ class Optimizer(OpenaiESOptimizer):
     _body: Body
     _actor: Actor
     _dof_ids: List[int]
+    _spawn_position: Vector3
+    _model_key: str
     _cpg_network_structure: CpgNetworkStructure
 
     _runner: Runner
+    _early_stopping: Optional[EarlyStopping]
+    _successive_halving: Optional[SuccessiveHalving]
+    _exact_cpg: bool
+    _fitness_cache: Optional[FitnessCache]
+    _body_hash: str
 
     _simulation_time: int
     _sampling_frequency: float
@@ -83,6 +104,11 @@ class Optimizer(OpenaiESOptimizer):
         num_generations: int,
         cpg_structure: CpgNetworkStructure,
         initial_mean: npt.NDArray[np.float_],
+        runner: Optional[Runner] = None,
+        fitness_cache: Optional[FitnessCache] = None,
+        early_stopping: Optional[EarlyStopping] = None,
+        successive_halving: Optional[SuccessiveHalving] = None,
+        exact_cpg: bool = False,
     ) -> None:
         """
         Initialize this class async.
@@ -101,6 +127,11 @@ class Optimizer(OpenaiESOptimizer):
         :param sampling_frequency: Sampling frequency for the simulation. See `Batch` class from physics running.
         :param control_frequency: Control frequency for the simulation. See `Batch` class from physics running.
         :param num_generations: Number of generation to run the optimizer for.
+        :param runner: Runner to simulate the population with. A new headless MuJoCo runner is used if not given.
+        :param fitness_cache: Cache of simulated fitnesses. Every sample is simulated if not given.
+        :param early_stopping: Policy to stop hopeless samples early. Only used by the default runner.
+        :param successive_halving: Race the samples over increasing horizons. Every sample is simulated for the full time if not given.
+        :param exact_cpg: Integrate the CPG networks exactly instead of with Runge-Kutta.
         """
         await super().ainit_new(
             database=database,
@@ -113,11 +144,13 @@ class Optimizer(OpenaiESOptimizer):
             initial_mean=initial_mean,
         )
 
-        self._body = robot_body
-        self._actor, self._dof_ids = robot_body.to_actor()
+        self._init_body(robot_body)
         self._cpg_network_structure = cpg_structure
 
-        self._init_runner()
+        self._init_runner(runner, early_stopping)
+        self._fitness_cache = fitness_cache
+        self._successive_halving = successive_halving
+        self._exact_cpg = exact_cpg
 
         self._simulation_time = simulation_time
         self._sampling_frequency = sampling_frequency
@@ -136,6 +169,11 @@ class Optimizer(OpenaiESOptimizer):
         control_frequency: float,
         num_generations: int,
         cpg_structure: CpgNetworkStructure,
+        runner: Optional[Runner] = None,
+        fitness_cache: Optional[FitnessCache] = None,
+        early_stopping: Optional[EarlyStopping] = None,
+        successive_halving: Optional[SuccessiveHalving] = None,
+        exact_cpg: bool = False,
     ) -> bool:
         """
         Try to initialize this class async from a database.
@@ -151,6 +189,11 @@ class Optimizer(OpenaiESOptimizer):
         :param sampling_frequency: Sampling frequency for the simulation. See `Batch` class from physics running.
         :param control_frequency: Control frequency for the simulation. See `Batch` class from physics running.
         :param num_generations: Number of generation to run the optimizer for.
+        :param runner: Runner to simulate the population with. A new headless MuJoCo runner is used if not given.
+        :param fitness_cache: Cache of simulated fitnesses. Every sample is simulated if not given.
+        :param early_stopping: Policy to stop hopeless samples early. Only used by the default runner.
+        :param successive_halving: Race the samples over increasing horizons. Every sample is simulated for the full time if not given.
+        :param exact_cpg: Integrate the CPG networks exactly instead of with Runge-Kutta.
         :returns: True if this complete object could be deserialized from the database.
         """
         if not await super().ainit_from_database(
@@ -161,11 +204,13 @@ class Optimizer(OpenaiESOptimizer):
         ):
             return False
 
-        self._body = robot_body
-        self._actor, self._dof_ids = robot_body.to_actor()
+        self._init_body(robot_body)
         self._cpg_network_structure = cpg_structure
 
-        self._init_runner()
+        self._init_runner(runner, early_stopping)
+        self._fitness_cache = fitness_cache
+        self._successive_halving = successive_halving
+        self._exact_cpg = exact_cpg
 
         self._simulation_time = simulation_time
         self._sampling_frequency = sampling_frequency
@@ -174,8 +219,25 @@ class Optimizer(OpenaiESOptimizer):
 
         return True
 
-    def _init_runner(self) -> None:
-        self._runner = LocalRunner(headless=True)
+    def _init_body(self, robot_body: Body) -> None:
+        # the body is the same for every sample, so is its simulation model
+        self._body = robot_body
+        self._actor, self._dof_ids = robot_body.to_actor()
+        self._body_hash = body_hash(robot_body)
+
+        bounding_box = self._actor.calc_aabb()
+        self._spawn_position = Vector3(
+            [0.0, 0.0, bounding_box.size.z / 2.0 - bounding_box.offset.z]
+        )
+        self._model_key = model_key(self._body_hash, self._spawn_position, Quaternion())
+
+    def _init_runner(
+        self, runner: Optional[Runner], early_stopping: Optional[EarlyStopping]
+    ) -> None:
+        self._early_stopping = early_stopping
+        if runner is None:
+            runner = MujocoRunner(early_stopping=early_stopping, reducer=PoseReducer())
+        self._runner = runner
 
     async def _evaluate_population(
         self,
@@ -183,13 +245,84 @@ class Optimizer(OpenaiESOptimizer):
         db_id: DbId,
         population: npt.NDArray[np.float_],
     ) -> npt.NDArray[np.float_]:
+        if self._successive_halving is None:
+            return await self._simulate_samples(population, self._simulation_time)
+
+        horizons = self._successive_halving.horizons(self._simulation_time)
+        scores = np.zeros(len(population))
+        rungs_reached = np.zeros(len(population), dtype=int)
+        alive = np.arange(len(population))
+        simulated_seconds = 0.0
+
+        for rung, horizon in enumerate(horizons):
+            scores[alive] = await self._simulate_samples(population[alive], horizon)
+            rungs_reached[alive] = rung
+            simulated_seconds += len(alive) * horizon
+            if rung == len(horizons) - 1:
+                break
+
+            # promote the best samples to the next rung
+            num_promoted = max(
+                1, math.ceil(len(alive) * self._successive_halving.keep_fraction)
+            )
+            alive = alive[np.argsort(-scores[alive], kind="stable")[:num_promoted]]
+
+        logging.debug(
+            f"Successive halving: {simulated_seconds:.1f}/"
+            f"{len(population) * self._simulation_time:.1f} simulated seconds"
+        )
+        return race_fitnesses(scores, rungs_reached, len(horizons) - 1)
+
+    async def _simulate_samples(
+        self,
+        population: npt.NDArray[np.float_],
+        simulation_time: float,
+    ) -> npt.NDArray[np.float_]:
+        """
+        Simulate the samples of a population for the given time.
+
+        :param population: The samples to simulate.
+        :param simulation_time: Time in seconds to simulate the samples for.
+        :returns: The fitness of every sample.
+        """
+        fitnesses = np.zeros(len(population))
+
+        # look up the samples that were simulated before
+        to_simulate = list(range(len(population)))
+        keys: List[str] = []
+        if self._fitness_cache is not None:
+            keys = [
+                FitnessCache.make_key(
+                    self._body_hash,
+                    params,
+                    simulation_time,
+                    self._sampling_frequency,
+                    self._control_frequency,
+                    self._early_stopping,
+                    self._exact_cpg,
+                )
+                for params in population
+            ]
+            to_simulate = []
+            for i, key in enumerate(keys):
+                cached = self._fitness_cache.get(key)
+                if cached is None:
+                    to_simulate.append(i)
+                else:
+                    fitnesses[i] = cached
+
+        # the batch can be empty, a lockstep runner waits for every learner
         batch = Batch(
-            simulation_time=self._simulation_time,
+            simulation_time=simulation_time,
             sampling_frequency=self._sampling_frequency,
             control_frequency=self._control_frequency,
         )
 
-        for params in population:
+        brain_type = (
+            BrainCpgNetworkExact if self._exact_cpg else BrainCpgNetworkStatic
+        )
+
+        for params in population[to_simulate]:
             initial_state = self._cpg_network_structure.make_uniform_state(
                 0.5 * math.pi / 2.0
             )
@@ -199,7 +332,7 @@ class Optimizer(OpenaiESOptimizer):
                 )
             )
             dof_ranges = self._cpg_network_structure.make_uniform_dof_ranges(1.0)
-            brain = BrainCpgNetworkStatic(
+            brain = brain_type(
                 initial_state,
                 self._cpg_network_structure.num_cpgs,
                 weight_matrix,
@@ -207,18 +340,13 @@ class Optimizer(OpenaiESOptimizer):
             )
             controller = brain.make_controller(self._body, self._dof_ids)
 
-            bounding_box = self._actor.calc_aabb()
-            env = Environment(EnvironmentActorController(controller))
+            env = KeyedEnvironment(
+                EnvironmentActorController(controller), model_key=self._model_key
+            )
             env.actors.append(
                 PosedActor(
                     self._actor,
-                    Vector3(
-                        [
-                            0.0,
-                            0.0,
-                            bounding_box.size.z / 2.0 - bounding_box.offset.z,
-                        ]
-                    ),
+                    self._spawn_position,
                     Quaternion(),
                     [0.0 for _ in controller.get_dof_targets()],
                 )
@@ -227,15 +355,17 @@ class Optimizer(OpenaiESOptimizer):
 
         batch_results = await self._runner.run_batch(batch)
 
-        return np.array(
-            [
-                self._calculate_fitness(
-                    environment_result.environment_states[0].actor_states[0],
-                    environment_result.environment_states[-1].actor_states[0],
-                )
-                for environment_result in batch_results.environment_results
-            ]
-        )
+        for i, environment_result in zip(
+            to_simulate, batch_results.environment_results
+        ):
+            fitnesses[i] = self._calculate_fitness(
+                environment_result.environment_states[0].actor_states[0],
+                environment_result.environment_states[-1].actor_states[0],
+            )
+            if self._fitness_cache is not None:
+                self._fitness_cache.put(keys[i], fitnesses[i])
+
+        return fitnesses
 
     @staticmethod
     def _calculate_fitness(begin_state: ActorState, end_state: ActorState) -> float:
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Successive halving evaluation of an OpenAI ES population.
+
+Every sample is simulated for a short horizon first, and only the best fraction
+is promoted to the next, longer horizon, up to the full simulation time. Samples
+that were eliminated early get a rank-based fitness below the fitness of every
+sample that was simulated for the full time.
+"""
+
+# Standard libraries
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+
+@dataclass(frozen=True)
+class SuccessiveHalving:
+    """Settings of the successive halving evaluation."""
+
+    # horizon of every rung, as a fraction of the simulation time; the last must be 1
+    rungs: Tuple[float, ...] = (0.2, 0.5, 1.0)
+
+    # fraction of the samples of a rung that is promoted to the next rung
+    keep_fraction: float = 0.5
+
+    def __post_init__(self) -> None:
+        assert len(self.rungs) > 0 and self.rungs[-1] == 1.0
+        assert all(a < b for a, b in zip(self.rungs, self.rungs[1:]))
+        assert 0.0 < self.keep_fraction <= 1.0
+
+    def horizons(self, simulation_time: float) -> List[float]:
+        """Get the simulation time of every rung, in seconds."""
+        return [rung * simulation_time for rung in self.rungs]
+
+
+def race_fitnesses(
+    scores: npt.NDArray[np.float_],
+    rungs_reached: npt.NDArray[np.int_],
+    final_rung: int,
+) -> npt.NDArray[np.float_]:
+    """Turn the results of a race into fitnesses for the ES update.
+
+    Samples that reached the final rung keep their score. The other samples are
+    ordered by the rung they reached and then by their score at that rung, and
+    placed below the worst finished sample, with the mean spacing of the
+    finished samples between them.
+
+    Parameters
+    ----------
+    scores : npt.NDArray[np.float_]
+        Fitness of every sample at the last rung it was simulated for.
+    rungs_reached : npt.NDArray[np.int_]
+        Index of the last rung every sample was simulated for.
+    final_rung : int
+        Index of the rung with the full simulation time.
+
+    Returns
+    -------
+    npt.NDArray[np.float_]
+        The fitnesses.
+    """
+    fitnesses = scores.astype(np.float64)
+
+    finished = rungs_reached == final_rung
+    eliminated = np.flatnonzero(~finished)
+    if len(eliminated) == 0:
+        return fitnesses
+
+    # best eliminated sample first: highest rung, then highest score
+    order = eliminated[
+        np.lexsort((-scores[eliminated], -rungs_reached[eliminated]))
+    ]
+
+    finished_scores = scores[finished]
+    spacing = 0.0
+    if len(finished_scores) > 1:
+        spacing = (finished_scores.max() - finished_scores.min()) / (
+            len(finished_scores) - 1
+        )
+    if spacing == 0.0:
+        spacing = 1e-3
+
+    fitnesses[order] = finished_scores.min() - spacing * np.arange(
+        1, len(order) + 1
+    )
+    return fitnesses
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Scheduler for the learning periods of a generation.
+
+Every learner gets its own random number generator, seeded from the optimizer's
+generator before any learner starts, so the learned brains do not depend on the
+order (or the process) in which the learners run.
+
+With a shared simulation pool, the learners run in the calling process as
+concurrent tasks, and every learner sends its ES batches to the pool. The
+simulators stay warm and keep their cached models across ES generations, and the
+learners share the fitness cache; only the ES updates and the database writes of
+the learners, which are cheap next to the simulations, share the calling process.
+Without a pool, the learners run on a process pool and every learner starts new
+simulator processes for each of its ES batches. Every process then has its own
+copy of the fitness cache, taken when the processes start, and the learners send
+the fitnesses they add back to the cache of the calling process.
+
+In lockstep mode all learners run in the calling process and step through their
+ES generations together, sharing one simulation batch per ES generation.
+"""
+
+# Standard libraries
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from random import Random
+from typing import List, Optional, Tuple
+
+# Revolve2
+from revolve2.actor_controllers.cpg import CpgNetworkStructure
+from revolve2.core.database.serializers import Ndarray1xnSerializer
+from revolve2.core.modular_robot import Body
+from revolve2.core.optimization import DbId
+from revolve2.core.optimization.ea.openai_es import DbOpenaiESOptimizerIndividual
+from revolve2.core.physics.running import Runner
+
+# SQLAlchemy
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.future import select
+
+# Local libraries
+from ..cache import FitnessCache
+from ..database import create_async_database
+from ..simulation import EarlyStopping, JobPool, MujocoRunner, PoseReducer
+from .lockstep import LockstepRunner
+from .openai_es.optimizer import Optimizer as OpenaiESOptimizer
+from .openai_es.racing import SuccessiveHalving
+
+
+@dataclass
+class LearningParameters:
+    """Parameters shared by all learners of a learning period."""
+
+    population_size: int
+    sigma: float
+    learning_rate: float
+    num_generations: int
+    simulation_time: int
+    sampling_frequency: float
+    control_frequency: float
+    early_stopping: Optional[EarlyStopping] = None
+    successive_halving: Optional[SuccessiveHalving] = None
+    exact_cpg: bool = False
+
+
+@dataclass
+class LearningTask:
+    """The learning period of a single individual."""
+
+    db_id: str
+    seed: int
+    body: Body
+    cpg_structure: CpgNetworkStructure
+    initial_mean: List[float]
+
+
+async def learn(
+    database: AsyncEngine,
+    task: LearningTask,
+    parameters: LearningParameters,
+    runner: Optional[Runner] = None,
+    fitness_cache: Optional[FitnessCache] = None,
+) -> List[float]:
+    """Run the learning period of a single individual.
+
+    Parameters
+    ----------
+    database : AsyncEngine
+        The database to use.
+    task : LearningTask
+        The individual to learn.
+    parameters : LearningParameters
+        The learning parameters.
+    runner : Optional[Runner]
+        Runner to simulate the ES populations with. A new headless MuJoCo runner is used if not given.
+    fitness_cache : Optional[FitnessCache]
+        Cache of simulated fitnesses. Every sample is simulated if not given.
+
+    Returns
+    -------
+    List[float]
+        The parameters of the best brain found, one per active hinge.
+    """
+    db_id = DbId.root(task.db_id)
+    rng = Random(task.seed)
+
+    maybe_optimizer = await OpenaiESOptimizer.from_database(
+        database=database,
+        db_id=db_id,
+        rng=rng,
+        robot_body=task.body,
+        simulation_time=parameters.simulation_time,
+        sampling_frequency=parameters.sampling_frequency,
+        control_frequency=parameters.control_frequency,
+        num_generations=parameters.num_generations,
+        cpg_structure=task.cpg_structure,
+        runner=runner,
+        fitness_cache=fitness_cache,
+        early_stopping=parameters.early_stopping,
+        successive_halving=parameters.successive_halving,
+        exact_cpg=parameters.exact_cpg,
+    )
+    if maybe_optimizer is not None:
+        optimizer = maybe_optimizer
+    else:
+        optimizer = await OpenaiESOptimizer.new(
+            database=database,
+            db_id=db_id,
+            rng=rng,
+            population_size=parameters.population_size,
+            sigma=parameters.sigma,
+            learning_rate=parameters.learning_rate,
+            robot_body=task.body,
+            simulation_time=parameters.simulation_time,
+            sampling_frequency=parameters.sampling_frequency,
+            control_frequency=parameters.control_frequency,
+            num_generations=parameters.num_generations,
+            cpg_structure=task.cpg_structure,
+            initial_mean=task.initial_mean,
+            runner=runner,
+            fitness_cache=fitness_cache,
+            early_stopping=parameters.early_stopping,
+            successive_halving=parameters.successive_halving,
+            exact_cpg=parameters.exact_cpg,
+        )
+
+    await optimizer.run()
+
+    async with AsyncSession(database) as session:
+        best_individual = (
+            (
+                await session.execute(
+                    select(DbOpenaiESOptimizerIndividual)
+                    .filter(DbOpenaiESOptimizerIndividual.db_id == db_id.fullname)
+                    .order_by(DbOpenaiESOptimizerIndividual.fitness.desc())
+                )
+            )
+            .scalars()
+            .first()
+        )
+        assert best_individual is not None
+
+        return [
+            float(p)
+            for p in (
+                await Ndarray1xnSerializer.from_database(
+                    session, [best_individual.individual]
+                )
+            )[0]
+        ]
+
+
+# Copy of the fitness cache in a worker process, see `_init_learner_process`
+_process_fitness_cache: Optional[FitnessCache] = None
+
+
+def _init_learner_process(
+    fitness_cache_size: int, fitness_cache_entries: List[Tuple[str, float]]
+) -> None:
+    """Fill the fitness cache of a new worker process, if the learners use one."""
+    global _process_fitness_cache
+    if fitness_cache_size > 0:
+        _process_fitness_cache = FitnessCache(fitness_cache_size)
+        _process_fitness_cache.update(fitness_cache_entries)
+
+
+def _learn_in_process(
+    database_url: str,
+    task: LearningTask,
+    parameters: LearningParameters,
+) -> Tuple[List[float], List[Tuple[str, float]]]:
+    """Run `learn` in a worker process, with its own connection to the database.
+
+    Returns the learned parameters and the fitnesses added to the cache.
+    """
+    fitness_cache = _process_fitness_cache
+
+    async def _run() -> List[float]:
+        database = create_async_database(database_url)
+        try:
+            return await learn(database, task, parameters, fitness_cache=fitness_cache)
+        finally:
+            await database.dispose()
+
+    if fitness_cache is None:
+        return asyncio.run(_run()), []
+    fitness_cache.record()
+    try:
+        params = asyncio.run(_run())
+    finally:
+        added = fitness_cache.take_recorded()
+    return params, added
+
+
+class LearningScheduler:
+    """Runs the learning periods of a generation, on a simulation or process pool."""
+
+    _num_workers: int
+    _lockstep: bool
+    _pool: Optional[JobPool]
+    _executor: Optional[ProcessPoolExecutor]
+
+    def __init__(
+        self,
+        num_workers: int,
+        lockstep: bool = False,
+        pool: Optional[JobPool] = None,
+    ) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        num_workers : int
+            Number of learners to run at the same time. With 1 worker and no pool
+            the learners run one after another in the calling process. In lockstep
+            mode, the number of simulator processes for the merged batches instead.
+        lockstep : bool
+            Whether the learners step through ES together, merging their
+            populations into a single batch per ES generation.
+        pool : Optional[JobPool]
+            Shared simulation pool. If given, the learners run in this process and
+            simulate on the pool, otherwise on a process pool of their own.
+        """
+        assert num_workers >= 1
+        self._num_workers = num_workers
+        self._lockstep = lockstep
+        self._pool = pool
+        self._executor = None
+
+    async def run(
+        self,
+        database: AsyncEngine,
+        tasks: List[LearningTask],
+        parameters: LearningParameters,
+        fitness_cache: Optional[FitnessCache] = None,
+    ) -> List[List[float]]:
+        """Run the learning period of every task.
+
+        Parameters
+        ----------
+        database : AsyncEngine
+            The database to use.
+        tasks : List[LearningTask]
+            The individuals to learn.
+        parameters : LearningParameters
+            The learning parameters.
+        fitness_cache : Optional[FitnessCache]
+            Cache of simulated fitnesses. Learners on the process pool use a
+            copy of it, and add their fitnesses to it when they finish.
+
+        Returns
+        -------
+        List[List[float]]
+            The learned parameters, in the same order as `tasks`.
+        """
+        if self._lockstep:
+            return await self._run_lockstep(
+                database, tasks, parameters, fitness_cache
+            )
+
+        if self._pool is not None:
+            return await self._run_on_pool(database, tasks, parameters, fitness_cache)
+
+        if self._num_workers == 1:
+            return [
+                await learn(database, task, parameters, fitness_cache=fitness_cache)
+                for task in tasks
+            ]
+
+        if self._executor is None:
+            # spawn, the parent holds an event loop and open database connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_learner_process,
+                initargs=(
+                    (0, [])
+                    if fitness_cache is None
+                    else (fitness_cache.max_size, fitness_cache.snapshot())
+                ),
+            )
+
+        loop = asyncio.get_running_loop()
+        results = list(
+            await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        self._executor,
+                        _learn_in_process,
+                        str(database.url),
+                        task,
+                        parameters,
+                    )
+                    for task in tasks
+                ]
+            )
+        )
+        if fitness_cache is not None:
+            for _, added in results:
+                fitness_cache.update(added)
+        return [params for params, _ in results]
+
+    async def _run_on_pool(
+        self,
+        database: AsyncEngine,
+        tasks: List[LearningTask],
+        parameters: LearningParameters,
+        fitness_cache: Optional[FitnessCache],
+    ) -> List[List[float]]:
+        """Run the learners in this process, each on the shared simulation pool."""
+        assert self._pool is not None
+        pool = self._pool
+        slots = asyncio.Semaphore(self._num_workers)
+
+        async def _learn(task: LearningTask) -> List[float]:
+            async with slots:
+                return await learn(
+                    database,
+                    task,
+                    parameters,
+                    runner=MujocoRunner(
+                        early_stopping=parameters.early_stopping,
+                        reducer=PoseReducer(),
+                        pool=pool,
+                    ),
+                    fitness_cache=fitness_cache,
+                )
+
+        return list(await asyncio.gather(*[_learn(task) for task in tasks]))
+
+    async def _run_lockstep(
+        self,
+        database: AsyncEngine,
+        tasks: List[LearningTask],
+        parameters: LearningParameters,
+        fitness_cache: Optional[FitnessCache],
+    ) -> List[List[float]]:
+        """Run all learners in this process, sharing one batch per ES generation."""
+        runner = LockstepRunner(
+            MujocoRunner(
+                num_simulators=self._num_workers,
+                early_stopping=parameters.early_stopping,
+                reducer=PoseReducer(),
+                pool=self._pool,
+            ),
+            num_participants=len(tasks),
+        )
+
+        async def _learn(task: LearningTask) -> List[float]:
+            try:
+                return await learn(
+                    database,
+                    task,
+                    parameters,
+                    runner=runner,
+                    fitness_cache=fitness_cache,
+                )
+            finally:
+                runner.leave()
+
+        return list(await asyncio.gather(*[_learn(task) for task in tasks]))
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Functions to identify developed modular robot bodies.
+"""
+
+# Standard libraries
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Revolve2
+from revolve2.core.modular_robot import ActiveHinge, Body, Core, Module
+
+# Attachment slots of the core, in the order of their rotation around the core
+_CORE_SLOTS = [Core.FRONT, Core.LEFT, Core.BACK, Core.RIGHT]
+
+
+@dataclass
+class Morphology:
+    """Canonical form of a developed body."""
+
+    # equal for bodies that are the same up to a rotation around the core
+    fingerprint: str
+
+    # active hinges in canonical order, as indices into `body.find_active_hinges()`
+    # one order per rotation that gives the canonical form (symmetric bodies have more)
+    hinge_orders: List[List[int]]
+
+
+def body_hash(body: Body) -> str:
+    """Hash the module tree of a developed body.
+
+    Two bodies have the same hash if they have the same modules, with the same
+    rotations, attached to the same slots.
+
+    Parameters
+    ----------
+    body : Body
+        The developed body.
+
+    Returns
+    -------
+    str
+        The hash of the body.
+    """
+    return hashlib.sha1(_describe_module(body.core).encode()).hexdigest()
+
+
+def canonical_morphology(body: Body, active_hinges: List[ActiveHinge]) -> Morphology:
+    """Get the canonical form of a developed body.
+
+    The fingerprint does not depend on the genome the body was developed from,
+    nor on which face of the core was chosen as the front: the four rotations of
+    the module tree around the core describe the same robot, turned around the
+    vertical axis, and the lowest of their descriptions is used.
+
+    Parameters
+    ----------
+    body : Body
+        The developed body.
+    active_hinges : List[ActiveHinge]
+        The active hinges of the body, see `Body.find_active_hinges`.
+
+    Returns
+    -------
+    Morphology
+        The canonical form of the body.
+    """
+    hinge_index = {id(hinge): i for i, hinge in enumerate(active_hinges)}
+
+    rotations = []
+    for rotation in range(len(_CORE_SLOTS)):
+        hinge_order: List[int] = []
+        children = [
+            _describe_module(
+                body.core.children[_CORE_SLOTS[(slot + rotation) % len(_CORE_SLOTS)]],
+                hinge_index,
+                hinge_order,
+            )
+            for slot in range(len(_CORE_SLOTS))
+        ]
+        description = f"{type(body.core).__name__}[{','.join(children)}]"
+        rotations.append((description, hinge_order))
+
+    canonical = min(description for description, _ in rotations)
+    return Morphology(
+        fingerprint=hashlib.sha1(canonical.encode()).hexdigest(),
+        hinge_orders=[
+            hinge_order
+            for description, hinge_order in rotations
+            if description == canonical
+        ],
+    )
+
+
+def _describe_module(
+    module: Optional[Module],
+    hinge_index: Optional[Dict[int, int]] = None,
+    hinge_order: Optional[List[int]] = None,
+) -> str:
+    """Describe a module and its children as a string.
+
+    If given, the index of every active hinge is appended to `hinge_order` in the
+    order the hinges appear in the description.
+    """
+    if module is None:
+        return "_"
+    if hinge_order is not None and hinge_index is not None:
+        if isinstance(module, ActiveHinge):
+            hinge_order.append(hinge_index[id(module)])
+    children = ",".join(
+        _describe_module(child, hinge_index, hinge_order) for child in module.children
+    )
+    return f"{type(module).__name__}({module.rotation:.6f})[{children}]"
@@ -11,26 +11,40 @@ This code is provided "As Is"
 
 # Standard libraries
 from random import Random
+from typing import List
 
 # Multineat
 import multineat
 
+# Third-party libraries
+import numpy as np
+
 # Genotypes
 from body.cppnwin import mutate as body_mutate
+from brain.lag import AnyGenotype as AnyBrainGenotype
+from brain.lag import Genotype as BrainGenotype
 from brain.lag import mutate as brain_mutate
+from brain.lag import mutate_population as brain_mutate_population
 
 # Local libraries
 from .genotype import Genotype
-from .helpers import make_multineat_params, multineat_rng_from_random
+from .helpers import (
+    make_multineat_params,
+    multineat_rng_from_random,
+    numpy_rng_from_random,
+)
 
 # Global constants
 _MULTINEAT_PARAMS = make_multineat_params()
+_BRAIN_MUTATE_BOUND = 1.0
+_BRAIN_MUTATE_PROB = 0.8
 
 
 def mutate(
     genotype: Genotype,
     innov_db_body: multineat.InnovationDatabase,  # type: ignore # STUB
     rng: Random,
+    mutate_brain: bool = True,
 ) -> Genotype:
     """Mutate a genotype.
 
@@ -42,6 +56,8 @@ def mutate(
         Innovation database for the body.
     rng : Random
         Random number generator.
+    mutate_brain : bool
+        Whether to mutate the brain, False if it was mutated with `mutate_brains`.
 
 
     """
@@ -54,6 +70,58 @@ def mutate(
         multineat_params=_MULTINEAT_PARAMS,
     )
 
-    brain = brain_mutate(genotype=genotype.brain, rng=rng, bound=1, mutate_prob=0.8)
+    brain = genotype.brain
+    if mutate_brain:
+        brain = brain_mutate(
+            genotype=brain,
+            rng=numpy_rng_from_random(rng),
+            bound=_BRAIN_MUTATE_BOUND,
+            mutate_prob=_BRAIN_MUTATE_PROB,
+        )
 
     return Genotype(body=body, brain=brain)
+
+
+def mutate_brains(
+    brains: List[AnyBrainGenotype], rng: Random
+) -> List[AnyBrainGenotype]:
+    """Mutate the brains of a whole offspring at once.
+
+    Parameters
+    ----------
+    brains : List[AnyBrainGenotype]
+        Brains to mutate, all with the same grid size.
+    rng : Random
+        Random number generator.
+
+    Returns
+    -------
+    List[AnyBrainGenotype]
+        The mutated brains.
+    """
+    if not brains:
+        return []
+    grid_size = brains[0].grid_size
+    assert all(brain.grid_size == grid_size for brain in brains)
+    nprng = numpy_rng_from_random(rng)
+
+    dense = [brain for brain in brains if isinstance(brain, BrainGenotype)]
+    if len(dense) < len(brains):
+        # sparse brains store different cells, mutate them one by one
+        return [
+            brain_mutate(
+                genotype=brain,
+                rng=nprng,
+                bound=_BRAIN_MUTATE_BOUND,
+                mutate_prob=_BRAIN_MUTATE_PROB,
+            )
+            for brain in brains
+        ]
+
+    genomes = brain_mutate_population(
+        np.stack([brain.genotype for brain in dense]),
+        rng=nprng,
+        bound=_BRAIN_MUTATE_BOUND,
+        mutate_prob=_BRAIN_MUTATE_PROB,
+    )
+    return [BrainGenotype(genome, grid_size) for genome in genomes]
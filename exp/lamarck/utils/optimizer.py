@@ -11,74 +11,122 @@ This code is provided "As Is"
 
 
 # Standard libraries
+import asyncio
 import logging
 import math
 import pickle
-from copy import deepcopy
+import time
+from collections import deque
 from random import Random
-from typing import List, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple, cast
 
 # MultiNEAT
 import multineat
 
 # Third-party libraries
-from pyrr import Quaternion, Vector3
+from pyrr import Quaternion
 
 # Revolve2
-from revolve2.actor_controller import ActorController
 from revolve2.actor_controllers.cpg import Cpg, CpgNetworkStructure
 from revolve2.core.database import IncompatibleError
-from revolve2.core.database.serializers import Ndarray1xnSerializer
 from revolve2.core.database.serializers._float_serializer import FloatSerializer
 from revolve2.core.optimization import DbId
 from revolve2.core.optimization.ea.generic_ea import EAOptimizer
-from revolve2.core.optimization.ea.openai_es import DbOpenaiESOptimizerIndividual
 from revolve2.core.physics.running import (
-    ActorControl,
     ActorState,
     Batch,
-    Environment,
     PosedActor,
     Runner,
 )
-from revolve2.runners.mujoco import LocalRunner
 
 # SQLAlchemy
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, func, insert
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session
 
 # Genotypes
-from brain.lag import Genotype as BrainGenotype
+from body.cppnwin import Genotype as BodyGenotype
+from brain.lag import AnyGenotype as AnyBrainGenotype
+from brain.lag.modular_robot.brain_genotype_lag import grid_cells, grid_size_for
 
 # Local libraries
-from .crossover import crossover
+from .cache import FitnessCache
+from .checkpoint import (
+    delta_base,
+    is_delta,
+    make_delta,
+    replay,
+)
+from .crossover import crossover, crossover_brains
 from .genotype import Genotype, GenotypeSerializer
 from .helpers import (
     EnvironmentActorController,
     develop,
+    develop_phenotype,
     select_parents_tournament,
     select_survivors_tournament,
 )
-from .learning.openai_es.optimizer import Optimizer as OpenaiESOptimizer
-from .mutate import mutate
-from .optimizer_schema import DbFitness, DbOptimizerState
+from .learning.openai_es.racing import SuccessiveHalving
+from .learning.scheduler import LearningParameters, LearningScheduler, LearningTask
+from .mutate import mutate, mutate_brains
+from .optimizer_schema import DbFitness, DbOptimizerState, DbSteadyStateIndividual
+from .phenotype import Phenotype
+from .pipeline import Pipeline
+from .simulation import (
+    EarlyStopping,
+    JobPool,
+    KeyedEnvironment,
+    MujocoRunner,
+    PoseReducer,
+    model_key,
+)
 
 # Global variables
 FITNESS_TYPE = float
 FITNESS_SERIAL = FloatSerializer
 
+# Number of innovation database deltas between two full snapshots, bounds the
+# number of rows to replay when resuming
+_INNOV_DB_SNAPSHOT_INTERVAL = 20
+
+# Seconds between two saves of the fitness cache, a save pickles the whole cache
+_FITNESS_CACHE_SAVE_INTERVAL = 300.0
+
 
 class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
     """Optimizer for the knapsack problem."""
 
+    _database: AsyncEngine
     _db_id: DbId
     _rng: Random
     _num_generations: int
 
     # CPPN
     _runner: Runner
-    _controllers: List[ActorController]
+    _early_stopping: Optional[EarlyStopping]
+    _simulation_pool: Optional[JobPool]
+
+    # Learning
+    _learning_scheduler: LearningScheduler
+    _successive_halving: Optional[SuccessiveHalving]
+
+    # Simulation
+    _fitness_cache: Optional[FitnessCache]
+    _cache_save: Optional["asyncio.Future[None]"]  # the save in progress, if any
+    _cache_saved_at: float  # when the last save started, monotonic
+    _deduplicate_robots: bool
+    _exact_cpg: bool
+    _max_parts: int
+
+    # Reproduction
+    _offspring: Deque[Tuple[List[Genotype], Genotype]]  # parents and offspring
+
+    # Database
+    _pending_fitnesses: List[Dict[str, Any]]  # rows of `DbFitness`
+    _innov_db_checkpoint: Optional[Tuple[int, str]]  # index and text of the last
+    _innov_db_num_deltas: int  # since the last full snapshot
 
     _innov_db_body: multineat.InnovationDatabase  # type: ignore # STUB
     _simulation_time: int
@@ -98,8 +146,22 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         simulation_time: int,
         sampling_frequency: float,
         control_frequency: float,
+        num_learning_workers: int,
+        learning_lockstep: bool,
+        fitness_cache_size: int,
+        fitness_cache_path: Optional[str],
+        deduplicate_robots: bool,
+        early_stopping: Optional[EarlyStopping],
+        successive_halving: Optional[SuccessiveHalving],
+        exact_cpg: bool,
+        simulation_pool: Optional[JobPool] = None,
+        max_parts: int = 10,
     ) -> None:
         """Initialize the optimizer."""
+        assert all(
+            genotype.brain.grid_size >= grid_size_for(max_parts)
+            for genotype in initial_population
+        ), f"The brain grids are too small for bodies of {max_parts} parts"
 
         await super().ainit_new(
             database=database,
@@ -113,12 +175,22 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
             initial_population=initial_population,
         )
 
+        self._database = database
         self._db_id = db_id
         self._rng = rng
         self._num_generations = num_generations
 
         # CPPN
-        self._init_runner()
+        self._init_runner(early_stopping, simulation_pool)
+        self._init_learning(num_learning_workers, learning_lockstep, simulation_pool)
+        self._successive_halving = successive_halving
+        self._init_fitness_cache(fitness_cache_size, fitness_cache_path)
+        self._deduplicate_robots = deduplicate_robots
+        self._exact_cpg = exact_cpg
+        self._max_parts = max_parts
+        self._offspring = deque()
+        self._pending_fitnesses = []
+        self._init_checkpoints()
         self._innov_db_body = innov_db_body
         self._simulation_time = simulation_time
         self._sampling_frequency = sampling_frequency
@@ -134,26 +206,137 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         self._on_generation_checkpoint(session)
 
     def _on_generation_checkpoint(self, session: AsyncSession) -> None:
-        """Save the optimizer state to the database."""
+        """Save the optimizer state and the fitness records to the database.
+
+        The state, with the innovation database, is saved every generation, so a
+        run can always be resumed.
+        """
+
+        # add to session, in the transaction of the generation
+        session.add(self._make_optimizer_state(session, self.generation_index))
+        self._add_pending_fitnesses(session)
+
+    def _add_pending_fitnesses(self, session: AsyncSession) -> None:
+        """Insert the fitness records that were not saved yet when a session commits.
+
+        For the synchronous checkpoint hook, which cannot execute statements. The
+        rows are inserted with one executemany right before the commit, in the
+        same transaction, without building ORM objects.
+        """
+        rows, self._pending_fitnesses = self._pending_fitnesses, []
+        if not rows:
+            return
+
+        def insert_rows(sync_session: Session) -> None:
+            sync_session.execute(insert(DbFitness), rows)
 
-        # save optimizer state
-        opt_state = DbOptimizerState(
+        event.listen(session.sync_session, "before_commit", insert_rows, once=True)
+
+    async def _insert_pending_fitnesses(self, session: AsyncSession) -> None:
+        """Insert the fitness records that were not saved yet, in one statement."""
+        await self._insert_fitnesses(session, self._pending_fitnesses)
+        self._pending_fitnesses = []
+
+    @staticmethod
+    async def _insert_fitnesses(
+        session: AsyncSession, rows: List[Dict[str, Any]]
+    ) -> None:
+        """Insert fitness records, rows of `DbFitness`, in one statement."""
+        if rows:
+            await session.execute(insert(DbFitness), rows)
+
+    def _make_optimizer_state(
+        self, session: AsyncSession, index: int
+    ) -> DbOptimizerState:
+        """Make the database row of the optimizer state, to save with `session`."""
+        return DbOptimizerState(
             db_id=self._db_id.fullname,
-            generation_index=self.generation_index,
+            generation_index=index,
             rng=pickle.dumps(self._rng.getstate()),
-            innov_db_body=self._innov_db_body.Serialize(),
+            innov_db_body=self._checkpoint_innov_db_body(session, index),
             simulation_time=self._simulation_time,
             sampling_frequency=self._sampling_frequency,
             control_frequency=self._control_frequency,
             num_generations=self._num_generations,
         )
 
-        # add to session
-        session.add(opt_state)
+    def _checkpoint_innov_db_body(self, session: AsyncSession, index: int) -> str:
+        """Serialize the innovation database, as a delta on the last checkpoint.
 
-    def _init_runner(self) -> None:
+        The innovation database only grows, so storing it in full at every
+        checkpoint takes space quadratic in the number of checkpoints. Later
+        deltas are only based on this checkpoint once `session` committed it.
+        """
+        text = self._innov_db_body.Serialize()
+        checkpoint = None
+        if (
+            self._innov_db_checkpoint is not None
+            and self._innov_db_num_deltas < _INNOV_DB_SNAPSHOT_INTERVAL
+        ):
+            checkpoint = make_delta(*self._innov_db_checkpoint, text)
+        num_deltas = 0 if checkpoint is None else self._innov_db_num_deltas + 1
+
+        def committed(sync_session: Session) -> None:
+            self._innov_db_checkpoint = (index, text)
+            self._innov_db_num_deltas = num_deltas
+
+        event.listen(session.sync_session, "after_commit", committed, once=True)
+        return text if checkpoint is None else checkpoint
+
+    async def _load_innov_db_body(
+        self, session: AsyncSession, opt_row: DbOptimizerState
+    ) -> str:
+        """Get the innovation database of a checkpoint, replaying its deltas."""
+        value = opt_row.innov_db_body
+        deltas = []
+        while is_delta(value):
+            deltas.append(value)
+            base_row = await session.get(
+                DbOptimizerState, (opt_row.db_id, delta_base(value))
+            )
+            if base_row is None:
+                print("Innovation database checkpoint not found in database")
+                raise IncompatibleError
+            value = base_row.innov_db_body
+        self._innov_db_num_deltas = len(deltas)
+        return replay(value, deltas[::-1])
+
+    def _init_checkpoints(self) -> None:
+        """Initialize the checkpoints, none saved yet."""
+        self._innov_db_checkpoint = None
+        self._innov_db_num_deltas = 0
+
+    def _init_runner(
+        self,
+        early_stopping: Optional[EarlyStopping],
+        simulation_pool: Optional[JobPool],
+    ) -> None:
         """Initialize the runner."""
-        self._runner = LocalRunner(headless=True)
+        self._early_stopping = early_stopping
+        self._simulation_pool = simulation_pool
+        # the fitness only needs the first and the last state
+        self._runner = MujocoRunner(
+            early_stopping=early_stopping, reducer=PoseReducer(), pool=simulation_pool
+        )
+
+    def _init_learning(
+        self,
+        num_learning_workers: int,
+        learning_lockstep: bool,
+        simulation_pool: Optional[JobPool],
+    ) -> None:
+        """Initialize the scheduler of the learning periods."""
+        self._learning_scheduler = LearningScheduler(
+            num_workers=num_learning_workers,
+            lockstep=learning_lockstep,
+            pool=simulation_pool,
+        )
+
+    def _init_fitness_cache(self, size: int, path: Optional[str]) -> None:
+        """Initialize the fitness cache. A size of 0 disables it."""
+        self._fitness_cache = None if size == 0 else FitnessCache(size, path)
+        self._cache_save = None
+        self._cache_saved_at = time.monotonic()
 
     async def ainit_from_database(
         self,
@@ -162,6 +345,16 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         db_id: DbId,
         rng: Random,
         innov_db_body: multineat.InnovationDatabase,  # type: ignore # STUB
+        num_learning_workers: int,
+        learning_lockstep: bool,
+        fitness_cache_size: int,
+        fitness_cache_path: Optional[str],
+        deduplicate_robots: bool,
+        early_stopping: Optional[EarlyStopping],
+        successive_halving: Optional[SuccessiveHalving],
+        exact_cpg: bool,
+        simulation_pool: Optional[JobPool] = None,
+        max_parts: int = 10,
     ) -> bool:
         """Initialize the optimizer from the database."""
 
@@ -179,8 +372,18 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
             return False
 
         # save parameters
+        self._database = database
         self._db_id = db_id
-        self._init_runner()
+        self._init_runner(early_stopping, simulation_pool)
+        self._init_learning(num_learning_workers, learning_lockstep, simulation_pool)
+        self._successive_halving = successive_halving
+        self._init_fitness_cache(fitness_cache_size, fitness_cache_path)
+        self._deduplicate_robots = deduplicate_robots
+        self._exact_cpg = exact_cpg
+        self._max_parts = max_parts
+        self._offspring = deque()
+        self._pending_fitnesses = []
+        self._init_checkpoints()
 
         # retrive row from database
         opt_row = (
@@ -199,6 +402,12 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         if opt_row is None:
             print("Optimizer state not found in database")
             raise IncompatibleError
+        if opt_row.generation_index < self.generation_index:
+            print(
+                f"Optimizer state of generation {self.generation_index} not found, "
+                f"the last checkpoint is generation {opt_row.generation_index}"
+            )
+            raise IncompatibleError
 
         # load random number generator state
         self._rng = rng
@@ -211,11 +420,326 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         self._num_generations = opt_row.num_generations
 
         self._innov_db_body = innov_db_body
-        self._innov_db_body.Deserialize(opt_row.innov_db_body)
+        innov_db_text = await self._load_innov_db_body(session, opt_row)
+        self._innov_db_body.Deserialize(innov_db_text)
+        self._innov_db_checkpoint = (opt_row.generation_index, innov_db_text)
 
         # success
         return True
 
+    async def run(self) -> None:
+        """Run the optimizer, stopping the learning workers afterwards."""
+        try:
+            await super().run()
+            await self._save_pending_fitnesses()
+            await self._save_fitness_cache(force=True)
+            await self._wait_fitness_cache_saved()
+        finally:
+            self._learning_scheduler.shutdown()
+
+    async def run_steady_state(
+        self,
+        initial_population: List[Genotype],
+        num_evaluations: int,
+        num_workers: int,
+    ) -> None:
+        """Run the optimizer as an asynchronous steady-state algorithm.
+
+        There are no generations. Up to `num_workers` offspring are bred, learned
+        and evaluated at the same time, and every offspring competes for a place
+        in the population as soon as it is evaluated, replacing an individual
+        with tournament replacement. The database records the order in which the
+        offspring were inserted, see `DbSteadyStateIndividual`.
+
+        Parameters
+        ----------
+        initial_population : List[Genotype]
+            The initial population, if the run is not resumed from the database.
+        num_evaluations : int
+            Number of offspring to evaluate after the initial population.
+        num_workers : int
+            Number of offspring to evaluate at the same time.
+        """
+        try:
+            await self._run_steady_state(
+                initial_population, num_evaluations, num_workers
+            )
+            await self._save_pending_fitnesses()
+            await self._save_fitness_cache(force=True)
+            await self._wait_fitness_cache_saved()
+        finally:
+            self._learning_scheduler.shutdown()
+
+    async def _run_steady_state(
+        self,
+        initial_population: List[Genotype],
+        num_evaluations: int,
+        num_workers: int,
+    ) -> None:
+        """Run the steady-state loop, see `run_steady_state`."""
+        async with AsyncSession(self._database) as session:
+            async with session.begin():
+                await (await session.connection()).run_sync(
+                    DbSteadyStateIndividual.metadata.create_all
+                )
+                await GenotypeSerializer.create_tables(session)
+
+        # population as birth indices, genotypes and fitnesses
+        births, population, fitnesses = await self._load_steady_state()
+        next_birth, next_insertion = await self._next_steady_state_indices()
+
+        if not population:
+            logging.info("--- Evaluate initial population ---")
+            births = list(range(len(initial_population)))
+            population = list(initial_population)
+            fitnesses, records = await self._evaluate_and_learn(
+                population,
+                self._database,
+                self._db_id.branch("evaluate0"),
+                0,
+                self._rng,
+            )
+            async with AsyncSession(self._database) as session:
+                async with session.begin():
+                    genotype_ids = await GenotypeSerializer.to_database(
+                        session, population
+                    )
+                    session.add_all(
+                        [
+                            DbSteadyStateIndividual(
+                                db_id=self._db_id.fullname,
+                                birth_index=birth,
+                                insertion_index=birth,
+                                genotype_id=genotype_id,
+                                fitness=fitness,
+                                accepted=True,
+                            )
+                            for birth, genotype_id, fitness in zip(
+                                births, genotype_ids, fitnesses
+                            )
+                        ]
+                    )
+                    await session.merge(
+                        self._make_optimizer_state(session, len(population) - 1)
+                    )
+                    await self._insert_fitnesses(session, records)
+            next_birth = next_insertion = len(population)
+
+        num_inserted = next_insertion - len(population)
+        in_flight: Dict[
+            "asyncio.Future[Tuple[FITNESS_TYPE, List[Dict[str, Any]]]]",
+            Tuple[int, Genotype],
+        ] = {}
+
+        def start(birth: int, child: Genotype) -> None:
+            # the learners get their seeds from the breeding order, not the
+            # order in which the evaluations happen to run
+            task = asyncio.ensure_future(
+                self._evaluate_offspring(child, birth, self._rng.randint(0, 2**31))
+            )
+            in_flight[task] = (birth, child)
+
+        # evaluate again the offspring that were bred but not inserted when the
+        # run stopped, their learners resume from the database
+        for birth, child in await self._load_unresolved_births():
+            logging.info(f"Resuming offspring \033[92m{birth}\033[0m")
+            start(birth, child)
+
+        while num_inserted + len(in_flight) < num_evaluations or in_flight:
+            # keep every worker busy with a new offspring
+            new_births: List[Tuple[int, Genotype]] = []
+            while num_inserted + len(in_flight) + len(new_births) < (
+                num_evaluations
+            ) and (len(in_flight) + len(new_births) < num_workers):
+                child = self._breed(
+                    population, self._select_parent_groups(fitnesses, 1)
+                )[0]
+                new_births.append((next_birth, child))
+                next_birth += 1
+
+            # record the births in one transaction, before they are evaluated
+            if new_births:
+                await self._record_births(new_births)
+            for birth, child in new_births:
+                start(birth, child)
+
+            done, _ = await asyncio.wait(
+                in_flight.keys(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                birth, child = in_flight.pop(task)
+                fitness, records = task.result()
+
+                # tournament replacement, like the survivor selection
+                old_survivors, new_survivors = self._select_survivors(
+                    population, fitnesses, [child], [fitness], len(population)
+                )
+                replaced: Optional[int] = None
+                if new_survivors:
+                    replaced = next(
+                        i for i in range(len(population)) if i not in old_survivors
+                    )
+
+                await self._record_insertion(
+                    birth,
+                    next_insertion,
+                    child,
+                    fitness,
+                    None if replaced is None else births[replaced],
+                    records,
+                )
+                if replaced is not None:
+                    births[replaced] = birth
+                    population[replaced] = child
+                    fitnesses[replaced] = fitness
+
+                logging.info(
+                    f"Inserted offspring \033[92m{birth}\033[0m "
+                    f"({num_inserted + 1}/{num_evaluations}): "
+                    f"fitness {fitness:.3f}, "
+                    f"{'accepted' if replaced is not None else 'rejected'}"
+                )
+                next_insertion += 1
+                num_inserted += 1
+
+    async def _evaluate_offspring(
+        self, child: Genotype, birth: int, seed: int
+    ) -> Tuple[FITNESS_TYPE, List[Dict[str, Any]]]:
+        """Learn and evaluate a single offspring of the steady-state mode.
+
+        Runs concurrently with the evaluations of other offspring, so it only
+        uses its own random number generator and returns its fitness records.
+        """
+        fitnesses, records = await self._evaluate_and_learn(
+            [child],
+            self._database,
+            self._db_id.branch(f"evaluate{birth}"),
+            birth,
+            Random(seed),
+        )
+        return fitnesses[0], records
+
+    async def _record_births(self, births: List[Tuple[int, Genotype]]) -> None:
+        """Record bred offspring, so they are evaluated even if the run stops.
+
+        Their birth indices are never reused.
+        """
+        async with AsyncSession(self._database) as session:
+            async with session.begin():
+                genotype_ids = await GenotypeSerializer.to_database(
+                    session, [child for _, child in births]
+                )
+                session.add_all(
+                    [
+                        DbSteadyStateIndividual(
+                            db_id=self._db_id.fullname,
+                            birth_index=birth,
+                            genotype_id=genotype_id,
+                        )
+                        for (birth, _), genotype_id in zip(births, genotype_ids)
+                    ]
+                )
+
+    async def _load_unresolved_births(self) -> List[Tuple[int, Genotype]]:
+        """Load the offspring that were bred but not inserted, oldest first."""
+        async with AsyncSession(self._database) as session:
+            rows = (
+                (
+                    await session.execute(
+                        select(DbSteadyStateIndividual)
+                        .filter(DbSteadyStateIndividual.db_id == self._db_id.fullname)
+                        .filter(DbSteadyStateIndividual.insertion_index.is_(None))
+                        .order_by(DbSteadyStateIndividual.birth_index)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            # recorded without their genotype by older versions
+            lost = [row.birth_index for row in rows if row.genotype_id is None]
+            if lost:
+                logging.warning(f"Offspring {lost} can not be evaluated again")
+            rows = [row for row in rows if row.genotype_id is not None]
+            genotypes = await GenotypeSerializer.from_database(
+                session, [row.genotype_id for row in rows]
+            )
+        return [(row.birth_index, genotype) for row, genotype in zip(rows, genotypes)]
+
+    async def _record_insertion(
+        self,
+        birth: int,
+        insertion: int,
+        child: Genotype,
+        fitness: FITNESS_TYPE,
+        replaced_birth: Optional[int],
+        records: List[Dict[str, Any]],
+    ) -> None:
+        """Record an evaluated offspring with its fitness records and the state.
+
+        The genotype is saved again because learning changed its brain, with the
+        body saved at birth.
+        """
+        async with AsyncSession(self._database) as session:
+            async with session.begin():
+                row = await session.get(
+                    DbSteadyStateIndividual, (self._db_id.fullname, birth)
+                )
+                assert row is not None
+                row.insertion_index = insertion
+                genotype_ids = await GenotypeSerializer.to_database_with_brains(
+                    session, [row.genotype_id], [child.brain]
+                )
+                row.genotype_id = genotype_ids[0]
+                row.fitness = fitness
+                row.accepted = replaced_birth is not None
+                row.replaced_birth_index = replaced_birth
+                await session.merge(self._make_optimizer_state(session, insertion))
+                await self._insert_fitnesses(session, records)
+
+    async def _load_steady_state(
+        self,
+    ) -> Tuple[List[int], List[Genotype], List[FITNESS_TYPE]]:
+        """Load the current steady-state population from the database, if any."""
+        async with AsyncSession(self._database) as session:
+            rows = (
+                (
+                    await session.execute(
+                        select(DbSteadyStateIndividual)
+                        .filter(DbSteadyStateIndividual.db_id == self._db_id.fullname)
+                        .filter(DbSteadyStateIndividual.accepted.is_(True))
+                        .order_by(DbSteadyStateIndividual.insertion_index)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            replaced = {row.replaced_birth_index for row in rows}
+            alive = [row for row in rows if row.birth_index not in replaced]
+            genotypes = await GenotypeSerializer.from_database(
+                session, [row.genotype_id for row in alive]
+            )
+        return (
+            [row.birth_index for row in alive],
+            genotypes,
+            [row.fitness for row in alive],
+        )
+
+    async def _next_steady_state_indices(self) -> Tuple[int, int]:
+        """Get the next birth and insertion index of the steady-state mode."""
+        async with AsyncSession(self._database) as session:
+            max_birth, max_insertion = (
+                await session.execute(
+                    select(
+                        func.max(DbSteadyStateIndividual.birth_index),
+                        func.max(DbSteadyStateIndividual.insertion_index),
+                    ).filter(DbSteadyStateIndividual.db_id == self._db_id.fullname)
+                )
+            ).one()
+        return (
+            0 if max_birth is None else max_birth + 1,
+            0 if max_insertion is None else max_insertion + 1,
+        )
+
     def _must_do_next_gen(self) -> bool:
         """Check if the next generation must be done."""
         return (
@@ -224,13 +748,27 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
 
     def _select_parents(
         self,
-        population: List[Genotype],  # NOTE: not used
+        population: List[Genotype],
         fitnesses: List[FITNESS_TYPE],
         num_parent_groups: int,
     ) -> List[List[int]]:
-        """Select parents for the next generation."""
+        """Select parents for the next generation, and breed their offspring.
 
-        # Select parents using tournament selection
+        The EA calls `_crossover` and `_mutate` once per group right after, in
+        order. They hand out the offspring bred here, so that all brains are
+        crossed over and mutated at once.
+        """
+        assert not self._offspring, "offspring of an earlier selection were not used"
+        parent_groups = self._select_parent_groups(fitnesses, num_parent_groups)
+        offspring = self._breed(population, parent_groups)
+        for parents, child in zip(parent_groups, offspring):
+            self._offspring.append(([population[i] for i in parents], child))
+        return parent_groups
+
+    def _select_parent_groups(
+        self, fitnesses: List[FITNESS_TYPE], num_parent_groups: int
+    ) -> List[List[int]]:
+        """Select pairs of parents with tournament selection."""
         return select_parents_tournament(
             rng=self._rng,
             fitnesses=fitnesses,
@@ -239,6 +777,43 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
             tournament_size=10,
         )
 
+    def _breed(
+        self, population: List[Genotype], parent_groups: List[List[int]]
+    ) -> List[Genotype]:
+        """Crossover and mutate every pair of parents into an offspring.
+
+        The brains of all offspring are crossed over and mutated at once, then
+        every body in turn.
+
+        Parameters
+        ----------
+        population : List[Genotype]
+            The population the parents are from.
+        parent_groups : List[List[int]]
+            The indices of the parents of every offspring.
+
+        Returns
+        -------
+        List[Genotype]
+            The offspring, one per group of parents.
+        """
+        brains = mutate_brains(
+            crossover_brains(
+                [(population[i].brain, population[j].brain) for i, j in parent_groups],
+                self._rng,
+            ),
+            self._rng,
+        )
+        return [
+            mutate(
+                crossover(population[i], population[j], self._rng, brain=brain),
+                self._innov_db_body,
+                self._rng,
+                mutate_brain=False,
+            )
+            for (i, j), brain in zip(parent_groups, brains)
+        ]
+
     def _select_survivors(
         self,
         old_individuals: List[Genotype],  # NOTE: not used
@@ -261,13 +836,18 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         )
 
     def _crossover(self, parents: List[Genotype]) -> Genotype:
-        """Perform uniform crossover on the given parents."""
+        """Get the offspring of the given parents, bred in `_select_parents`."""
         assert len(parents) == 2
-        return crossover(parents[0], parents[1], self._rng)
+        assert self._offspring, "no offspring was bred, see `_select_parents`"
+        bred_parents, child = self._offspring.popleft()
+        assert all(
+            parent is bred_parent for parent, bred_parent in zip(parents, bred_parents)
+        ), "the parents are not those of the next bred offspring"
+        return child
 
     def _mutate(self, genotype: Genotype) -> Genotype:
-        """Mutate the given genotype."""
-        return mutate(genotype, self._innov_db_body, self._rng)
+        """Return the offspring, it was mutated in `_select_parents`."""
+        return genotype
 
     async def _evaluate_generation(
         self,
@@ -276,15 +856,61 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         db_id: DbId,
     ) -> List[FITNESS_TYPE]:
         """Evaluate the fitness of the given genotypes."""
+        fitnesses, records = await self._evaluate_and_learn(
+            genotypes, database, db_id, self.generation_index, self._rng
+        )
+
+        # Saved with the next checkpoint, in the same transaction
+        self._pending_fitnesses.extend(records)
+        return fitnesses
+
+    async def _evaluate_and_learn(
+        self,
+        genotypes: List[Genotype],
+        database: AsyncEngine,
+        db_id: DbId,
+        index: int,
+        rng: Random,
+    ) -> Tuple[List[FITNESS_TYPE], List[Dict[str, Any]]]:
+        """Evaluate, learn and evaluate again the given genotypes.
+
+        `index` is the generation index, or the birth index of the individual in
+        steady-state mode. It identifies the learners and the fitness records.
+        The learners are seeded from `rng`. Returns the fitnesses after learning
+        and the fitness records, rows of `DbFitness`, for the caller to save.
+        """
+
+        # Simulate and learn every group of equivalent robots only once
+        representatives, groups, hinge_orders = self._deduplicate(genotypes)
+        unique_genotypes = [genotypes[i] for i in representatives]
+        dedup_ratio = 1 - len(representatives) / len(genotypes)
+        logging.info(
+            f"Unique robots: \033[92m{len(representatives)}/{len(genotypes)}\033[0m"
+        )
+        logging.info(f"Dedup ratio: \033[92m{dedup_ratio:.2f}\033[0m")
+
+        # Prepare the learners on a thread while the robots are simulated. The
+        # phenotype cache is not thread-safe, develop the bodies here. Every
+        # learner is seeded up front, so the result does not depend on scheduling
+        pipeline = Pipeline()
+        phenotypes = [
+            develop_phenotype(genotype, self._max_parts)
+            for genotype in unique_genotypes
+        ]
+        seeds = [rng.randint(0, 2**31) for _ in unique_genotypes]
+        preparing_tasks = pipeline.run_in_background(
+            self._make_learning_tasks, unique_genotypes, phenotypes, index, seeds
+        )
 
         # Evaluate the fitness of the genotypes before learning
-        fitnesses_before = await self._evaluate_robots(genotypes)
+        fitnesses_before = await self._evaluate_robots(unique_genotypes)
+        fitnesses_before = [fitnesses_before[group] for group in groups]
 
         # ==================== START LEARNING PERIOD ====================
 
         # Perform the learning period
         logging.info(
-            f"--- Start Learning Period Gen \033[92m{self.generation_index}\033[0m ---"
+            f"--- Start Learning Period Gen \033[92m{index}\033[0m ---"
         )
 
         # rewrite smaller case
@@ -306,12 +932,14 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         logging.info(f"Simulation time: \033[92m{simulation_time}\033[0m")
         logging.info(f"Sampling frequency: \033[92m{sampling_frequency}\033[0m")
         logging.info(f"Control frequency: \033[92m{control_frequency}\033[0m")
+        logging.info(f"Successive halving: \033[92m{self._successive_halving}\033[0m")
 
-        for idx, __ in enumerate(genotypes):
-            new_brain = await self._learning_period(
-                genotypes[idx],
-                _db_id=str(self.generation_index),
-                database=database,
+        tasks = await pipeline.wait(preparing_tasks)
+        learned_params = await self._learning_scheduler.run(
+            database=database,
+            fitness_cache=self._fitness_cache,
+            tasks=tasks,
+            parameters=LearningParameters(
                 population_size=population_size,
                 sigma=sigma,
                 learning_rate=learning_rate,
@@ -319,13 +947,30 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
                 simulation_time=simulation_time,
                 sampling_frequency=sampling_frequency,
                 control_frequency=control_frequency,
-            )
-            genotypes[idx].brain = new_brain
+                early_stopping=self._early_stopping,
+                successive_halving=self._successive_halving,
+                exact_cpg=self._exact_cpg,
+            ),
+        )
+
+        # Give every genotype the brain learned for its group
+        for genotype, group, hinge_order in zip(genotypes, groups, hinge_orders):
+            representative_order = hinge_orders[representatives[group]]
+            params = [0.0 for _ in hinge_order]
+            for representative_hinge, hinge in zip(representative_order, hinge_order):
+                params[hinge] = learned_params[group][representative_hinge]
+            genotype.brain = self._apply_learned_params(genotype, params)
 
         # ==================== END LEARNING PERIOD  ====================
 
+        # Serialize the bodies for the database while the robots are simulated
+        pipeline.run_in_background(
+            self._serialize_bodies, [genotype.body for genotype in genotypes]
+        )
+
         # Evaluate the fitness of the genotypes after learning
-        fitnesses_after = await self._evaluate_robots(genotypes)
+        fitnesses_after = await self._evaluate_robots(unique_genotypes)
+        fitnesses_after = [fitnesses_after[group] for group in groups]
 
         # Learning delta
         learning_delta = [
@@ -334,10 +979,10 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
         ]
 
         # Commit the fitness_before, fitness_after and learning_delta to the database
-        db_objects = [
-            DbFitness(
+        db_rows = [
+            dict(
                 db_id=db_id.fullname,
-                generation_index=self.generation_index,
+                generation_index=index,
                 learner_index=learner_index,
                 fitness_before=fitness_before,
                 fitness_after=fitness_after,
@@ -350,140 +995,207 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
             ) in enumerate(zip(fitnesses_before, fitnesses_after, learning_delta))
         ]
 
-        async with AsyncSession(database) as session:
-            async with session.begin():
-                session.add_all(db_objects)
-                await session.flush()
+        # Wait for the background work before the generation is written
+        await pipeline.drain()
+        busy, hidden = pipeline.report()
+        logging.info(
+            f"Background work: {busy:.2f} s, "
+            f"hidden behind the simulations \033[92m{hidden:.2f}\033[0m s"
+        )
+
+        # Persist the fitness cache
+        if self._fitness_cache is not None:
+            logging.info(
+                f"Fitness cache: {len(self._fitness_cache)} entries, "
+                f"{self._fitness_cache.hits} hits, {self._fitness_cache.misses} misses"
+            )
+            await self._save_fitness_cache()
+
+        # Log the load of the simulation pool
+        if self._simulation_pool is not None:
+            metrics = self._simulation_pool.metrics()
+            logging.info(
+                f"Simulation pool: {metrics.jobs_completed} jobs, "
+                f"utilization \033[92m{metrics.utilization:.2f}\033[0m, "
+                f"queue depth {metrics.queue_depth}"
+            )
 
         # return fitnesses
-        return fitnesses_after
+        return fitnesses_after, db_rows
 
-    async def _learning_period(
-        self,
-        genotype: Genotype,
-        _db_id: str,
-        database: AsyncEngine,
-        population_size: int,
-        sigma: float,
-        learning_rate: float,
-        num_generations: int,
-        simulation_time: float,
-        sampling_frequency: float,
-        control_frequency: float,
-    ) -> BrainGenotype:
-        """Perform the learning period.
+    async def _save_pending_fitnesses(self) -> None:
+        """Write the fitness records that were not saved with a generation."""
+        if not self._pending_fitnesses:
+            return
+        async with AsyncSession(self._database) as session:
+            async with session.begin():
+                await self._insert_pending_fitnesses(session)
+
+    async def _save_fitness_cache(self, force: bool = False) -> None:
+        """Save a snapshot of the fitness cache on a thread, after the last save.
+
+        Pickling and writing a large cache takes a while, the snapshot is cheap.
+        Unless forced, the cache is saved at most every
+        `_FITNESS_CACHE_SAVE_INTERVAL` seconds.
+        """
+        if self._fitness_cache is None:
+            return
+        if (
+            not force
+            and time.monotonic() - self._cache_saved_at < _FITNESS_CACHE_SAVE_INTERVAL
+        ):
+            return
+        await self._wait_fitness_cache_saved()
+        self._cache_saved_at = time.monotonic()
+        self._cache_save = asyncio.get_running_loop().run_in_executor(
+            None, self._fitness_cache.save, self._fitness_cache.snapshot()
+        )
+
+    async def _wait_fitness_cache_saved(self) -> None:
+        """Wait for the save of the fitness cache in progress, if any."""
+        if self._cache_save is not None:
+            save, self._cache_save = self._cache_save, None
+            await save
+
+    def _deduplicate(
+        self, genotypes: List[Genotype]
+    ) -> Tuple[List[int], List[int], List[List[int]]]:
+        """Group the genotypes that develop into equivalent robots.
+
+        Robots are equivalent if their bodies have the same canonical morphology
+        (see `utils.morphology`) and their hinges, in canonical order, get the
+        same CPG parameters. Equivalent robots only differ in heading, which the
+        fitness does not depend on.
 
         Parameters
         ----------
-        genotype : Genotype
-            The genotype to be learned.
-        database : AsyncEngine
-            The database to use.
-        population_size : int
-            The population size.
-        sigma : float
-            The sigma.
-        learning_rate : float
-            The learning rate.
-        num_generations : int
-            The number of generations.
-        simulation_time : float
-            The simulation time.
-        sampling_frequency : int
-            The sampling frequency.
-        control_frequency : int
-            The control frequency.
+        genotypes : List[Genotype]
+            The genotypes to group.
 
         Returns
         -------
-        BrainGenotype
-            The learned brain genotype.
+        Tuple[List[int], List[int], List[List[int]]]
+            The index of the first genotype of every group, the group of every
+            genotype and, for every genotype, its active hinges in canonical order.
         """
+        representatives: List[int] = []
+        groups: List[int] = []
+        hinge_orders: List[List[int]] = []
+        group_of_key: Dict[Tuple[str, Tuple[float, ...]], int] = {}
+
+        for index, genotype in enumerate(genotypes):
+            phenotype = develop_phenotype(genotype, self._max_parts)
+            params = self._brain_params(genotype, phenotype)
+
+            # symmetric bodies have several canonical orders, use the lowest params
+            canonical_params, hinge_order = min(
+                (tuple(params[hinge] for hinge in order), order)
+                for order in phenotype.morphology.hinge_orders
+            )
+            hinge_orders.append(hinge_order)
 
-        # unique database identifier for optimizer
-        db_id = DbId.root(f"openaies{_db_id}")
+            if not self._deduplicate_robots:
+                key = (str(index), ())
+            else:
+                key = (phenotype.morphology.fingerprint, canonical_params)
 
-        robot = develop(genotype)
-        body = robot.body
-        grid_size = genotype.brain.grid_size
+            if key not in group_of_key:
+                group_of_key[key] = len(representatives)
+                representatives.append(index)
+            groups.append(group_of_key[key])
 
-        hinges = body.find_active_hinges()
-        cpgs = [Cpg(i) for i, _ in enumerate(hinges)]
-        brain = CpgNetworkStructure(cpgs, set())
+        return representatives, groups, hinge_orders
 
-        params = []
-        for hinge in hinges:
-            pos = body.grid_position(hinge)
-            params.append(
-                genotype.brain.genotype[
-                    int(pos[0] + pos[1] * grid_size + grid_size**2 / 2)
-                ]
+    def _make_learning_tasks(
+        self,
+        genotypes: List[Genotype],
+        phenotypes: List[Phenotype],
+        index: int,
+        seeds: List[int],
+    ) -> List[LearningTask]:
+        """Prepare the learning periods of the genotypes, see `_make_learning_task`."""
+        return [
+            self._make_learning_task(
+                genotype, phenotype, _db_id=f"{index}_{learner_index}", seed=seed
+            )
+            for learner_index, (genotype, phenotype, seed) in enumerate(
+                zip(genotypes, phenotypes, seeds)
             )
+        ]
 
-        maybe_optimizer = await OpenaiESOptimizer.from_database(
-            database=database,
-            db_id=db_id,
-            rng=self._rng,
-            robot_body=body,
-            simulation_time=simulation_time,
-            sampling_frequency=sampling_frequency,
-            control_frequency=control_frequency,
-            num_generations=num_generations,
-            cpg_structure=brain,
+    @staticmethod
+    def _serialize_bodies(bodies: List[BodyGenotype]) -> None:
+        """Serialize the bodies ahead of the database writes, see `serialize`."""
+        for body in bodies:
+            body.serialize()
+
+    def _make_learning_task(
+        self,
+        genotype: Genotype,
+        phenotype: Phenotype,
+        _db_id: str,
+        seed: int,
+    ) -> LearningTask:
+        """Prepare the learning period of a genotype.
+
+        Parameters
+        ----------
+        genotype : Genotype
+            The genotype to be learned.
+        phenotype : Phenotype
+            The developed body of the genotype.
+        _db_id : str
+            Suffix of the database identifier of the learner.
+        seed : int
+            Seed for the random number generator of the learner.
+
+        Returns
+        -------
+        LearningTask
+            The learning task.
+        """
+        cpgs = [Cpg(i) for i, _ in enumerate(phenotype.active_hinges)]
+
+        return LearningTask(
+            db_id=f"openaies{_db_id}",
+            seed=seed,
+            body=phenotype.body,
+            cpg_structure=CpgNetworkStructure(cpgs, set()),
+            initial_mean=self._brain_params(genotype, phenotype),
         )
-        if maybe_optimizer is not None:
-            optimizer = maybe_optimizer
-        else:
-            optimizer = await OpenaiESOptimizer.new(
-                database=database,
-                db_id=db_id,
-                rng=self._rng,
-                population_size=population_size,
-                sigma=sigma,
-                learning_rate=learning_rate,
-                robot_body=body,
-                simulation_time=simulation_time,
-                sampling_frequency=sampling_frequency,
-                control_frequency=control_frequency,
-                num_generations=num_generations,
-                cpg_structure=brain,
-                initial_mean=params,
-            )
 
-        await optimizer.run()
+    def _apply_learned_params(
+        self, genotype: Genotype, params: List[float]
+    ) -> AnyBrainGenotype:
+        """Write the learned parameters back into a copy of the brain genotype.
 
-        async with AsyncSession(database) as session:
-            best_individual = (
-                (
-                    await session.execute(
-                        select(DbOpenaiESOptimizerIndividual)
-                        .filter(DbOpenaiESOptimizerIndividual.db_id == db_id)
-                        .order_by(DbOpenaiESOptimizerIndividual.fitness.desc())
-                    )
-                )
-                .scalars()
-                .all()[0]
-            )
-            params = [
-                p
-                for p in (
-                    await Ndarray1xnSerializer.from_database(
-                        session, [best_individual.individual]
-                    )
-                )[0]
-            ]
+        Parameters
+        ----------
+        genotype : Genotype
+            The genotype that was learned.
+        params : List[float]
+            The learned parameters, one per active hinge.
 
-        improved_brain = deepcopy(genotype.brain)
-        improved_brain_genotype = deepcopy(genotype.brain.genotype)
+        Returns
+        -------
+        AnyBrainGenotype
+            The learned brain genotype.
+        """
+        phenotype = develop_phenotype(genotype, self._max_parts)
+        return genotype.brain.with_cells(self._brain_cells(genotype, phenotype), params)
 
-        for hinge, learned_weight in zip(hinges, params):
-            pos = body.grid_position(hinge)
-            improved_brain_genotype[
-                int(pos[0] + pos[1] * grid_size + grid_size**2 / 2)
-            ] = learned_weight
+    @staticmethod
+    def _brain_cells(genotype: Genotype, phenotype: Phenotype) -> List[int]:
+        """Index in the brain genotype of every active hinge of the body."""
+        return grid_cells(phenotype.grid_positions, genotype.brain.grid_size)
 
-        improved_brain.genotype = improved_brain_genotype
-        return improved_brain
+    @classmethod
+    def _brain_params(cls, genotype: Genotype, phenotype: Phenotype) -> List[float]:
+        """CPG parameter of every active hinge of the body."""
+        return [
+            float(param)
+            for param in genotype.brain.get_cells(cls._brain_cells(genotype, phenotype))
+        ]
 
     async def _evaluate_robots(
         self,
@@ -491,66 +1203,81 @@ class Optimizer(EAOptimizer[Genotype, FITNESS_TYPE]):
     ) -> List[FITNESS_TYPE]:
         """Evaluate the fitness of the given genotypes."""
 
+        phenotypes = [
+            develop_phenotype(genotype, self._max_parts) for genotype in genotypes
+        ]
+        fitnesses: List[Optional[FITNESS_TYPE]] = [None for _ in genotypes]
+
+        # Look up the robots that were simulated before
+        keys: List[str] = []
+        if self._fitness_cache is not None:
+            keys = [
+                FitnessCache.make_key(
+                    phenotype.body_hash,
+                    self._brain_params(genotype, phenotype),
+                    self._simulation_time,
+                    self._sampling_frequency,
+                    self._control_frequency,
+                    self._early_stopping,
+                    self._exact_cpg,
+                )
+                for genotype, phenotype in zip(genotypes, phenotypes)
+            ]
+            fitnesses = [self._fitness_cache.get(key) for key in keys]
+        to_simulate = [i for i, fitness in enumerate(fitnesses) if fitness is None]
+
         batch = Batch(
             simulation_time=self._simulation_time,
             sampling_frequency=self._sampling_frequency,
             control_frequency=self._control_frequency,
         )
 
-        self._controllers = []
-
-        for genotype in genotypes:
+        for i in to_simulate:
             # Initialize the robot
-            actor, controller = develop(genotype).make_actor_and_controller()
-            bounding_box = actor.calc_aabb()
-            self._controllers.append(controller)
+            phenotype = phenotypes[i]
+            robot = develop(
+                genotypes[i], exact_cpg=self._exact_cpg, max_parts=self._max_parts
+            )
+            controller = robot.brain.make_controller(
+                phenotype.body, phenotype.dof_ids
+            )
 
             # Initialize the environment
-            env = Environment(EnvironmentActorController(controller))
+            env = KeyedEnvironment(
+                EnvironmentActorController(controller),
+                model_key=model_key(
+                    phenotype.body_hash, phenotype.spawn_position, Quaternion()
+                ),
+            )
             env.actors.append(
                 PosedActor(
-                    actor=actor,
-                    position=Vector3(
-                        [
-                            0.0,
-                            0.0,
-                            bounding_box.size.z / 2.0 - bounding_box.offset.z,
-                        ]
-                    ),
+                    actor=phenotype.actor,
+                    position=phenotype.spawn_position,
                     orientation=Quaternion(),
                     dof_states=[0.0 for _ in controller.get_dof_targets()],
                 )
             )
             batch.environments.append(env)
-        batch_results = await self._runner.run_batch(batch)
 
-        return [
-            self._calculate_fitness(
-                env_res.environment_states[0].actor_states[0],
-                env_res.environment_states[-1].actor_states[0],
+        if batch.environments:
+            batch_results = await self._runner.run_batch(batch)
+            assert len(batch_results.environment_results) == len(to_simulate), (
+                f"{len(batch_results.environment_results)} results "
+                f"for {len(to_simulate)} environments"
             )
-            for env_res in batch_results.environment_results
-        ]
-
-    def _control(
-        self, environment_index: int, dt: float, control: ActorControl
-    ) -> None:
-        """Control the robot.
 
-        Parameters
-        ----------
-        environment_index : int
-            The index of the environment.
-        dt : float
-            The time step.
-        control : ActorControl
-            The control object.
-        """
+            for i, env_res in zip(to_simulate, batch_results.environment_results):
+                fitnesses[i] = self._calculate_fitness(
+                    env_res.environment_states[0].actor_states[0],
+                    env_res.environment_states[-1].actor_states[0],
+                )
+                if self._fitness_cache is not None:
+                    self._fitness_cache.put(keys[i], fitnesses[i])
 
-        # Control the robot
-        controller = self._controllers[environment_index]
-        controller.step(dt)
-        control.set_dof_targets(actor=0, targets=controller.get_dof_targets())
+        # every robot was either cached or simulated
+        missing = [i for i, fitness in enumerate(fitnesses) if fitness is None]
+        assert not missing, f"No fitness for robots {missing}"
+        return cast(List[FITNESS_TYPE], fitnesses)
 
     @staticmethod
     def _calculate_fitness(begin_state: ActorState, end_state: ActorState) -> float:
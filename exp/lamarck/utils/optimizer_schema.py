@@ -10,7 +10,7 @@ This code is provided "As Is"
 """
 
 # SQLAlchemy
-from sqlalchemy import Column, Float, Integer, PickleType, String
+from sqlalchemy import Boolean, Column, Float, Integer, PickleType, String
 from sqlalchemy.ext.declarative import declarative_base
 
 # import os
@@ -58,3 +58,33 @@ class DbFitness(DbBase):
     fitness_before = Column(Float, nullable=False)
     fitness_after = Column(Float, nullable=False)
     learning_delta = Column(Float, nullable=False)
+
+
+class DbSteadyStateIndividual(DbBase):
+    """Database representation of an individual of the steady-state mode.
+
+    A row is created when the individual is bred, and completed when it was
+    evaluated and competed for a place in the population. Rows that were not
+    completed when a run stopped are evaluated again when it resumes.
+    """
+
+    __tablename__ = "steady_state_individuals"
+
+    db_id = Column(
+        String,
+        nullable=False,
+        primary_key=True,
+    )
+
+    birth_index = Column(Integer, nullable=False, primary_key=True)
+
+    # The genotype as bred, replaced by the learned genotype once evaluated
+    genotype_id = Column(Integer, nullable=True)
+
+    # Set once the individual is evaluated, in the order of evaluation
+    insertion_index = Column(Integer, nullable=True)
+    fitness = Column(Float, nullable=True)
+    accepted = Column(Boolean, nullable=True)
+
+    # The individual that was replaced by this one, if any
+    replaced_birth_index = Column(Integer, nullable=True)
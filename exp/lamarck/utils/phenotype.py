@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+The parts of a phenotype that only depend on the body genotype.
+
+Evaluation and learning develop the same genotype several times per generation.
+The cache below keeps the developed body and everything derived from it for the
+genotype objects that are still in use.
+"""
+
+# Standard libraries
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Third-party libraries
+from pyrr import Vector3
+
+# Revolve2
+from revolve2.core.modular_robot import ActiveHinge, Body
+from revolve2.core.physics.actor import Actor
+
+# Genotypes
+from body.cppnwin import Genotype as BodyGenotype
+from body.cppnwin.modular_robot.body_genotype import develop as body_dev
+
+# Local libraries
+from .morphology import Morphology, body_hash, canonical_morphology
+
+
+@dataclass
+class Phenotype:
+    """A developed body and the analysis shared by evaluation and learning."""
+
+    body: Body
+    active_hinges: List[ActiveHinge]
+    grid_positions: List[Vector3]  # one per active hinge
+    actor: Actor
+    dof_ids: List[int]
+    spawn_position: Vector3  # puts the bottom of the robot on the ground
+    body_hash: str
+    morphology: Morphology
+
+
+def develop_phenotype(genotype: BodyGenotype, max_parts: int = 10) -> Phenotype:
+    """Develop a body genotype into a phenotype.
+
+    Parameters
+    ----------
+    genotype : BodyGenotype
+        The body genotype to develop.
+    max_parts : int
+        Maximum number of modules of the body, including the core.
+
+    Returns
+    -------
+    Phenotype
+        The phenotype.
+    """
+    body = body_dev(genotype=genotype, max_parts=max_parts)
+    active_hinges = body.find_active_hinges()
+    actor, dof_ids = body.to_actor()
+    bounding_box = actor.calc_aabb()
+
+    return Phenotype(
+        body=body,
+        active_hinges=active_hinges,
+        grid_positions=[body.grid_position(hinge) for hinge in active_hinges],
+        actor=actor,
+        dof_ids=dof_ids,
+        spawn_position=Vector3(
+            [0.0, 0.0, bounding_box.size.z / 2.0 - bounding_box.offset.z]
+        ),
+        body_hash=body_hash(body),
+        morphology=canonical_morphology(body, active_hinges),
+    )
+
+
+class PhenotypeCache:
+    """LRU cache of phenotypes, per body genotype object.
+
+    Mutation and crossover always create new genotype objects, so a mutated
+    genotype never finds the phenotype of its parent. Genotypes changed in place
+    must be invalidated explicitly.
+    """
+
+    _max_size: int
+    _entries: "OrderedDict[int, Tuple[BodyGenotype, int, Phenotype]]"
+
+    def __init__(self, max_size: int) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        max_size : int
+            Maximum number of phenotypes to keep.
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, genotype: BodyGenotype, max_parts: int = 10) -> Phenotype:
+        """Get the phenotype of a body genotype, developing it if needed.
+
+        See `develop_phenotype` for the parameters.
+        """
+        # the entry holds the genotype, so its id cannot be reused while cached
+        entry = self._entries.get(id(genotype))
+        if entry is not None and entry[0] is genotype and entry[1] == max_parts:
+            self._entries.move_to_end(id(genotype))
+            return entry[2]
+
+        phenotype = develop_phenotype(genotype, max_parts)
+        self._entries[id(genotype)] = (genotype, max_parts, phenotype)
+        self._entries.move_to_end(id(genotype))
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return phenotype
+
+    def invalidate(self, genotype: BodyGenotype) -> None:
+        """Forget the phenotype of a body genotype that was changed in place."""
+        self._entries.pop(id(genotype), None)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Background work that overlaps with the simulations.
+
+The event loop is mostly idle while the simulators run. Work for the next batch,
+like preparing the learners or serializing the genotypes for the database, runs
+on a thread meanwhile, and the pipeline measures how much of its wall time was
+hidden that way.
+"""
+
+# Standard libraries
+import asyncio
+import time
+from typing import Any, Callable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Pipeline:
+    """Runs functions on a thread while the event loop awaits the simulations."""
+
+    _pending: List["asyncio.Future[Tuple[Any, float]]"]
+    _busy_seconds: float
+    _blocked_seconds: float
+
+    def __init__(self) -> None:
+        """Initialize this object."""
+        self._pending = []
+        self._busy_seconds = 0.0
+        self._blocked_seconds = 0.0
+
+    def run_in_background(
+        self, fn: Callable[..., T], *args: Any
+    ) -> "asyncio.Future[Tuple[T, float]]":
+        """Run a function on a thread of the default executor.
+
+        The function must not touch state that the event loop changes meanwhile.
+        Pass the returned future to `wait` to get the result.
+        """
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._timed, fn, *args
+        )
+        self._pending.append(future)
+        return future
+
+    async def wait(self, future: "asyncio.Future[Tuple[T, float]]") -> T:
+        """Wait for background work, counting the time spent waiting as not hidden."""
+        start = time.perf_counter()
+        try:
+            result, seconds = await future
+        finally:
+            self._blocked_seconds += time.perf_counter() - start
+            if future in self._pending:
+                self._pending.remove(future)
+        self._busy_seconds += seconds
+        return result
+
+    async def drain(self) -> None:
+        """Wait for all background work, raising its first exception."""
+        while self._pending:
+            await self.wait(self._pending[0])
+
+    def report(self) -> Tuple[float, float]:
+        """Get the busy and the hidden seconds of the background work so far."""
+        return (
+            self._busy_seconds,
+            max(0.0, self._busy_seconds - self._blocked_seconds),
+        )
+
+    @staticmethod
+    def _timed(fn: Callable[..., T], *args: Any) -> Tuple[T, float]:
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
@@ -32,6 +32,7 @@ def random(
     rng: Random,
     num_initial_mutations: int,
     brain_grid_size: int,
+    sparse_brain: bool = False,
 ) -> Genotype:
     """Generate a random genotype, by generating a random string of booleans.
 
@@ -45,6 +46,8 @@ def random(
         Number of mutations to apply to the genotype.
     brain_grid_size : int
         Length of one side of the robot square grid. Used to determine the size of the brain.
+    sparse_brain : bool
+        Whether the brain only stores the grid cells used by the body.
     """
     multineat_rng = multineat_rng_from_random(rng=rng)
 
@@ -56,6 +59,6 @@ def random(
         num_initial_mutations=num_initial_mutations,
     )
 
-    brain = brain_rnd(grid_size=brain_grid_size, rng=rng)
+    brain = brain_rnd(grid_size=brain_grid_size, rng=rng, sparse=sparse_brain)
 
     return Genotype(body=body, brain=brain)
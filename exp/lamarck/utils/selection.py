@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Selection operators on NumPy arrays, for large populations.
+
+Every operator takes the fitnesses of the population (higher is better) and
+returns the indices of the selected individuals. Individuals are drawn without
+replacement in O(n log n), and the result only depends on the state of the
+given generator. Ties in fitness are broken by index, the lowest first.
+"""
+
+# Standard libraries
+from typing import List, Sequence, Tuple
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+
+def tournament(
+    fitnesses: Sequence[float],
+    num_selected: int,
+    tournament_size: int,
+    rng: np.random.Generator,
+) -> npt.NDArray[np.int64]:
+    """Select individuals with tournaments, without replacement.
+
+    Every tournament draws `tournament_size` contestants, with replacement, from
+    the individuals that were not selected yet, and selects the fittest.
+
+    Parameters
+    ----------
+    fitnesses : Sequence[float]
+        The fitnesses of the population.
+    num_selected : int
+        The number of individuals to select.
+    tournament_size : int
+        The number of contestants of a tournament.
+    rng : np.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    npt.NDArray[np.int64]
+        The indices of the selected individuals, in order of selection.
+    """
+    ranking = _ranking(fitnesses)
+    num_candidates = len(ranking)
+    assert 0 <= num_selected <= num_candidates
+    assert tournament_size >= 1
+
+    # the winner is the best of the contestants: with m candidates left, its
+    # position among them is below j with probability 1 - ((m - j) / m)^k
+    remaining = num_candidates - np.arange(num_selected)
+    draws = rng.random(num_selected)
+    positions = np.floor(remaining * (1.0 - draws ** (1.0 / tournament_size)))
+    positions = np.minimum(positions.astype(np.int64), remaining - 1)
+
+    # find the position among the ranks that are left, with a Fenwick tree
+    tree = [i & -i for i in range(num_candidates + 1)]
+    top_bit = 1 << (num_candidates.bit_length() - 1) if num_candidates else 0
+    winners = np.empty(num_selected, dtype=np.int64)
+    for t, position in enumerate(positions.tolist()):
+        rank = 0
+        count = position + 1
+        bit = top_bit
+        while bit:
+            node = rank + bit
+            if node <= num_candidates and tree[node] < count:
+                rank = node
+                count -= tree[node]
+            bit >>= 1
+        winners[t] = rank
+
+        node = rank + 1
+        while node <= num_candidates:
+            tree[node] -= 1
+            node += node & -node
+
+    return ranking[winners]
+
+
+def tournament_groups(
+    fitnesses: Sequence[float],
+    num_groups: int,
+    group_size: int,
+    tournament_size: int,
+    rng: np.random.Generator,
+) -> npt.NDArray[np.int64]:
+    """Select groups of individuals, e.g. parents, with one tournament per group.
+
+    Every tournament draws `tournament_size` different contestants and selects
+    the `group_size` fittest. The groups are drawn independently.
+
+    Parameters
+    ----------
+    fitnesses : Sequence[float]
+        The fitnesses of the population.
+    num_groups : int
+        The number of groups to select.
+    group_size : int
+        The number of individuals in a group.
+    tournament_size : int
+        The number of contestants of a tournament.
+    rng : np.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    npt.NDArray[np.int64]
+        The indices of the selected individuals, one group per row, fittest first.
+    """
+    ranking = _ranking(fitnesses)
+    num_candidates = len(ranking)
+    assert 1 <= group_size <= tournament_size <= num_candidates
+
+    if tournament_size * tournament_size > num_candidates:
+        # repeats are likely, take the first contestants of random permutations
+        keys = rng.random((num_groups, num_candidates))
+        contestants = np.sort(
+            np.argpartition(keys, tournament_size - 1, axis=1)[:, :tournament_size],
+            axis=1,
+        )
+    else:
+        # draw with replacement, then redraw the tournaments with a repeat
+        contestants = _sorted_integers(num_candidates, num_groups, tournament_size, rng)
+        repeated = np.flatnonzero(_has_repeats(contestants))
+        while len(repeated) > 0:
+            contestants[repeated] = _sorted_integers(
+                num_candidates, len(repeated), tournament_size, rng
+            )
+            repeated = repeated[_has_repeats(contestants[repeated])]
+
+    # contestants are ranks, the lowest are the fittest
+    return ranking[contestants[:, :group_size]]
+
+
+def rank(
+    fitnesses: Sequence[float],
+    num_selected: int,
+    rng: np.random.Generator,
+) -> npt.NDArray[np.int64]:
+    """Select individuals without replacement, with linear rank weights.
+
+    The fittest of n individuals has weight n, the least fit weight 1.
+
+    Parameters
+    ----------
+    fitnesses : Sequence[float]
+        The fitnesses of the population.
+    num_selected : int
+        The number of individuals to select.
+    rng : np.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    npt.NDArray[np.int64]
+        The indices of the selected individuals, in order of selection.
+    """
+    ranking = _ranking(fitnesses)
+    num_candidates = len(ranking)
+    assert 0 <= num_selected <= num_candidates
+
+    # weighted sampling without replacement (Efraimidis and Spirakis): keep the
+    # largest u^(1 / w), compared as log(u) / w
+    weights = np.arange(num_candidates, 0, -1, dtype=np.float64)
+    keys = np.log(rng.random(num_candidates)) / weights
+    return ranking[_largest(keys, num_selected)]
+
+
+def truncation(fitnesses: Sequence[float], num_selected: int) -> npt.NDArray[np.int64]:
+    """Select the fittest individuals.
+
+    Parameters
+    ----------
+    fitnesses : Sequence[float]
+        The fitnesses of the population.
+    num_selected : int
+        The number of individuals to select.
+
+    Returns
+    -------
+    npt.NDArray[np.int64]
+        The indices of the selected individuals, fittest first.
+    """
+    values = np.asarray(fitnesses, dtype=np.float64)
+    assert 0 <= num_selected <= len(values)
+    return _largest(values, num_selected)
+
+
+def mu_plus_lambda(
+    old_fitnesses: Sequence[float],
+    new_fitnesses: Sequence[float],
+    num_survivors: int,
+) -> Tuple[List[int], List[int]]:
+    """Select the fittest of the parents and their offspring, (mu + lambda).
+
+    Parameters
+    ----------
+    old_fitnesses : Sequence[float]
+        The fitnesses of the parents.
+    new_fitnesses : Sequence[float]
+        The fitnesses of the offspring.
+    num_survivors : int
+        The number of survivors, mu.
+
+    Returns
+    -------
+    Tuple[List[int], List[int]]
+        The indices of the parents and of the offspring that survive.
+    """
+    survivors = truncation(
+        np.concatenate(
+            [
+                np.asarray(old_fitnesses, dtype=np.float64),
+                np.asarray(new_fitnesses, dtype=np.float64),
+            ]
+        ),
+        num_survivors,
+    )
+    return split(survivors, len(old_fitnesses))
+
+
+def split(indices: npt.NDArray[np.int64], num_old: int) -> Tuple[List[int], List[int]]:
+    """Split indices into the merged old and new individuals into two lists.
+
+    Parameters
+    ----------
+    indices : npt.NDArray[np.int64]
+        Indices into the old individuals followed by the new ones.
+    num_old : int
+        The number of old individuals.
+
+    Returns
+    -------
+    Tuple[List[int], List[int]]
+        The indices of the old and of the new individuals, in the same order.
+    """
+    old = indices < num_old
+    return indices[old].tolist(), (indices[~old] - num_old).tolist()
+
+
+def _ranking(fitnesses: Sequence[float]) -> npt.NDArray[np.int64]:
+    """Indices of the individuals from the fittest to the least fit."""
+    values = np.asarray(fitnesses, dtype=np.float64)
+    return np.argsort(-values, kind="stable")
+
+
+def _sorted_integers(
+    high: int, num_rows: int, num_columns: int, rng: np.random.Generator
+) -> npt.NDArray[np.int64]:
+    """Random integers in [0, high), sorted per row."""
+    return np.sort(rng.integers(0, high, (num_rows, num_columns)), axis=1)
+
+
+def _has_repeats(rows: npt.NDArray[np.int64]) -> npt.NDArray[np.bool_]:
+    """Whether the sorted rows hold a value more than once."""
+    return np.any(rows[:, 1:] == rows[:, :-1], axis=1)
+
+
+def _largest(values: npt.NDArray[np.float_], count: int) -> npt.NDArray[np.int64]:
+    """Indices of the largest values, largest first, ties by index."""
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    if count < len(values):
+        # partition first, then only sort the candidates
+        threshold = np.partition(values, len(values) - count)[len(values) - count]
+        candidates = np.flatnonzero(values >= threshold)
+    else:
+        candidates = np.arange(len(values))
+    order = np.argsort(-values[candidates], kind="stable")
+    return candidates[order[:count]]
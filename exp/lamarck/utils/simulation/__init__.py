@@ -0,0 +1,40 @@
+"""Simulation of robots for the optimizers."""
+
+from .cpg import BatchedCpgController
+from .models import KeyedEnvironment, ModelCache, model_key
+from .pool import JobPool, PoolMetrics, SimulationPool
+from .reducers import (
+    AllStates,
+    PoseReducer,
+    PoseSummary,
+    ReducedEnvironmentResults,
+    StateAccumulator,
+    StateReducer,
+)
+from .remote import RemoteWorkers, generate_authkey, spawn_local_workers
+from .runner import MujocoRunner, simulate_environment, simulate_environments
+from .stopping import EarlyStopping, EarlyStoppingMonitor
+
+__all__ = [
+    "AllStates",
+    "BatchedCpgController",
+    "EarlyStopping",
+    "EarlyStoppingMonitor",
+    "JobPool",
+    "KeyedEnvironment",
+    "ModelCache",
+    "MujocoRunner",
+    "PoolMetrics",
+    "PoseReducer",
+    "PoseSummary",
+    "ReducedEnvironmentResults",
+    "RemoteWorkers",
+    "SimulationPool",
+    "StateAccumulator",
+    "StateReducer",
+    "generate_authkey",
+    "model_key",
+    "simulate_environment",
+    "simulate_environments",
+    "spawn_local_workers",
+]
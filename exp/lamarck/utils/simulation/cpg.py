@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+CPG controller that steps the CPG networks of many environments at once.
+
+The states and weight matrices of all networks are stacked into arrays padded
+to the largest network. Padded neurons have no connections, so they stay zero
+and do not change the other neurons.
+
+Exactly integrated networks are stepped with their stacked transition matrices
+instead, and their whole trajectory can be precomputed, so that control becomes
+a table lookup.
+"""
+
+# Standard libraries
+from typing import List, Optional, Sequence
+
+# Third-party libraries
+import numpy as np
+import numpy.typing as npt
+
+# Revolve2
+from revolve2.actor_controllers.cpg import CpgActorController
+from revolve2.core.physics.running import Environment
+
+# Genotypes
+from brain.lag.modular_robot.brain_cpg_network_exact import (
+    ExactCpgActorController,
+    transition_matrix,
+)
+
+
+class BatchedCpgController:
+    """Steps a batch of CPG networks with one vectorized operation per tick."""
+
+    _states: npt.NDArray[np.float_]  # (batch, neurons)
+    _weight_matrices: npt.NDArray[np.float_]  # (batch, neurons, neurons)
+    _dof_ranges: npt.NDArray[np.float_]  # (batch, outputs)
+    _num_outputs: npt.NDArray[np.int_]  # (batch,)
+    _targets: npt.NDArray[np.float_]  # (batch, outputs)
+
+    # exact integration, see `ExactCpgActorController`
+    exact: bool
+    _dt: Optional[float]
+    _transition_matrices: Optional[npt.NDArray[np.float_]]
+
+    # precomputed trajectory, indexed by the number of steps taken
+    _tick: int
+    _state_table: Optional[npt.NDArray[np.float_]]  # (steps, batch, neurons)
+    _target_table: Optional[npt.NDArray[np.float_]]  # (steps, batch, outputs)
+
+    def __init__(self, controllers: Sequence[CpgActorController]) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        controllers : Sequence[CpgActorController]
+            The controllers to batch. Their current state is copied.
+        """
+        assert len(controllers) > 0
+        num_neurons = max(len(c._state) for c in controllers)
+        num_outputs = max(c._num_output_neurons for c in controllers)
+
+        self._states = np.zeros((len(controllers), num_neurons))
+        self._weight_matrices = np.zeros((len(controllers), num_neurons, num_neurons))
+        self._dof_ranges = np.zeros((len(controllers), num_outputs))
+        self._num_outputs = np.array([c._num_output_neurons for c in controllers])
+
+        for i, controller in enumerate(controllers):
+            n = len(controller._state)
+            k = controller._num_output_neurons
+            self._states[i, :n] = controller._state
+            self._weight_matrices[i, :n, :n] = controller._weight_matrix
+            self._dof_ranges[i, :k] = controller._dof_ranges
+
+        self.exact = all(isinstance(c, ExactCpgActorController) for c in controllers)
+        self._dt = None
+        self._transition_matrices = None
+
+        self._tick = 0
+        self._state_table = None
+        self._target_table = None
+
+        self._update_targets()
+
+    @classmethod
+    def from_environments(
+        cls, environments: Sequence[Environment]
+    ) -> Optional["BatchedCpgController"]:
+        """Batch the CPG controllers of the given environments.
+
+        Parameters
+        ----------
+        environments : Sequence[Environment]
+            Environments with a single actor, controlled by an
+            `EnvironmentActorController` around a `CpgActorController`.
+
+        Returns
+        -------
+        Optional[BatchedCpgController]
+            The batched controller, or None if an environment is controlled
+            differently.
+        """
+        controllers: List[CpgActorController] = []
+        for environment in environments:
+            controller = getattr(environment.controller, "actor_controller", None)
+            if len(environment.actors) != 1 or not isinstance(
+                controller, CpgActorController
+            ):
+                return None
+            controllers.append(controller)
+        return cls(controllers)
+
+    def precompute(self, dt: float, num_steps: int) -> None:
+        """Precompute the trajectory of exactly integrated networks.
+
+        Parameters
+        ----------
+        dt : float
+            The time step of every step.
+        num_steps : int
+            Number of steps to precompute. Later steps are computed as usual.
+        """
+        assert self.exact and self._tick == 0
+        transition_matrices = self._get_transition_matrices(dt)
+
+        states = np.empty((num_steps + 1,) + self._states.shape)
+        states[0] = self._states
+        for i in range(num_steps):
+            states[i + 1] = np.einsum("bij,bj->bi", transition_matrices, states[i])
+
+        num_outputs = self._dof_ranges.shape[1]
+        self._state_table = states
+        self._target_table = np.clip(
+            states[:, :, :num_outputs], -self._dof_ranges, self._dof_ranges
+        )
+
+    def step(self, dt: float) -> None:
+        """Step all CPG networks.
+
+        Exactly integrated networks use their transition matrices (or the
+        precomputed trajectory), others a 4th order Runge-Kutta step.
+
+        Parameters
+        ----------
+        dt : float
+            The time step.
+        """
+        self._tick += 1
+
+        if self._state_table is not None and self._target_table is not None:
+            if self._dt == dt and self._tick < len(self._state_table):
+                self._states = self._state_table[self._tick]
+                self._targets = self._target_table[self._tick]
+                return
+
+        if self.exact:
+            self._states = np.einsum(
+                "bij,bj->bi", self._get_transition_matrices(dt), self._states
+            )
+            self._update_targets()
+            return
+
+        a = self._weight_matrices
+        s = self._states
+        k1 = np.einsum("bij,bj->bi", a, s)
+        k2 = np.einsum("bij,bj->bi", a, s + dt / 2 * k1)
+        k3 = np.einsum("bij,bj->bi", a, s + dt / 2 * k2)
+        k4 = np.einsum("bij,bj->bi", a, s + dt * k3)
+        self._states = s + dt / 6 * (k1 + 2 * (k2 + k3) + k4)
+        self._update_targets()
+
+    def dof_targets(self, index: int) -> npt.NDArray[np.float_]:
+        """Get the dof targets of a single network, as a view.
+
+        Parameters
+        ----------
+        index : int
+            Index of the network in the batch.
+
+        Returns
+        -------
+        npt.NDArray[np.float_]
+            The dof targets, valid until the next step.
+        """
+        return self._targets[index, : self._num_outputs[index]]
+
+    def _get_transition_matrices(self, dt: float) -> npt.NDArray[np.float_]:
+        if self._transition_matrices is None or self._dt != dt:
+            self._transition_matrices = transition_matrix(self._weight_matrices, dt)
+            self._dt = dt
+        return self._transition_matrices
+
+    def _update_targets(self) -> None:
+        num_outputs = self._dof_ranges.shape[1]
+        self._targets = np.clip(
+            self._states[:, :num_outputs], -self._dof_ranges, self._dof_ranges
+        )
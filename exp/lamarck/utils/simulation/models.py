@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Cache of compiled MuJoCo models, per simulator process.
+
+The model of an environment only depends on the body of its robot and the pose
+it is spawned in, the controller is not part of it. Environments that carry a
+model key reuse the model compiled for the first environment with that key, so
+the ES samples of a learner are compiled only once per simulator process.
+"""
+
+# Standard libraries
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Third-party libraries
+import mujoco
+from pyrr import Quaternion, Vector3
+
+# Revolve2
+from revolve2.core.physics.running import Environment
+from revolve2.runners.mujoco import LocalRunner
+
+# Maximum number of compiled models kept by a simulator process
+_MAX_CACHED_MODELS = 256
+
+
+@dataclass
+class KeyedEnvironment(Environment):
+    """Environment with a key that identifies its simulation model."""
+
+    model_key: Optional[str] = None
+
+
+def model_key(body_hash: str, position: Vector3, orientation: Quaternion) -> str:
+    """Make the model key of a single robot spawned in the given pose.
+
+    Parameters
+    ----------
+    body_hash : str
+        Hash of the developed body. See `utils.morphology.body_hash`.
+    position : Vector3
+        Spawn position of the robot.
+    orientation : Quaternion
+        Spawn orientation of the robot.
+
+    Returns
+    -------
+    str
+        The model key.
+    """
+    pose = ",".join(f"{float(v)!r}" for v in [*position, *orientation])
+    return hashlib.sha1(f"{body_hash}|{pose}".encode()).hexdigest()
+
+
+class ModelCache:
+    """LRU cache of compiled models."""
+
+    _max_size: int
+    _models: "OrderedDict[str, mujoco.MjModel]"
+
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        max_size : int
+            Maximum number of models to keep.
+        """
+        self._max_size = max_size
+        self._models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, env_descr: Environment) -> mujoco.MjModel:
+        """Get the model of an environment, compiling it if it is not cached.
+
+        Environments without a model key are always compiled.
+        """
+        key = getattr(env_descr, "model_key", None)
+        if key is not None:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+
+        self.misses += 1
+        model = mujoco.MjModel.from_xml_string(LocalRunner._make_mjcf(env_descr))
+        if key is not None:
+            self._models[key] = model
+            while len(self._models) > self._max_size:
+                self._models.popitem(last=False)
+        return model
+
+
+# Models compiled by this process
+MODEL_CACHE = ModelCache(_MAX_CACHED_MODELS)
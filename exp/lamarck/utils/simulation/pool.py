@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Long-lived pool of simulator processes.
+
+The pool is created once and shared by every runner of the program, so the
+workers are started, and import MuJoCo and Revolve2, only once instead of for
+every batch. `JobPool` is the interface the runners use, so the jobs can also
+run on remote workers, see `utils.simulation.remote`.
+"""
+
+# Standard libraries
+import asyncio
+import multiprocessing
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class PoolMetrics:
+    """Load of a simulation pool."""
+
+    num_workers: int
+    jobs_completed: int
+    in_flight: int
+    queue_depth: int  # jobs waiting for a free worker
+    busy_seconds: float  # total time the workers spent on jobs
+    utilization: float  # busy time over available worker time, since the start
+
+
+class JobPool(ABC):
+    """Runs simulation jobs on a set of workers."""
+
+    @property
+    @abstractmethod
+    def num_workers(self) -> int:
+        """Get the number of workers."""
+
+    @abstractmethod
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a job on one of the workers.
+
+        Parameters
+        ----------
+        fn : Callable[..., T]
+            Function to run, must be picklable.
+        *args : Any
+            Arguments of the function, must be picklable.
+
+        Returns
+        -------
+        T
+            The result of the function.
+        """
+
+    @abstractmethod
+    def metrics(self) -> PoolMetrics:
+        """Get the current load of the workers."""
+
+    @abstractmethod
+    def shutdown(self) -> None:
+        """Stop using the workers."""
+
+
+class SimulationPool(JobPool):
+    """Process pool for simulation jobs, with warm workers."""
+
+    _num_workers: int
+    _executor: ProcessPoolExecutor
+    _start_time: float
+    _jobs_completed: int
+    _in_flight: int
+    _busy_seconds: float
+
+    def __init__(self, num_workers: int) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        num_workers : int
+            Number of simulator processes.
+        """
+        assert num_workers >= 1
+        self._num_workers = num_workers
+        # spawn, the parent holds an event loop and open database connections
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+        )
+        self._start_time = time.perf_counter()
+        self._jobs_completed = 0
+        self._in_flight = 0
+        self._busy_seconds = 0.0
+
+    @property
+    def num_workers(self) -> int:
+        """Get the number of simulator processes."""
+        return self._num_workers
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a job on the pool.
+
+        Parameters
+        ----------
+        fn : Callable[..., T]
+            Function to run, must be picklable.
+        *args : Any
+            Arguments of the function, must be picklable.
+
+        Returns
+        -------
+        T
+            The result of the function.
+        """
+        self._in_flight += 1
+        try:
+            result, busy_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed, fn, *args
+            )
+        finally:
+            self._in_flight -= 1
+        self._jobs_completed += 1
+        self._busy_seconds += busy_seconds
+        return result
+
+    def metrics(self) -> PoolMetrics:
+        """Get the current load of the pool."""
+        elapsed = time.perf_counter() - self._start_time
+        return PoolMetrics(
+            num_workers=self._num_workers,
+            jobs_completed=self._jobs_completed,
+            in_flight=self._in_flight,
+            queue_depth=max(0, self._in_flight - self._num_workers),
+            busy_seconds=self._busy_seconds,
+            utilization=self._busy_seconds / (self._num_workers * elapsed)
+            if elapsed > 0.0
+            else 0.0,
+        )
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown()
+
+
+def _warm_up() -> None:
+    """Load the simulator in a new worker, before the first job arrives."""
+    # Third-party libraries
+    import mujoco
+
+    # Revolve2
+    import revolve2.runners.mujoco  # noqa: F401
+
+    # Local libraries
+    from . import runner  # noqa: F401
+
+    mujoco.MjModel.from_xml_string("<mujoco/>")
+
+
+def _timed(fn: Callable[..., T], *args: Any) -> Tuple[T, float]:
+    """Run a job in a worker, measuring how long the worker was busy."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Streaming reduction of the sampled states of a simulation.
+
+The runner folds every sampled state into an accumulator in the simulator
+process, instead of sending the full list of states back to the optimizer.
+"""
+
+# Standard libraries
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Revolve2
+from revolve2.core.physics.running import EnvironmentResults, EnvironmentState
+
+
+class StateAccumulator(ABC):
+    """Folds the sampled states of a single simulation."""
+
+    @abstractmethod
+    def add(self, state: EnvironmentState) -> None:
+        """Add the next sampled state."""
+
+    @abstractmethod
+    def result(self) -> EnvironmentResults:
+        """Get the results of the simulation, after the last state was added."""
+
+
+class StateReducer(ABC):
+    """Creates an accumulator for every simulated environment."""
+
+    @abstractmethod
+    def accumulator(self) -> StateAccumulator:
+        """Create the accumulator of a single simulation."""
+
+
+class AllStates(StateReducer):
+    """Keeps every sampled state, like the Revolve2 runners."""
+
+    def accumulator(self) -> StateAccumulator:
+        """Create the accumulator of a single simulation."""
+        return _AllStatesAccumulator()
+
+
+class _AllStatesAccumulator(StateAccumulator):
+    _states: List[EnvironmentState]
+
+    def __init__(self) -> None:
+        self._states = []
+
+    def add(self, state: EnvironmentState) -> None:
+        self._states.append(state)
+
+    def result(self) -> EnvironmentResults:
+        return EnvironmentResults(self._states)
+
+
+@dataclass
+class PoseSummary:
+    """Summary of the trajectory of the core of the (first) actor."""
+
+    num_samples: int
+    distance: float  # length of the sampled path on the xy plane
+    max_height: float
+
+
+@dataclass
+class ReducedEnvironmentResults(EnvironmentResults):
+    """Results with only the first and last state, and a summary of the others."""
+
+    summary: PoseSummary
+
+
+class PoseReducer(StateReducer):
+    """Keeps the first and last state, the travelled path length and the max height.
+
+    The results have the first and the last state as `environment_states`, so
+    fitness functions that only use those work unchanged.
+    """
+
+    def accumulator(self) -> StateAccumulator:
+        """Create the accumulator of a single simulation."""
+        return _PoseAccumulator()
+
+
+class _PoseAccumulator(StateAccumulator):
+    _first: Optional[EnvironmentState]
+    _last: Optional[EnvironmentState]
+    _last_xy: Tuple[float, float]
+    _num_samples: int
+    _distance: float
+    _max_height: float
+
+    def __init__(self) -> None:
+        self._first = None
+        self._last = None
+        self._last_xy = (0.0, 0.0)
+        self._num_samples = 0
+        self._distance = 0.0
+        self._max_height = -math.inf
+
+    def add(self, state: EnvironmentState) -> None:
+        position = state.actor_states[0].position
+        if self._first is None:
+            self._first = state
+        else:
+            self._distance += math.hypot(
+                position[0] - self._last_xy[0], position[1] - self._last_xy[1]
+            )
+        self._last = state
+        self._last_xy = (position[0], position[1])
+        self._num_samples += 1
+        self._max_height = max(self._max_height, position[2])
+
+    def result(self) -> EnvironmentResults:
+        assert self._first is not None and self._last is not None
+        return ReducedEnvironmentResults(
+            environment_states=[self._first, self._last],
+            summary=PoseSummary(
+                num_samples=self._num_samples,
+                distance=self._distance,
+                max_height=self._max_height,
+            ),
+        )
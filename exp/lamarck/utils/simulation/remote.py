@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Simulation workers on other nodes.
+
+A worker is a process that listens on a TCP port and runs the simulation jobs it
+receives, one at a time. The runners send jobs to the workers through
+`RemoteWorkers`, a `JobPool`, so `MujocoRunner(pool=RemoteWorkers(...))` runs a
+batch on any number of nodes. A job is a function and its arguments, i.e. the
+environments of the job (body, pose and controller) and the simulation settings;
+the reply is the reduced states of the environments.
+
+The messages are pickled over connections authenticated with a shared key, and
+a worker runs any job it unpickles: whoever has the key can run code on the
+worker. There is no default key, use a new random one for every run, see
+`generate_authkey`, and only make the workers reachable from a trusted network.
+Start a worker from this directory, so the jobs can be unpickled:
+
+    python -m utils.simulation.remote --port 6000 --authkey $LAMARCK_SIMULATION_AUTHKEY
+
+with the same key in the environment of `main.py`.
+
+A job whose worker is lost is sent to another worker.
+"""
+
+# Standard libraries
+import asyncio
+import logging
+import multiprocessing
+import secrets
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+# Third-party libraries
+import fire
+
+# Local libraries
+from .pool import JobPool, PoolMetrics, _warm_up
+
+T = TypeVar("T")
+
+Address = Tuple[str, int]
+
+
+class RemoteWorkers(JobPool):
+    """Simulation jobs on worker processes, reached over TCP."""
+
+    _addresses: List[Address]
+    _authkey: bytes
+    _max_retries: int
+    _retry_delay: float
+    _connections: Dict[Address, Connection]
+    _idle: Optional["asyncio.Queue[Address]"]
+    _executor: ThreadPoolExecutor
+    _start_time: float
+    _jobs_completed: int
+    _in_flight: int
+    _busy_seconds: float
+
+    def __init__(
+        self,
+        addresses: Sequence[str],
+        authkey: str,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+    ) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        addresses : Sequence[str]
+            Addresses of the workers, as "host:port".
+        authkey : str
+            Key shared with the workers, not empty.
+        max_retries : int
+            Number of times a job is sent to another worker when its worker is lost.
+        retry_delay : float
+            Seconds before a lost worker is contacted again.
+        """
+        assert len(addresses) >= 1
+        assert max_retries >= 0
+        self._addresses = [_parse_address(address) for address in addresses]
+        self._authkey = _encode_authkey(authkey)
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._connections = {}
+        self._idle = None
+        # blocking socket calls, one thread per worker
+        self._executor = ThreadPoolExecutor(max_workers=len(self._addresses))
+        self._start_time = time.perf_counter()
+        self._jobs_completed = 0
+        self._in_flight = 0
+        self._busy_seconds = 0.0
+
+    @property
+    def num_workers(self) -> int:
+        """Get the number of workers."""
+        return len(self._addresses)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a job on the first free worker.
+
+        Parameters
+        ----------
+        fn : Callable[..., T]
+            Function to run, must be importable by the workers.
+        *args : Any
+            Arguments of the function, must be picklable.
+
+        Returns
+        -------
+        T
+            The result of the function.
+
+        Raises
+        ------
+        RuntimeError
+            If the job failed on the worker, or no worker could run it.
+        """
+        if self._idle is None:
+            # created here, the queue belongs to the running event loop
+            self._idle = asyncio.Queue()
+            for address in self._addresses:
+                self._idle.put_nowait(address)
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            for attempt in range(self._max_retries + 1):
+                address = await self._idle.get()
+                try:
+                    reply = await loop.run_in_executor(
+                        self._executor, self._call, address, fn, args
+                    )
+                except (EOFError, OSError) as e:
+                    self._disconnect(address)
+                    logging.warning(
+                        f"Lost simulation worker {address[0]}:{address[1]} ({e!r}), "
+                        f"attempt {attempt + 1} of {self._max_retries + 1}"
+                    )
+                    loop.call_later(self._retry_delay, self._idle.put_nowait, address)
+                    continue
+                except BaseException:
+                    # e.g. a wrong key, a reply that can not be unpickled or a
+                    # cancellation, the connection is no longer usable but the
+                    # worker is, it must not be lost to the other jobs
+                    self._disconnect(address)
+                    self._idle.put_nowait(address)
+                    raise
+                self._idle.put_nowait(address)
+
+                if reply[0] == "error":
+                    raise RuntimeError(
+                        f"Job failed on worker {address[0]}:{address[1]}:\n{reply[1]}"
+                    )
+                _, result, busy_seconds = reply
+                self._jobs_completed += 1
+                self._busy_seconds += busy_seconds
+                return result
+        finally:
+            self._in_flight -= 1
+
+        raise RuntimeError(
+            f"No simulation worker could run the job in {self._max_retries + 1} attempts"
+        )
+
+    def metrics(self) -> PoolMetrics:
+        """Get the current load of the workers."""
+        elapsed = time.perf_counter() - self._start_time
+        num_workers = len(self._addresses)
+        return PoolMetrics(
+            num_workers=num_workers,
+            jobs_completed=self._jobs_completed,
+            in_flight=self._in_flight,
+            queue_depth=max(0, self._in_flight - num_workers),
+            busy_seconds=self._busy_seconds,
+            utilization=self._busy_seconds / (num_workers * elapsed)
+            if elapsed > 0.0
+            else 0.0,
+        )
+
+    def shutdown(self) -> None:
+        """Close the connections to the workers. The workers keep running."""
+        for address in list(self._connections):
+            self._disconnect(address)
+        self._executor.shutdown()
+
+    def _call(
+        self, address: Address, fn: Callable[..., Any], args: Tuple[Any, ...]
+    ) -> Tuple[Any, ...]:
+        """Send a job to a worker and wait for the reply, in an executor thread."""
+        connection = self._connections.get(address)
+        if connection is None:
+            connection = Client(address, authkey=self._authkey)
+            self._connections[address] = connection
+        connection.send((fn, args))
+        return connection.recv()
+
+    def _disconnect(self, address: Address) -> None:
+        """Drop the connection to a worker, if any."""
+        connection = self._connections.pop(address, None)
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+
+def serve(
+    authkey: str,
+    host: str = "0.0.0.0",
+    port: int = 6000,
+    _ready: Optional[Connection] = None,
+) -> None:
+    """Run a simulation worker until it is killed.
+
+    Parameters
+    ----------
+    authkey : str
+        Key shared with the runners, not empty.
+    host : str
+        Interface to listen on.
+    port : int
+        Port to listen on, any free port if 0.
+    """
+    with Listener((host, port), authkey=_encode_authkey(authkey)) as listener:
+        _warm_up()
+        if _ready is not None:
+            # the port that was bound, for spawn_local_workers
+            _ready.send(listener.address[1])
+            _ready.close()
+        logging.info(f"Simulation worker listening on {host}:{listener.address[1]}")
+
+        while True:
+            try:
+                connection = listener.accept()
+            except (EOFError, OSError, multiprocessing.AuthenticationError) as e:
+                logging.warning(f"Rejected connection: {e!r}")
+                continue
+            with connection:
+                _serve_connection(connection)
+
+
+def _serve_connection(connection: Connection) -> None:
+    """Run the jobs of a single runner until it disconnects."""
+    while True:
+        try:
+            fn, args = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            start = time.perf_counter()
+            result = fn(*args)
+            reply: Tuple[Any, ...] = ("ok", result, time.perf_counter() - start)
+        except Exception:
+            reply = ("error", traceback.format_exc())
+        try:
+            connection.send(reply)
+        except (EOFError, OSError):
+            return
+
+
+def spawn_local_workers(
+    num_workers: int, authkey: str, port: int = 0
+) -> Tuple[List[BaseProcess], List[str]]:
+    """Start workers on this machine, listening on localhost only.
+
+    Parameters
+    ----------
+    num_workers : int
+        Number of workers.
+    authkey : str
+        Key shared with the runners, not empty.
+    port : int
+        Port of the first worker, the next workers use the next ports. Any free
+        ports if 0.
+
+    Returns
+    -------
+    Tuple[List[BaseProcess], List[str]]
+        The worker processes, to terminate when done, and their addresses.
+
+    Raises
+    ------
+    RuntimeError
+        If a worker exits before it listens.
+    """
+    _encode_authkey(authkey)
+    context = multiprocessing.get_context("spawn")
+    processes: List[BaseProcess] = []
+    readers: List[Connection] = []
+    for i in range(num_workers):
+        reader, writer = context.Pipe(duplex=False)
+        process = context.Process(
+            target=serve,
+            args=(authkey, "127.0.0.1", 0 if port == 0 else port + i, writer),
+            daemon=True,
+        )
+        process.start()
+        writer.close()
+        processes.append(process)
+        readers.append(reader)
+
+    addresses = []
+    for process, reader in zip(processes, readers):
+        while not reader.poll(timeout=0.1):
+            if not process.is_alive():
+                raise RuntimeError(f"Simulation worker {process.name} failed to start")
+        try:
+            addresses.append(f"127.0.0.1:{reader.recv()}")
+        except EOFError:
+            raise RuntimeError(f"Simulation worker {process.name} failed to start")
+        finally:
+            reader.close()
+    return processes, addresses
+
+
+def generate_authkey() -> str:
+    """Generate a random key to share with the workers of a run."""
+    return secrets.token_hex(32)
+
+
+def _encode_authkey(authkey: str) -> bytes:
+    """Check that a key is set, and encode it for the connections."""
+    if not authkey:
+        raise ValueError("The simulation workers need a non-empty authkey")
+    return authkey.encode()
+
+
+def _parse_address(address: str) -> Address:
+    """Split "host:port" into a host and a port."""
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+if __name__ == "__main__":
+    # Local libraries
+    from extra import setup
+
+    setup()
+    fire.Fire(serve)
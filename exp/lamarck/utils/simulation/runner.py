@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Headless MuJoCo runner used by the optimizers.
+
+It follows the simulation loop of the Revolve2 local runner, but the batch is
+split into jobs of several environments for the process pool, a few jobs per
+simulator so the simulators that finish early take over the remaining jobs. The environments
+of a job are stepped in lockstep, so their CPG controllers can be stepped with
+one vectorized operation per control tick. An environment that stops early is
+no longer stepped. The sampled states are folded by a reducer in the simulator
+process. The jobs run on a shared `JobPool` if one is given, otherwise on
+a process pool created for the batch.
+"""
+
+# Standard libraries
+import asyncio
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+# Third-party libraries
+import mujoco
+import numpy as np
+
+# Revolve2
+from revolve2.core.physics.running import (
+    ActorControl,
+    Batch,
+    BatchResults,
+    Environment,
+    EnvironmentResults,
+    EnvironmentState,
+    Runner,
+)
+from revolve2.runners.mujoco import LocalRunner
+
+# Local libraries
+from .cpg import BatchedCpgController
+from .models import MODEL_CACHE
+from .pool import JobPool
+from .reducers import AllStates, StateReducer
+from .stopping import EarlyStopping
+
+# Jobs per simulator when the job size is not given. A simulator whose jobs finish
+# early, e.g. because their environments stopped early, takes the next job
+# instead of waiting for the slowest simulator of the batch
+_JOBS_PER_SIMULATOR = 4
+
+
+class MujocoRunner(Runner):
+    """Runs batches of environments headless on a pool of simulator processes."""
+
+    _num_simulators: int
+    _pool: Optional[JobPool]
+    _environments_per_job: Optional[int]
+    _early_stopping: Optional[EarlyStopping]
+    _reducer: StateReducer
+
+    def __init__(
+        self,
+        num_simulators: int = 1,
+        early_stopping: Optional[EarlyStopping] = None,
+        reducer: Optional[StateReducer] = None,
+        environments_per_job: Optional[int] = None,
+        pool: Optional[JobPool] = None,
+    ) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        num_simulators : int
+            Number of simulator processes. Ignored if a pool is given.
+        early_stopping : Optional[EarlyStopping]
+            Policy to stop hopeless simulations early. Every environment runs for
+            the full simulation time if not given.
+        reducer : Optional[StateReducer]
+            Reduction of the sampled states of every environment. Every sampled
+            state is kept if not given.
+        environments_per_job : Optional[int]
+            Number of environments simulated in lockstep by a single job. If not
+            given, the batch is split into `_JOBS_PER_SIMULATOR` jobs per
+            simulator.
+        pool : Optional[JobPool]
+            Shared pool to run the jobs on.
+        """
+        assert num_simulators >= 1
+        assert environments_per_job is None or environments_per_job >= 1
+        self._pool = pool
+        self._num_simulators = num_simulators if pool is None else pool.num_workers
+        self._environments_per_job = environments_per_job
+        self._early_stopping = early_stopping
+        self._reducer = AllStates() if reducer is None else reducer
+
+    async def run_batch(self, batch: Batch) -> BatchResults:
+        """
+        Run the provided batch by simulating each contained environment.
+
+        Parameters
+        ----------
+        batch : Batch
+            The batch to run.
+
+        Returns
+        -------
+        BatchResults
+            List of simulation states in ascending order of time.
+        """
+        environments = batch.environments
+        if not environments:
+            return BatchResults([])
+
+        job_size = self._environments_per_job
+        if job_size is None:
+            job_size = math.ceil(
+                len(environments) / (self._num_simulators * _JOBS_PER_SIMULATOR)
+            )
+        jobs = [
+            environments[start : start + job_size]
+            for start in range(0, len(environments), job_size)
+        ]
+
+        args = [
+            (
+                job,
+                batch.simulation_time,
+                1.0 / batch.control_frequency,
+                1.0 / batch.sampling_frequency,
+                self._early_stopping,
+                self._reducer,
+            )
+            for job in jobs
+        ]
+
+        if self._pool is not None:
+            pool = self._pool
+            results = await asyncio.gather(
+                *[pool.run(simulate_environments, *job_args) for job_args in args]
+            )
+        else:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(
+                max_workers=min(self._num_simulators, len(jobs))
+            ) as executor:
+                results = await asyncio.gather(
+                    *[
+                        loop.run_in_executor(executor, simulate_environments, *job_args)
+                        for job_args in args
+                    ]
+                )
+        return BatchResults([result for job in results for result in job])
+
+
+def simulate_environment(
+    env_descr: Environment,
+    simulation_time: float,
+    control_step: float,
+    sample_step: float,
+    early_stopping: Optional[EarlyStopping] = None,
+    reducer: Optional[StateReducer] = None,
+) -> EnvironmentResults:
+    """Simulate a single environment. See `simulate_environments`."""
+    return simulate_environments(
+        [env_descr],
+        simulation_time,
+        control_step,
+        sample_step,
+        early_stopping,
+        reducer,
+    )[0]
+
+
+def simulate_environments(
+    env_descrs: Sequence[Environment],
+    simulation_time: float,
+    control_step: float,
+    sample_step: float,
+    early_stopping: Optional[EarlyStopping] = None,
+    reducer: Optional[StateReducer] = None,
+) -> List[EnvironmentResults]:
+    """Simulate environments in lockstep.
+
+    Parameters
+    ----------
+    env_descrs : Sequence[Environment]
+        The environments to simulate.
+    simulation_time : float
+        Maximum simulated time, in seconds.
+    control_step : float
+        Time between two calls to the controllers.
+    sample_step : float
+        Time between two sampled states.
+    early_stopping : Optional[EarlyStopping]
+        Policy to stop a simulation before `simulation_time`.
+    reducer : Optional[StateReducer]
+        Reduction of the sampled states. Every sampled state is kept if not given.
+
+    Returns
+    -------
+    List[EnvironmentResults]
+        The reduced states of every environment. The last state added to the
+        reducer is the state at the end of the simulation, also when it was
+        stopped early.
+    """
+    # environments with a model key share their compiled model
+    models = [MODEL_CACHE.get(env_descr) for env_descr in env_descrs]
+    datas = [mujoco.MjData(model) for model in models]
+    assert (
+        len({model.opt.timestep for model in models}) == 1
+    ), "Environments in lockstep must have the same timestep."
+
+    for env_descr, data in zip(env_descrs, datas):
+        _set_dof_targets(
+            data,
+            [
+                dof_state
+                for posed_actor in env_descr.actors
+                for dof_state in posed_actor.dof_states
+            ],
+        )
+
+    # None if any environment is not controlled by a single CPG
+    cpg = BatchedCpgController.from_environments(env_descrs)
+    if cpg is not None and cpg.exact:
+        cpg.precompute(control_step, math.ceil(simulation_time / control_step) + 1)
+
+    monitors = [
+        early_stopping.monitor() if early_stopping is not None else None
+        for _ in env_descrs
+    ]
+    accumulators = [
+        (reducer if reducer is not None else AllStates()).accumulator()
+        for _ in env_descrs
+    ]
+
+    for env_descr, model, data, accumulator in zip(
+        env_descrs, models, datas, accumulators
+    ):
+        accumulator.add(
+            EnvironmentState(0.0, LocalRunner._get_actor_states(env_descr, data, model))
+        )
+
+    running = list(range(len(env_descrs)))
+    last_control_time = 0.0
+    last_sample_time = 0.0
+
+    while running and (time := datas[running[0]].time) < simulation_time:
+        # do control if it is time
+        if time >= last_control_time + control_step:
+            last_control_time = math.floor(time / control_step) * control_step
+            if cpg is not None:
+                cpg.step(control_step)
+                for i in running:
+                    _set_dof_targets(datas[i], cpg.dof_targets(i))
+            else:
+                for i in running:
+                    _control(env_descrs[i], datas[i], control_step)
+
+        # sample state if it is time
+        if time >= last_sample_time + sample_step:
+            last_sample_time = int(time / sample_step) * sample_step
+            still_running = []
+            for i in running:
+                state = EnvironmentState(
+                    time,
+                    LocalRunner._get_actor_states(env_descrs[i], datas[i], models[i]),
+                )
+                accumulators[i].add(state)
+                monitor = monitors[i]
+                if monitor is None or not monitor.should_stop(state):
+                    still_running.append(i)
+            running = still_running
+
+        # step simulation
+        for i in running:
+            mujoco.mj_step(models[i], datas[i])
+
+    # sample one final time
+    for env_descr, model, data, accumulator in zip(
+        env_descrs, models, datas, accumulators
+    ):
+        accumulator.add(
+            EnvironmentState(
+                data.time, LocalRunner._get_actor_states(env_descr, data, model)
+            )
+        )
+
+    return [accumulator.result() for accumulator in accumulators]
+
+
+def _control(env_descr: Environment, data: mujoco.MjData, control_step: float) -> None:
+    """Call the controller of an environment and apply its dof targets."""
+    control_user = ActorControl()
+    env_descr.controller.control(control_step, control_user)
+    actor_targets = control_user._dof_targets
+    actor_targets.sort(key=lambda t: t[0])
+    targets = [target for actor_target in actor_targets for target in actor_target[1]]
+    _set_dof_targets(data, targets)
+
+
+def _set_dof_targets(data: mujoco.MjData, targets: Sequence[float]) -> None:
+    """Set the position targets of the actuators, with zero velocity targets."""
+    if len(targets) * 2 != len(data.ctrl):
+        raise RuntimeError("Need to set a target for every dof")
+    data.ctrl[0::2] = np.asarray(targets, dtype=np.float64)
+    data.ctrl[1::2] = 0.0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Author:     as, jl, jmdm
+Date:       2023-01-10
+OS:         macOS 12.6 (Monterey)
+Hardware:   M1 chip
+
+This code is provided "As Is"
+
+Early termination of simulations that will not improve anymore.
+"""
+
+# Standard libraries
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional, Tuple
+
+# Revolve2
+from revolve2.core.physics.running import EnvironmentState
+
+
+@dataclass(frozen=True)
+class EarlyStopping:
+    """Policy to stop the simulation of a robot before the simulation time is over.
+
+    The policy is checked on every sampled state of the (first) actor in the
+    environment. The simulation stops at the first sample that triggers it, so
+    the last state is the state the robot was in at that moment.
+    """
+
+    # no checks before this many seconds, the robot is still falling into place
+    grace_period: float = 1.0
+
+    # stop if the core moved less than `min_progress` (xy plane) in `patience` seconds
+    patience: Optional[float] = None
+    min_progress: float = 0.0
+
+    # stop if the core is lower than this height, e.g. because the robot flipped over
+    min_height: Optional[float] = None
+
+    def monitor(self) -> "EarlyStoppingMonitor":
+        """Create a monitor that applies this policy to a single simulation."""
+        return EarlyStoppingMonitor(self)
+
+
+class EarlyStoppingMonitor:
+    """Applies an early stopping policy to the states of a single simulation."""
+
+    _policy: EarlyStopping
+    _window: Deque[Tuple[float, float, float]]  # time, x, y
+
+    def __init__(self, policy: EarlyStopping) -> None:
+        """
+        Initialize this object.
+
+        Parameters
+        ----------
+        policy : EarlyStopping
+            The policy to apply.
+        """
+        self._policy = policy
+        self._window = deque()
+
+    def should_stop(self, state: EnvironmentState) -> bool:
+        """Check a sampled state.
+
+        Parameters
+        ----------
+        state : EnvironmentState
+            The latest sampled state of the environment.
+
+        Returns
+        -------
+        bool
+            Whether the simulation should stop.
+        """
+        if state.time_seconds < self._policy.grace_period:
+            return False
+
+        position = state.actor_states[0].position
+
+        min_height = self._policy.min_height
+        if min_height is not None and position[2] < min_height:
+            return True
+
+        if self._policy.patience is None:
+            return False
+
+        # keep the samples of the last `patience` seconds
+        self._window.append((state.time_seconds, position[0], position[1]))
+        if state.time_seconds - self._window[0][0] < self._policy.patience:
+            return False
+        while (
+            len(self._window) > 1
+            and state.time_seconds - self._window[1][0] >= self._policy.patience
+        ):
+            self._window.popleft()
+
+        _, x, y = self._window[0]
+        return math.hypot(position[0] - x, position[1] - y) < self._policy.min_progress